@@ -1,14 +1,27 @@
 import random
+import re
 import json
+import time
+import telemetry
 from utils import *
 from string import Template
 from nlp import dynamo
 from integrations import Whatsapp, Webhook
+from .resources import AgentResources
+from .state import ConversationState, intern_name
+from nlp.rephrase_cache import placeholders
 
-class Agent:
+# A placeholder that a streamed piece may have cut in two, e.g. "$na" or "${"
+_PARTIAL_PLACEHOLDER = re.compile(r"\$(\{?\w*)$")
+
+
+class Agent(ConversationState):
     """
     Represents a conversational agent that interacts with users, understands their intents, and fulfills their requests.
 
+    The per-conversation attributes come from `ConversationState`; the models and configuration are
+    read-only views of the shared `AgentResources`.
+
     Attributes:
         active_intent (str): The currently identified intent of the user.
         active_intent_confidence_score (float): The confidence score of the identified intent.
@@ -20,9 +33,9 @@ class Agent:
         customer_mood_score (float): The sentiment score of the user's last message.
         customer_mood (str): The sentiment label of the user's last message (e.g., "POSITIVE", "NEGATIVE", "NEUTRAL").
         intent_match_threshold (float): The minimum confidence score required for an intent to be considered a match.
-        messages (list): A list of messages exchanged between the agent and the user.
+        messages (ConversationHistory): The recent messages exchanged between the agent and the user, within a token budget.
         dynamo_identity (str): A description of the agent's persona and role in the conversation.
-        context_history (list): A list of entities that have been extracted from user input.
+        context_history (deque): The most recent entities that have been prompted for.
         use_dynamo (bool): Whether to use the Dynamo natural language processing library for response generation.
         whatsappClient (Whatsapp): The WhatsApp client object for sending messages.
         whatsappIntegrated (bool): Whether the agent is integrated with WhatsApp.
@@ -33,6 +46,10 @@ class Agent:
         agent_config (dict): A dictionary containing agent configuration settings.
         intents_classifier (object): The intent classification model.
         sentiment_analyser (object): The sentiment analysis model.
+        resources (AgentResources): The shared models and configuration this agent reads from.
+        turn_deadline (float): The monotonic time by which the current turn's reply is due, or None.
+        stream_rephrasings (bool): Whether rephrasings that aren't cached are streamed to the caller instead of awaited.
+        reply_stream (generator): The streamed rephrasing of the current turn's reply, or None.
 
     Methods:
         process_input(user_input): Processes user input, identifies intent, extracts entities, and generates a response.
@@ -42,14 +59,21 @@ class Agent:
         has_context_for_fullfilment(): Checks if the agent has all the required context to fulfill the active intent.
         fullfil_active_intent(): Fulfills the active intent using the available context.
         process_with_topic(user_input): Processes user input when there is an active topic to fill.
+        fill_slots(names, user_input, topic): Extracts several entities from one user input into the active context.
+        rephrase(text): Rephrases a reply with Dynamo, reusing cached rephrasings.
         integrate_whatsapp(sender_number, receiver_number): Integrates the agent with WhatsApp using Twilio.
         send_whatsapp_message(message): Sends a message to the WhatsApp receiver.
         load_integrations(): Loads fulfilment configurations from a JSON file.
     """
-    def __init__(self, intent_classifier, sentiment_analyser, intents_path="./intents.json", entities_path= "./entities.json", agent_config_path="./agent-config.json" , fulfilments_path = "./fulfilments.json"):
+    __slots__ = ("resources", "whatsappClient", "whatsappIntegrated", "turn_deadline", "stream_rephrasings", "reply_stream")
+
+    def __init__(self, intent_classifier=None, sentiment_analyser=None, intents_path="./intents.json", entities_path= "./entities.json", agent_config_path="./agent-config.json" , fulfilments_path = "./fulfilments.json", resources=None):
         """
         Initializes the Agent object.
 
+        Pass `resources` to start a new conversation on models and configuration that are already loaded;
+        otherwise they are loaded from the given paths.
+
         Args:
             intent_classifier (object): The intent classification model.
             sentiment_analyser (object): The sentiment analysis model.
@@ -57,41 +81,28 @@ class Agent:
             entities_path (str): The path to the JSON file containing entity configurations.
             agent_config_path (str): The path to the JSON file containing agent configuration settings.
             fulfilments_path (str): The path to the JSON file containing fulfilment configurations.
+            resources (AgentResources, optional): Shared models and configuration to use instead of loading them.
         """
-        self.active_intent = None
-        self.active_intent_confidence_score = 1.0
-        self.active_context = {"__context__": get_blank_context()}
-        self.required_context = []
-        self.active_topic = None
-        self.fallback_count = 0
-        self.held_fulfilment = None
-        self.customer_mood_score = 0.0
-        self.customer_mood = 'NEUTRAL'
-        self.intent_match_threshold = 0.3
-        self.messages = []
-        self.dynamo_identity= "You are a helpful assistent name Crimson. You help users manage their subscriptions. You can help them signup or signff. You consider the conversation history to respond to the user. In the conversation your role is as agent. "
-        self.context_history = []
-        self.use_dynamo = False
+        if resources is None:
+            resources = AgentResources(intent_classifier, sentiment_analyser, intents_path, entities_path, agent_config_path, fulfilments_path)
+        super().__init__(max_messages=resources.max_messages, history_tokens=resources.history_tokens, summary_tokens=resources.summary_tokens)
+        self.resources = resources
         self.whatsappClient = None
         self.whatsappIntegrated = False
-
-        self.fulfilment_path = fulfilments_path
-        self.fulfilments = {}
-        self.load_integrations()
-        #self.agent_name
-        #self.agent_uid
-
-        with open(entities_path) as file:
-            self.entities = json.load(file)
-        with open(intents_path) as file:
-            self.intents = json.load(file)
-        with open(agent_config_path) as file:
-            self.agent_config = json.load(file)
-            for key, val in self.agent_config.items():
-                setattr(self, key, val)
-
-        self.intents_classifier = intent_classifier
-        self.sentiment_analyser = sentiment_analyser
+        self.turn_deadline = None
+        self.stream_rephrasings = False
+        self.reply_stream = None
+
+    # Shared, read-only views of the resources; never copied per conversation
+    intents = property(lambda self: self.resources.intents)
+    entities = property(lambda self: self.resources.entities)
+    agent_config = property(lambda self: self.resources.agent_config)
+    fulfilments = property(lambda self: self.resources.fulfilments)
+    fulfilment_path = property(lambda self: self.resources.fulfilment_path)
+    intents_classifier = property(lambda self: self.resources.intent_classifier)
+    sentiment_analyser = property(lambda self: self.resources.sentiment_analyser)
+    intent_match_threshold = property(lambda self: self.resources.intent_match_threshold)
+    dynamo_identity = property(lambda self: self.resources.dynamo_identity)
 
     def process_input(self, user_input):
         """
@@ -101,24 +112,36 @@ class Agent:
             user_input (str): The user's input message.
 
         Returns:
-            dict: A dictionary containing the agent's response and other information.
+            dict: A dictionary containing the agent's response and other information. With `stream_rephrasings`,
+                a rephrasing that isn't cached is under "reply_stream", a generator of its pieces; "reply"
+                is then the reply as written, to show if the stream yields nothing.
         """
+        with telemetry.turn():
+            return self._process_input(user_input)
+
+    def _process_input(self, user_input):
+        """Runs one turn; `process_input` times it as a whole."""
+        deadline = self.resources.rephrase_deadline
+        self.turn_deadline = time.monotonic() + deadline if deadline is not None else None
+        self.reply_stream = None
         self.messages.append({"role": "user", "content": str(user_input)})
         response = {}
 
         # determine user sentiment
         if user_input:
-            customer_sentiment = self.sentiment_analyser(user_input)[0]
-            self.customer_mood = customer_sentiment["label"]
+            with telemetry.span("sentiment"):
+                customer_sentiment = self.sentiment_analyser(user_input)[0]
+            self.customer_mood = intern_name(customer_sentiment["label"])
             self.customer_mood_score = customer_sentiment["score"]
         
         # determine if the the user wants to cancel slot filling 
-        if all([user_input, self.active_topic, is_cancel_intent(str(user_input))]):
+        # (short-circuits, so the detector only runs while a slot is being filled)
+        if user_input and self.active_topic and is_cancel_intent(str(user_input)):
             self.cancel_slot_filling()
             agent_reply = "Alright, I understand that you want to cancel this request. What else can I do for you?"
 
             if self.use_dynamo:
-                agent_reply = dynamo.natural_rephrase(self.dynamo_identity, self.messages, self.messages)
+                agent_reply = self.rephrase(agent_reply)
 
             self.messages.append({"role": "agent", "content": agent_reply})
             response["reply"] = agent_reply
@@ -136,6 +159,8 @@ class Agent:
         response["active_intent_confidence_score"] = self.active_intent_confidence_score
         response["customer_mood"] = self.customer_mood
         response["customer_mood_score"] = self.customer_mood_score
+        if self.reply_stream is not None:
+            response["reply_stream"], self.reply_stream = self.reply_stream, None
 
         return response
 
@@ -158,11 +183,13 @@ class Agent:
             str: The agent's response.
         """
         self.active_context["__context__"]["max_count"] -= 1 if self.active_context["__context__"]["max_count"] > 0 else 0
-        intents_classifier_result = determine_intent(self.active_context["__context__"]["context_label"], str(user_input), self.intent_match_threshold, self.intents_classifier, self.intents)
+        intents_classifier_result = determine_intent(self.active_context["__context__"]["context_label"], str(user_input), self.intent_match_threshold, self.intents_classifier, self.intents, self.resources.fast_intent_matcher, self.resources.context_masks)
         current_intent, intent_score = intents_classifier_result["label"], intents_classifier_result["score"]
-        self.active_intent = current_intent
+        self.active_intent = intern_name(current_intent)
         self.active_intent_confidence_score = intent_score
         self.required_context = get_missing_context(self.active_context, self.intents[current_intent]["params"]) if self.intents[current_intent]["params"] != 'None' else []
+        # Fill whatever slots the opening message already answers
+        self.fill_slots(self.required_context, str(user_input))
         print("Determined Intent : ", current_intent, " : ", self.active_intent)
         if len(self.required_context):
             agent_reply = "Alright, I will need some information to do this.\n" + self.prompt_for_next_param()
@@ -188,7 +215,7 @@ class Agent:
 
             self.use_dynamo = self.intents[self.active_intent]["use_dynamo"]
             if self.use_dynamo:
-                agent_reply = dynamo.natural_rephrase(self.dynamo_identity, self.messages, Template(agent_reply).safe_substitute(self.active_context))
+                agent_reply = self.rephrase(agent_reply, self.active_context)
                 #self.messages.append({"role": "agent", "content": agent_reply})
 
             return agent_reply
@@ -219,15 +246,17 @@ class Agent:
         if self.has_context_for_fullfilment():
             agent_reply = random.choice(self.intents[self.active_intent]["responses"])
             agent_reply = Template(str(agent_reply)).safe_substitute(self.active_context)
-            self.active_context["__context__"] = self.intents[self.active_intent]['output_context']
+            self.active_context["__context__"] = dict(self.intents[self.active_intent]['output_context'])  # Copy, the intents config is shared
             #TODO: Check if there is anyother fulfilment
             print(self.active_intent, ": Notification : " ,self.intents[self.active_intent]["notify"])
             if self.whatsappIntegrated and self.intents[self.active_intent]["notify"]:
                 self.send_whatsapp_message(agent_reply)
             
-            for fulfilment in self.intents[self.active_intent]['fulfilements']:
-                webhook = self.fulfilments[fulfilment] #self.fulfilments contain a dictionary of webhooks
-                webhook.call(self.active_context)
+            # Independent fulfilments run concurrently; fire-and-forget ones don't hold up the reply
+            webhooks = [self.fulfilments[fulfilment] for fulfilment in self.intents[self.active_intent]['fulfilements']] #self.fulfilments contain a dictionary of webhooks
+            if webhooks:
+                with telemetry.span("fulfilment"):
+                    self.resources.fulfilment_executor.run(webhooks, self.active_context)
 
             self.active_intent = None
             return agent_reply
@@ -247,13 +276,16 @@ class Agent:
         """
         #self.messages.append({"role": "user", "content": str(user_input)})
         entity_obj = self.entities[self.active_topic]
-        entity_parameter = extract_entity(entity_obj["given"], entity_obj["values"], str(user_input))
+        # Fill the slot that was asked for, plus any other missing slot the user answered in the same message
+        entity_parameter = self.fill_slots([self.active_topic] + self.required_context, str(user_input), self.active_topic).get(self.active_topic)
         
         if not entity_parameter: # Couldn't find the entity from the given text
             if self.fallback_count < 2: #TODO: MAKE THIS NUMBER CONFIGURABLE VARIABLE
-                agent_reply = Template(random.choice(entity_obj["fallback_prompt"])).safe_substitute(self.active_context)
+                agent_reply = random.choice(entity_obj["fallback_prompt"])
                 if self.use_dynamo:
-                    agent_reply = dynamo.natural_rephrase(self.dynamo_identity, self.messages, agent_reply)
+                    agent_reply = self.rephrase(agent_reply, self.active_context)
+                else:
+                    agent_reply = Template(agent_reply).safe_substitute(self.active_context)
                     #self.messages.append({"role": "agent", "content": agent_reply})
                 self.fallback_count += 1
             else:
@@ -262,12 +294,100 @@ class Agent:
                 agent_reply = graceful_shutdown(self.active_context)
                 #self.messages.append({"role": "agent", "content": dynamo.natural_rephrase(self.dynamo_identity, self.messages, Template(reply).safe_substitute(self.active_context))})
         else:
-            self.active_context[self.active_topic] = entity_parameter
             agent_reply = self.prompt_for_next_param()
             if not agent_reply:
                 agent_reply = self.fullfil_active_intent()
         return agent_reply
     
+    @telemetry.traced("entities")
+    def fill_slots(self, names, user_input, topic=None):
+        """
+        Extracts the given entities from one user input and stores the ones found in the active context.
+
+        Filled entities are removed from the required context.
+
+        Args:
+            names (list): The entity names to look for, in priority order.
+            user_input (str): The user's input message.
+            topic (str, optional): The entity the user was just asked about; see `EntityExtractor.extract_all`.
+
+        Returns:
+            dict: The extracted values, keyed by entity name.
+        """
+        if not names:
+            return {}
+        found = self.resources.entity_extractor.extract_all(names, user_input, topic)
+        for name, value in found.items():
+            self.active_context[name] = value
+        if found:
+            self.required_context = [name for name in self.required_context if name not in found]
+        return found
+
+    @telemetry.traced("rephrase")
+    def rephrase(self, template, context=None):
+        """
+        Rephrases a reply with Dynamo, reusing a cached rephrasing made in a similar conversation state.
+
+        The template is rephrased and cached with its $placeholders, and the context's values are
+        filled in afterwards, so a cached rephrasing is shared between users and holds none of their
+        data. A rephrasing that drops or invents a placeholder is not used.
+
+        When the agent configuration sets "rephrase-deadline-ms", the rephrasing must be ready by the
+        turn's deadline; otherwise the reply is sent as written and the late rephrasing is cached.
+        With `stream_rephrasings`, a rephrasing that isn't cached is left in `reply_stream` for the
+        caller to show as it is generated, and the reply is returned as written.
+
+        Args:
+            template (str): The reply to rephrase, e.g. "What is your $field?".
+            context (dict, optional): The values to fill the placeholders with.
+
+        Returns:
+            str: The rephrased reply, with the values filled in.
+        """
+        context = context or {}
+        fill = lambda text: Template(text).safe_substitute(context)
+        fields = placeholders(template)
+        fingerprint = (self.active_intent, self.active_topic, self.customer_mood)
+        timeout = max(0.0, self.turn_deadline - time.monotonic()) if self.turn_deadline is not None else None
+        history = self.messages.render()  # Snapshot; a late rephrasing may still be reading it next turn
+
+        def rephrase_fn(text):
+            reply = dynamo.natural_rephrase(self.dynamo_identity, history, text)
+            return reply if reply and placeholders(reply) == fields else None
+
+        if self.stream_rephrasings:
+            cache = self.resources.rephrase_cache
+            key = cache.make_key(self.dynamo_identity, template, fingerprint)
+            cached = cache.get(key)
+            if cached is not None:
+                if cache.missing_variants(key):
+                    self.resources.rephraser.collect(key, template, rephrase_fn)
+                return fill(cached)
+            self.reply_stream = self._stream_rephrase(key, template, fields, fill, history)
+            return fill(template)
+        return fill(self.resources.rephraser.rephrase(self.dynamo_identity, template, fingerprint, rephrase_fn, timeout) or template)
+
+    def _stream_rephrase(self, key, template, fields, fill, history):
+        """Yields the pieces of a rephrasing with the values filled in, and caches the whole of it."""
+        pieces = []
+        pending = ""  # Held back while it ends in what may be the start of a placeholder
+        stream = dynamo.stream_rephrase(self.dynamo_identity, history, template)
+        try:
+            for piece in stream:
+                pieces.append(piece)
+                pending += piece
+                partial = _PARTIAL_PLACEHOLDER.search(pending)
+                ready, pending = (pending[:partial.start()], pending[partial.start():]) if partial else (pending, "")
+                if ready:
+                    yield fill(ready)
+            if pending:
+                yield fill(pending)
+        finally:
+            stream.close()
+        reply = "".join(pieces)
+        if reply and reply != template and placeholders(reply) == fields:
+            self.resources.rephrase_cache.put(key, reply)
+
     def integrate_whatsapp(self, sender_number="+14155238886", receiver_number="+923364050797"):
         """
         Integrates the agent with WhatsApp using Twilio.
@@ -306,17 +426,6 @@ class Agent:
         
     def load_integrations(self):
         """
-        Loads fulfilment configurations from a JSON file.
+        Reloads fulfilment configurations from a JSON file into the shared resources.
         """
-        with open(self.fulfilment_path) as file:
-            fulfilments = file.read()
-            fulfilments = json.loads(fulfilments)
-        
-        for fulfilment in fulfilments:
-            self.fulfilments[fulfilment] = Webhook(fulfilment, self.fulfilment_path)
-            ## Make sure that the params required in the intents file for an intent match the entities needed for the fulfilment in the fulfilments file
-        
-
-
-
-
+        self.resources.load_integrations(reload=True)
@@ -1 +1,2 @@
-from .Agent import Agent
\ No newline at end of file
+from .Agent import Agent
+from .resources import AgentResources, load_resources
\ No newline at end of file
@@ -0,0 +1,184 @@
+from collections import deque
+
+
+def estimate_tokens(text):
+    """
+    Estimates how many LLM tokens a text takes, at about four characters per token.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The estimated token count, at least 1.
+    """
+    return max(1, (len(text) + 3) // 4)
+
+
+def render_message(message):
+    """
+    Renders one message as a line of the prompt.
+
+    Args:
+        message (dict): The message, with "role" and "content".
+
+    Returns:
+        str: The rendered line.
+    """
+    return f"{message['role']}: {message['content']}"
+
+
+def extractive_summary(summary, lines, budget, count_tokens=estimate_tokens, clip=80):
+    """
+    Folds lines that left the window into the summary without calling an LLM.
+
+    Each line is clipped to `clip` characters and appended; the oldest lines of the summary are
+    dropped once it exceeds its budget.
+
+    Args:
+        summary (list): The summary lines so far; updated in place.
+        lines (list): The rendered lines that left the window, oldest first.
+        budget (int): The token budget of the summary.
+        count_tokens (callable): Counts the tokens of a text.
+        clip (int): The maximum length of a summarized line.
+
+    Returns:
+        list: The updated summary lines.
+    """
+    for line in lines:
+        summary.append(line if len(line) <= clip else line[:clip - 3] + "...")
+    while len(summary) > 1 and sum(count_tokens(line) for line in summary) > budget:
+        summary.pop(0)
+    return summary
+
+
+class ConversationHistory:
+    """
+    The conversation's messages, kept within a token budget for the Dynamo prompts.
+
+    Recent messages are kept whole in a sliding window. When the window's tokens exceed its
+    budget the oldest messages leave it and are folded into a short summary, so the prompt stays
+    bounded however long the conversation runs. Each message is counted once, when it is appended,
+    and the rendered prompt text is cached and extended by one line per message; it is only
+    rebuilt when messages leave the window.
+
+    Behaves like the list of message dicts it replaces: supports `append`, iteration, `len` and
+    indexing over the window, and `str()` gives the rendered prompt text.
+
+    Attributes:
+        token_budget (int): The token budget of the rendered history, summary included.
+        summary_budget (int): The share of the budget the summary may use.
+        max_messages (int): The maximum number of messages kept in the window, whatever their size.
+        summary (list): The summary lines of messages that left the window.
+    """
+
+    __slots__ = ("token_budget", "summary_budget", "max_messages", "summary", "_window", "_window_tokens",
+                 "_rendered", "_summarize", "_count_tokens")
+
+    def __init__(self, token_budget=512, summary_budget=128, max_messages=50, summarize=extractive_summary, count_tokens=estimate_tokens):
+        """
+        Initializes an empty history.
+
+        Args:
+            token_budget (int): The token budget of the rendered history, summary included.
+            summary_budget (int): The share of the budget the summary may use.
+            max_messages (int): The maximum number of messages kept in the window.
+            summarize (callable): Folds lines leaving the window into the summary; see `extractive_summary`.
+            count_tokens (callable): Counts the tokens of a text.
+        """
+        self.token_budget = token_budget
+        self.summary_budget = min(summary_budget, token_budget)
+        self.max_messages = max_messages
+        self.summary = []
+        self._window = deque()  # (role, content, tokens)
+        self._window_tokens = 0
+        self._rendered = None
+        self._summarize = summarize
+        self._count_tokens = count_tokens
+
+    def append(self, message):
+        """
+        Adds a message, moving the oldest ones into the summary if the window is over budget.
+
+        Args:
+            message (dict): The message, with "role" and "content".
+        """
+        line = render_message(message)
+        tokens = self._count_tokens(line)
+        self._window.append((message["role"], message["content"], tokens))
+        self._window_tokens += tokens
+
+        window_budget = self.token_budget - self.summary_budget
+        evicted = []
+        while len(self._window) > 1 and (self._window_tokens > window_budget or len(self._window) > self.max_messages):
+            role, content, old_tokens = self._window.popleft()
+            self._window_tokens -= old_tokens
+            evicted.append(render_message({"role": role, "content": content}))
+        if evicted:
+            self.summary = self._summarize(self.summary, evicted, self.summary_budget, self._count_tokens)
+            self._rendered = None
+        elif self._rendered is not None:
+            self._rendered = f"{self._rendered}\n{line}" if len(self._window) > 1 else line
+
+    def render(self):
+        """
+        Renders the history as prompt text: the summary, then the recent messages.
+
+        Returns:
+            str: The rendered history.
+        """
+        if self._rendered is None:
+            lines = [render_message({"role": role, "content": content}) for role, content, _ in self._window]
+            if self.summary:
+                lines = ["Earlier in the conversation:", *self.summary, "Recent messages:", *lines]
+            self._rendered = "\n".join(lines)
+        return self._rendered
+
+    @property
+    def tokens(self):
+        """int: The estimated tokens of the rendered history."""
+        return self._window_tokens + sum(self._count_tokens(line) for line in self.summary)
+
+    def snapshot(self):
+        """
+        Returns the history as JSON-serialisable data, for `restore`.
+
+        Returns:
+            dict: The summary lines and the window's messages.
+        """
+        return {"summary": list(self.summary), "window": [[role, content] for role, content, _ in self._window]}
+
+    def restore(self, data):
+        """
+        Replaces the history with a snapshot taken by `snapshot`.
+
+        Args:
+            data (dict): The snapshot.
+        """
+        self.clear()
+        self.summary = list(data.get("summary", []))
+        for role, content in data.get("window", []):
+            tokens = self._count_tokens(render_message({"role": role, "content": content}))
+            self._window.append((role, content, tokens))
+            self._window_tokens += tokens
+
+    def clear(self):
+        """
+        Removes every message and the summary.
+        """
+        self._window.clear()
+        self._window_tokens = 0
+        self.summary = []
+        self._rendered = None
+
+    def __iter__(self):
+        return ({"role": role, "content": content} for role, content, _ in self._window)
+
+    def __len__(self):
+        return len(self._window)
+
+    def __getitem__(self, index):
+        role, content, _ = self._window[index]
+        return {"role": role, "content": content}
+
+    def __str__(self):
+        return self.render()
@@ -0,0 +1,232 @@
+import json
+import os
+import time
+from integrations import load_fulfilments, get_default_executor
+from nlp.entities import EntityExtractor
+from nlp.fast_intent import FastIntentMatcher
+from nlp.intent_cache import CachedClassifier, ContextMasks
+from nlp.models import load_intent_classifier, load_sentiment_analyser
+from nlp.rephrase_cache import RephraseCache
+from nlp.rephrase_scheduler import RephraseScheduler
+
+INTENT_MODEL = "shahiryar/crimson-agent"
+INTENT_MODEL_REVISION = "29c3aeb9544b8ba8132bd06347a28a5acb5ba43c"
+# The model transformers picks for "sentiment-analysis", pinned so it can be cached and served offline
+SENTIMENT_MODEL = "distilbert/distilbert-base-uncased-finetuned-sst-2-english"
+SENTIMENT_MODEL_REVISION = "af0f99b"
+# Synthetic utterances run through every pipeline before serving: short and long, with entities of each kind
+WARM_UP_UTTERANCES = [
+    "Hi there",
+    "I want to subscribe to the gold tier",
+    "My name is Ali Khan, my phone is 03001234567 and my pin is 1234",
+    "No thanks, please cancel that and tell me more about the different service levels you offer",
+]
+DEFAULT_DYNAMO_IDENTITY = "You are a helpful assistent name Crimson. You help users manage their subscriptions. You can help them signup or signff. You consider the conversation history to respond to the user. In the conversation your role is as agent. "
+
+
+class AgentResources:
+    """
+    The heavy, read-only parts of an agent that are shared by every conversation.
+
+    Models and the intents/entities/agent-config/fulfilments configuration are loaded once here, so
+    creating a new conversation only allocates its own small state. Agents must treat these
+    objects as read-only.
+
+    Attributes:
+        intent_classifier (object): The intent classification model, behind a `CachedClassifier` unless the "intent-cache" is disabled.
+        sentiment_analyser (object): The sentiment analysis model.
+        intents (dict): A dictionary of intents, keyed by their names.
+        entities (dict): A dictionary of entities, keyed by their names.
+        entity_extractor (EntityExtractor): Extractors for the entities, compiled once.
+        agent_config (dict): A dictionary containing agent configuration settings.
+        fulfilment_path (str): The path to the JSON file containing fulfilment configurations.
+        fulfilments (dict): A dictionary of fulfilment objects, keyed by their names.
+        fulfilment_executor (FulfilmentExecutor): The pooled executor that calls the fulfilment webhooks.
+        intent_match_threshold (float): The minimum confidence score required for an intent to be considered a match.
+        context_masks (ContextMasks): The intents allowed in each conversation context.
+        dynamo_identity (str): A description of the agent's persona and role in the conversation.
+        max_messages (int): How many messages each conversation keeps.
+        history_tokens (int): The token budget of each conversation's message history.
+        summary_tokens (int): The part of that budget used to summarize older messages.
+        fast_intent_matcher (FastIntentMatcher): Answers exact and near-exact training phrases without the classifier, or None.
+        rephrase_cache (RephraseCache): Cached LLM rephrasings of the agent's prompts.
+        rephraser (RephraseScheduler): Races rephrasings against the turn deadline.
+        rephrase_deadline (float): Seconds a turn may spend waiting for a rephrasing, or None to wait as long as it takes.
+    """
+
+    def __init__(self, intent_classifier, sentiment_analyser, intents_path="./intents.json", entities_path="./entities.json", agent_config_path="./agent-config.json", fulfilments_path="./fulfilments.json", fulfilment_executor=None, rephrase_cache=None):
+        """
+        Loads the configuration files and stores the models.
+
+        Args:
+            intent_classifier (object): The intent classification model.
+            sentiment_analyser (object): The sentiment analysis model.
+            intents_path (str): The path to the JSON file containing intent configurations.
+            entities_path (str): The path to the JSON file containing entity configurations.
+            agent_config_path (str): The path to the JSON file containing agent configuration settings.
+            fulfilments_path (str): The path to the JSON file containing fulfilment configurations.
+            fulfilment_executor (FulfilmentExecutor, optional): The executor for fulfilment webhooks. Defaults to the process-wide one.
+            rephrase_cache (RephraseCache, optional): The rephrase cache. Defaults to one configured by "rephrase-cache" in the agent configuration.
+        """
+        self.sentiment_analyser = sentiment_analyser
+
+        with open(entities_path) as file:
+            self.entities = json.load(file)
+        self.entity_extractor = EntityExtractor(self.entities)
+        with open(intents_path) as file:
+            self.intents = json.load(file)
+        self.context_masks = ContextMasks(self.intents)
+        with open(agent_config_path) as file:
+            self.agent_config = json.load(file)
+        intent_cache = self.agent_config.get("intent-cache", {})
+        if intent_cache.get("enabled", True) and intent_classifier is not None and not isinstance(intent_classifier, CachedClassifier):
+            intent_classifier = CachedClassifier(intent_classifier, intent_cache.get("max-entries", 4096))
+        self.intent_classifier = intent_classifier
+        self.intent_match_threshold = self.agent_config.get("intent-match-threshold", 0.3)
+        fast_intent = self.agent_config.get("fast-intent", {})
+        self.fast_intent_matcher = FastIntentMatcher(self.intents, fast_intent.get("min-similarity", 0.8), fast_intent.get("min-margin", 0.1)) \
+            if fast_intent.get("enabled", True) else None
+        self.dynamo_identity = self.agent_config.get("dynamo-identity", DEFAULT_DYNAMO_IDENTITY)
+        self.max_messages = self.agent_config.get("max-messages", 50)
+        self.history_tokens = self.agent_config.get("history-token-budget", 512)
+        self.summary_tokens = self.agent_config.get("history-summary-tokens", 128)
+        self.rephrase_cache = rephrase_cache or self.create_rephrase_cache(self.agent_config.get("rephrase-cache", {}))
+        deadline_ms = self.agent_config.get("rephrase-deadline-ms")
+        self.rephrase_deadline = deadline_ms / 1000 if deadline_ms is not None else None
+        self.rephraser = RephraseScheduler(self.rephrase_cache, max_workers=self.agent_config.get("rephrase-workers", 4))
+
+        self.fulfilment_executor = fulfilment_executor or get_default_executor()
+        self.fulfilment_path = fulfilments_path
+        self.load_integrations()
+
+    @staticmethod
+    def create_rephrase_cache(config):
+        """
+        Creates the rephrase cache from its agent configuration section.
+
+        Args:
+            config (dict): Optional "max-entries", "ttl-seconds", "variants" and "path" settings.
+
+        Returns:
+            RephraseCache: The cache.
+        """
+        return RephraseCache(max_entries=config.get("max-entries", 1024),
+                             ttl=config.get("ttl-seconds", 24 * 3600),
+                             variants=config.get("variants", 3),
+                             path=config.get("path"))
+
+    def register_metrics(self, registry=None):
+        """
+        Exports the counters of the shared components (intent cache, model batching, fast intent
+        path, rephrase cache and scheduler, fulfilment webhooks) as metrics.
+
+        Args:
+            registry (MetricsRegistry, optional): The registry. Defaults to the process-wide one.
+        """
+        import telemetry
+        registry = registry or telemetry.registry
+        cached = isinstance(self.intent_classifier, CachedClassifier)
+        sources = {
+            "intent_cache": self.intent_classifier if cached else None,
+            "intent_batching": self.intent_classifier.classifier if cached else self.intent_classifier,
+            "sentiment_batching": self.sentiment_analyser,
+            "fast_intent": self.fast_intent_matcher,
+            "rephrase_cache": self.rephrase_cache,
+            "rephraser": self.rephraser,
+            "fulfilments": self.fulfilment_executor,
+        }
+        for component, source in sources.items():
+            if source is not None and hasattr(source, "get_stats"):
+                registry.register_stats(component, source.get_stats)
+
+    def warm_up(self, utterances=WARM_UP_UTTERANCES, fork_safe=False):
+        """
+        Runs synthetic utterances through every pipeline, so the first real turn doesn't pay for
+        lazy initialisation, memory allocation or the first compiled kernels.
+
+        Each model is called with the whole batch and with single utterances, the two shapes served.
+        The intent classifier is warmed up behind its cache, so the synthetic utterances aren't cached.
+
+        Args:
+            utterances (list): The utterances.
+            fork_safe (bool): Only call the models with lists, which bypass the micro-batcher, so no
+                batching thread is started in a process that is about to fork.
+
+        Returns:
+            dict: The seconds each pipeline took, and the total.
+        """
+        from nlp.entities import NER_ONLY
+        from nlp.registry import registry as nlp_registry
+        from nlp.cancel import cancel_detector
+
+        intent_classifier = self.intent_classifier.classifier if isinstance(self.intent_classifier, CachedClassifier) else self.intent_classifier
+        steps = {
+            "intent_classifier": lambda text: intent_classifier(text, top_k=None),
+            "sentiment_analyser": lambda text: self.sentiment_analyser(text),
+        }
+        timings = {}
+        started = time.perf_counter()
+        for name, step in steps.items():
+            step_started = time.perf_counter()
+            step(list(utterances))
+            if not fork_safe:
+                for utterance in utterances:
+                    step(utterance)
+            timings[name] = round(time.perf_counter() - step_started, 3)
+
+        step_started = time.perf_counter()
+        nlp = nlp_registry.get_pipeline(disable=NER_ONLY)
+        for doc in nlp.pipe(utterances):
+            doc.ents
+        timings["spacy"] = round(time.perf_counter() - step_started, 3)
+
+        step_started = time.perf_counter()
+        for utterance in utterances:
+            self.entity_extractor.extract_all(list(self.entities), utterance)
+            cancel_detector.is_cancel(utterance)
+            if self.fast_intent_matcher is not None:
+                self.fast_intent_matcher.match(utterance)
+        timings["rules"] = round(time.perf_counter() - step_started, 3)
+        timings["total"] = round(time.perf_counter() - started, 3)
+        return timings
+
+    def load_integrations(self, reload=False):
+        """
+        Loads the compiled fulfilment webhooks, shared with every other agent using the same file.
+
+        Args:
+            reload (bool): Whether to rebuild the webhooks even if the file hasn't changed.
+        """
+        ## Make sure that the params required in the intents file for an intent match the entities needed for the fulfilment in the fulfilments file
+        self.fulfilments = load_fulfilments(self.fulfilment_path, reload=reload)
+
+
+def load_resources(max_batch_size=16, max_wait_ms=5, intent_backend=None, artefacts=None, **paths):
+    """
+    Loads the models and configuration shared by every conversation, for the servers.
+
+    Loads the intent classifier and sentiment analyser models from the local model cache (fetching
+    them into it on first use, unless offline), wraps them so concurrent requests are micro-batched,
+    and reads the agent configuration files once.
+
+    Args:
+        max_batch_size (int): The maximum number of utterances per model call.
+        max_wait_ms (float): How long an utterance may wait for its batch to fill.
+        intent_backend (str, optional): "transformers" or "onnx"; see `nlp.models.load_intent_classifier`.
+            Defaults to the `INTENT_BACKEND` environment variable, or "transformers".
+        artefacts (ModelArtefacts, optional): The local model cache. Defaults to `ModelArtefacts()`,
+            configured by the `MODEL_CACHE_DIR` and `HF_HUB_OFFLINE` environment variables.
+        **paths: Configuration file paths passed on to `AgentResources`.
+
+    Returns:
+        AgentResources: The shared models and configuration.
+    """
+    from nlp.artefacts import ModelArtefacts
+    from nlp.batching import BatchedPipeline
+    artefacts = artefacts or ModelArtefacts()
+    backend = intent_backend or os.getenv("INTENT_BACKEND", "transformers")
+    intent_classifier = BatchedPipeline(load_intent_classifier(model=INTENT_MODEL, revision=INTENT_MODEL_REVISION, backend=backend, artefacts=artefacts),
+                                        max_batch_size, max_wait_ms, name="intent_classifier")
+    sentiment_analyser = BatchedPipeline(load_sentiment_analyser(SENTIMENT_MODEL, SENTIMENT_MODEL_REVISION, artefacts),
+                                         max_batch_size, max_wait_ms, name="sentiment_analyser")
+    return AgentResources(intent_classifier, sentiment_analyser, **paths)
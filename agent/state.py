@@ -0,0 +1,121 @@
+import sys
+from collections import deque
+from utils import get_blank_context
+from .history import ConversationHistory
+
+SNAPSHOT_VERSION = 1
+
+
+def intern_name(name):
+    """
+    Interns an intent or entity name so every conversation holding it shares one string object.
+
+    Args:
+        name (str | None): The name.
+
+    Returns:
+        str | None: The interned name, or the value unchanged if it is not a string.
+    """
+    return sys.intern(name) if isinstance(name, str) else name
+
+
+class ConversationState:
+    """
+    The per-conversation part of an agent, kept as small as possible.
+
+    Uses `__slots__` so no instance `__dict__` is allocated, and bounds the message and context
+    history with ring buffers. Everything shared between conversations (models, intents, entities,
+    fulfilments) lives in `AgentResources` and is only referenced.
+
+    Attributes:
+        active_intent (str): The currently identified intent of the user.
+        active_intent_confidence_score (float): The confidence score of the identified intent.
+        active_context (dict): The current context of the conversation, including extracted entities.
+        required_context (list): Entities still required to fulfill the active intent.
+        active_topic (str): The current entity being extracted from user input.
+        fallback_count (int): The number of times the agent has failed to extract an entity from user input.
+        held_fulfilment (str): The name of the fulfilment that is currently being held.
+        customer_mood_score (float): The sentiment score of the user's last message.
+        customer_mood (str): The sentiment label of the user's last message.
+        messages (ConversationHistory): The recent messages exchanged between the agent and the user, within a token budget.
+        context_history (deque): The most recent entities that have been prompted for.
+        use_dynamo (bool): Whether to use Dynamo for response generation.
+
+    `snapshot` and `restore` convert the state to and from JSON-serialisable data, so a conversation
+    can be stored outside the process and resumed by another one.
+    """
+
+    __slots__ = ("active_intent", "active_intent_confidence_score", "active_context", "required_context",
+                 "active_topic", "fallback_count", "held_fulfilment", "customer_mood_score", "customer_mood",
+                 "messages", "context_history", "use_dynamo")
+
+    def __init__(self, max_messages=50, history_tokens=512, summary_tokens=128):
+        """
+        Initializes a blank conversation state.
+
+        Args:
+            max_messages (int): How many messages (and prompted entities) to keep. Older ones are dropped.
+            history_tokens (int): The token budget of the message history.
+            summary_tokens (int): The part of that budget used to summarize messages that no longer fit.
+        """
+        self.active_intent = None
+        self.active_intent_confidence_score = 1.0
+        self.active_context = {"__context__": get_blank_context()}
+        self.required_context = []
+        self.active_topic = None
+        self.fallback_count = 0
+        self.held_fulfilment = None
+        self.customer_mood_score = 0.0
+        self.customer_mood = 'NEUTRAL'
+        self.messages = ConversationHistory(history_tokens, summary_tokens, max_messages)
+        self.context_history = deque(maxlen=max_messages)
+        self.use_dynamo = False
+
+    def snapshot(self):
+        """
+        Returns the conversation state as JSON-serialisable data, so it can outlive the process.
+
+        Returns:
+            dict: The snapshot, restorable with `restore`.
+        """
+        return {
+            "version": SNAPSHOT_VERSION,
+            "active_intent": self.active_intent,
+            "active_intent_confidence_score": self.active_intent_confidence_score,
+            "active_context": self.active_context,
+            "required_context": self.required_context,
+            "active_topic": self.active_topic,
+            "fallback_count": self.fallback_count,
+            "held_fulfilment": self.held_fulfilment,
+            "customer_mood_score": self.customer_mood_score,
+            "customer_mood": self.customer_mood,
+            "messages": self.messages.snapshot(),
+            "context_history": list(self.context_history),
+            "use_dynamo": self.use_dynamo,
+        }
+
+    def restore(self, snapshot):
+        """
+        Replaces the conversation state with a snapshot taken by `snapshot`.
+
+        Args:
+            snapshot (dict): The snapshot.
+
+        Raises:
+            ValueError: If the snapshot was written by an incompatible version.
+        """
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported conversation snapshot version: {snapshot.get('version')}")
+        self.active_intent = intern_name(snapshot["active_intent"])
+        self.active_intent_confidence_score = snapshot["active_intent_confidence_score"]
+        self.active_context = snapshot["active_context"]
+        self.required_context = [intern_name(name) for name in snapshot["required_context"]]
+        self.active_topic = intern_name(snapshot["active_topic"])
+        self.fallback_count = snapshot["fallback_count"]
+        self.held_fulfilment = snapshot["held_fulfilment"]
+        self.customer_mood_score = snapshot["customer_mood_score"]
+        self.customer_mood = intern_name(snapshot["customer_mood"])
+        self.messages.restore(snapshot["messages"])
+        self.context_history.clear()
+        self.context_history.extend(intern_name(name) for name in snapshot["context_history"])
+        self.use_dynamo = snapshot["use_dynamo"]
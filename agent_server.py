@@ -1,32 +1,60 @@
-from flask import Flask, request
+from flask import Flask, Response, request
 from flask import session as FlaskSession
 from utils import *
-from agent import Agent
-from session import Session as AgentSession
+from agent import Agent, AgentResources, load_resources
+from session import Session as AgentSession, SessionManager
 from twilio.twiml.messaging_response import MessagingResponse
+from nlp import registry as nlp_registry
+from nlp.entities import NER_ONLY
+import telemetry
 
 app = Flask(__name__)
 
+# Function to load the models and configuration shared by every conversation
+def create_resources(max_batch_size=16, max_wait_ms=5):
+    """
+    Loads the models and configuration shared by every conversation.
+
+    This function loads the intent classifier and sentiment analyser models,
+    wraps them so concurrent requests are micro-batched, and reads the agent configuration files once.
+
+    Args:
+        max_batch_size (int): The maximum number of utterances per model call.
+        max_wait_ms (float): How long an utterance may wait for its batch to fill.
+
+    Returns:
+        AgentResources: The shared models and configuration.
+    """
+    return load_resources(max_batch_size, max_wait_ms)
+
+
 # Function to create an instance of the Agent class
-def create_agent():
+def create_agent(resources=None):
     """
     Creates an instance of the Agent class.
 
-    This function loads the intent classifier and sentiment analyser models
-    and initializes an Agent object with them.
+    Args:
+        resources (AgentResources, optional): Already loaded models and configuration. Loaded if not given.
 
     Returns:
         Agent: An instance of the Agent class.
     """
-    intents_classifier = load_intent_classifier( model="shahiryar/crimson-agent", revision="29c3aeb9544b8ba8132bd06347a28a5acb5ba43c")
-    sentiment_analyser = load_sentiment_analyser()
+    return Agent(resources=resources or create_resources())
 
-    agent = Agent(intents_classifier, sentiment_analyser)
-    return agent
 
+# Load the spaCy pipeline up front so the first message doesn't pay for it
+nlp_registry.preload(disable=NER_ONLY)
 
-# Create an instance of the Agent class
-agent = create_agent()
+# Load the models and configuration once, and keep one conversation per WhatsApp sender
+resources = create_resources()
+sessions = SessionManager(resources)
+
+# Run every pipeline before serving, so the first message doesn't pay for lazy initialisation
+print(f"Warmed up: {resources.warm_up()}")
+
+# Export the per-stage timings and the components' counters on /metrics
+resources.register_metrics()
+telemetry.register_stats("sessions", sessions.get_stats)
 
 # Import the Webhook class from the integrations module
 from integrations import Webhook
@@ -46,7 +74,7 @@ def sms_reply():
     Handles incoming SMS messages and generates a response.
 
     This function retrieves the incoming message, sender information, and WaId from the request.
-    It then processes the message using the Agent object and generates a response.
+    It then processes the message in the sender's own session, keyed by WaId, and generates a response.
     If the message contains "balance", it calls the check_balance webhook to retrieve the balance.
     Finally, it constructs a TwiML response with the generated reply and returns it.
 
@@ -60,7 +88,7 @@ def sms_reply():
     waID = request.values.get('WaId', '')
 
     print(request.values)  # Print the request values for debugging
-    agent_reply = agent.process_input(incoming_msg)  # Process the message using the Agent
+    agent_reply = sessions.interact(waID or sender_number, incoming_msg)  # Process the message in the sender's session
 
     # Temporary fix: If the message contains "balance", call the webhook
     if "balance" in incoming_msg:
@@ -76,6 +104,21 @@ def sms_reply():
 
     return str(resp)  # Return the TwiML response as a string
 
+# Define the route for the Prometheus metrics
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    """
+    Returns the metrics in the Prometheus text exposition format.
+
+    This includes the time spent in each stage of a turn (sentiment, cancel detection, intent, entities,
+    rephrasing, LLM calls and webhooks) and the counters of the shared components and sessions.
+    Set `TELEMETRY=off` to disable the timings, or `TELEMETRY_SAMPLE_RATE` to only record some turns.
+
+    Returns:
+        Response: The metrics, as text/plain.
+    """
+    return Response(telemetry.render(), mimetype="text/plain; version=0.0.4")
+
 # Run the Flask app in debug mode
 if __name__ == "__main__":
     app.run(debug=True)
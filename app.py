@@ -1,8 +1,15 @@
+from contextlib import closing
+
 import streamlit as st
 from streamlit_chat import message
 from utils import *
 from agent import Agent
 from session import Session
+from nlp import models
+
+# Cache the loaded models for the life of the Streamlit process, so reruns of the script don't load them again
+load_intent_classifier = st.cache_resource(models.load_intent_classifier)
+load_sentiment_analyser = st.cache_resource(models.load_sentiment_analyser)
 
 # This decorator caches the result of the function call, so that it is only executed once per session.
 # This is useful for functions that are expensive to execute, such as loading large models.
@@ -21,6 +28,7 @@ def create_agent():
     sentiment_analyser = load_sentiment_analyser()
 
     agent = Agent(intents_classifier, sentiment_analyser)
+    agent.stream_rephrasings = True  # Show Dynamo's rephrasings word by word as they are generated
     return agent
 
 # This decorator caches the result of the function call, so that it is only executed once per session.
@@ -65,13 +73,25 @@ st.session_state["messages"] = [] if not ("messages" in st.session_state.keys())
 current_session.set_state("messages", st.session_state["messages"])
 #agent = create_agent()
 
+# Iterate over the messages list in the session state and display them in the chat interface.
+for i, msg in enumerate(st.session_state.messages):
+    is_user = msg["role"] == "user"
+    message(msg["content"], is_user=is_user, key=f"{i}2")
+
 # Get the user input from the chat input field.
 user_input = st.chat_input("Your Message", key="1234") #TODO generate clock bound random key instead
 if user_input:
-    
-    # Interact with the agent using the current session and get the agent's reply.
-    agent_reply = current_session.interact(user_input)["reply"]
+    message(user_input, is_user=True, key=f"{len(st.session_state.messages)}2")
 
+    # Interact with the agent using the current session and get the agent's reply.
+    response = current_session.interact(user_input)
+    agent_reply = response["reply"]
+    if response.get("reply_stream") is not None:
+        # Show the rephrasing as it is generated, instead of waiting for all of it
+        with st.chat_message("assistant"), closing(response["reply_stream"]) as reply_stream:
+            agent_reply = st.write_stream(reply_stream) or agent_reply
+    else:
+        message(agent_reply, key=f"{len(st.session_state.messages) + 1}2")
 
     # Append the user input and the agent's reply to the messages list in the session state.
     st.session_state.messages.append({"role": "user", "content": user_input})
@@ -79,9 +99,4 @@ if user_input:
 
     st.session_state.messages.append({"role": "agent", "content": agent_reply})
     #current_session.session_state["messages"].append({"role": "agent", "content": agent_reply})
-    
-# Iterate over the messages list in the session state and display them in the chat interface.
-for i, msg in enumerate(st.session_state.messages):
-    is_user = msg["role"] == "user"
-    message(msg["content"], is_user=is_user, key=f"{i}2")
 
@@ -0,0 +1,78 @@
+"""
+Checks the two-stage cancel detector against the full spaCy implementation and times both.
+
+Parity: the detector must agree with the reference (a full en_core_web_sm parse followed by the
+keyword check and the matcher) on every labelled phrase. Accuracy against the labels is reported
+for both. Exits with status 1 on any parity mismatch. The phrases are in tests/cancel_phrases.json,
+which tests/test_cancel_intent.py checks too.
+
+Usage:
+    python -m benchmarks.cancel_intent [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from nlp.cancel import CancelIntentDetector, CANCEL_WORDS, CANCEL_PATTERNS
+from nlp.registry import registry
+
+# (phrase, is a cancellation); kept with the tests, which check parity on it too
+with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "cancel_phrases.json")) as file:
+    LABELLED_PHRASES = [tuple(pair) for pair in json.load(file)]
+
+
+def reference_is_cancel(text):
+    """The detector before it gained a lexical first stage: a full parse on every message."""
+    nlp = registry.get_pipeline()
+    doc = nlp(text)
+    if any(token.text.lower() in CANCEL_WORDS for token in doc):
+        return True
+    matcher = registry.get_matcher("cancel_intent_reference", CANCEL_PATTERNS)
+    return len(matcher(doc)) > 0
+
+
+def time_per_call(fn, phrases, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for phrase in phrases:
+            fn(phrase)
+    return (time.perf_counter() - started) / (repeat * len(phrases)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    detector = CancelIntentDetector()
+    detector.preload()
+    reference_is_cancel("warm up")
+
+    mismatches, reference_correct, detector_correct = [], 0, 0
+    for phrase, label in LABELLED_PHRASES:
+        expected, actual = reference_is_cancel(phrase), detector.is_cancel(phrase)
+        reference_correct += expected == label
+        detector_correct += actual == label
+        if expected != actual:
+            mismatches.append((phrase, expected, actual))
+
+    phrases = [phrase for phrase, _ in LABELLED_PHRASES]
+    total = len(phrases)
+    print(f"reference accuracy: {reference_correct}/{total}")
+    print(f"detector accuracy:  {detector_correct}/{total}")
+    print(f"parity:             {total - len(mismatches)}/{total}")
+    for phrase, expected, actual in mismatches:
+        print(f"  MISMATCH {phrase!r}: reference={expected} detector={actual}")
+
+    reference_us = time_per_call(reference_is_cancel, phrases, args.repeat)
+    detector_us = time_per_call(detector.is_cancel, phrases, args.repeat)
+    print(f"reference: {reference_us:10.1f} us/message")
+    print(f"detector:  {detector_us:10.1f} us/message ({reference_us / detector_us:.0f}x)")
+    print(f"stages:    {detector.get_stats()}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Reports how many bytes each idle and each active conversation costs.
+
+Usage:
+    python -m benchmarks.conversation_memory [--conversations 2000]
+"""
+import argparse
+import gc
+import tracemalloc
+
+from agent import Agent, AgentResources
+from benchmarks.stubs import KeywordClassifier, ConstantSentiment
+
+ACTIVE_TURNS = ["Hi", "I want to subscribe", "My name is Ali", "gold", "1234", "Hi there!", "Help me subscribe"]
+
+
+def measure(build, count):
+    """
+    Measures the memory allocated by building `count` objects.
+
+    Args:
+        build (callable): Called with an index, returns the object to keep alive.
+        count (int): How many objects to build.
+
+    Returns:
+        float: Bytes allocated per object.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(i) for i in range(count)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=2000)
+    args = parser.parse_args()
+
+    resources = AgentResources(KeywordClassifier(), ConstantSentiment())
+
+    def idle(_):
+        return Agent(resources=resources)
+
+    def active(_):
+        agent = Agent(resources=resources)
+        for turn in ACTIVE_TURNS:
+            agent.process_input(turn)
+        return agent
+
+    # Run one conversation first so lazily loaded pipelines aren't counted
+    active(0)
+    print(f"idle conversation:   {measure(idle, args.conversations):10.0f} bytes")
+    print(f"active conversation: {measure(active, args.conversations):10.0f} bytes ({len(ACTIVE_TURNS)} turns)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Replays recorded conversations through the agent and reports what each stage of a turn costs.
+
+Transcripts are JSONL files with one user message per line, in order:
+
+    {"conversation": "subscribe-step-by-step", "user": "I want to subscribe"}
+
+Each conversation is replayed through `SessionManager.interact` (and so `Session.interact`) with the
+stub models from `benchmarks.stubs`, and the fulfilment webhooks point at a local `StubServer`. With
+`--dynamo`, every intent rephrases its prompts through a local `StubLLMServer` posing as Gemini.
+
+Reports, per stage (sentiment, cancel detection, intent classification, entity extraction,
+webhooks, rephrasing, and "other" for the rest of the turn: templating, history and bookkeeping),
+the p50/p95/p99 latency of the turns that ran it, plus the whole turn, throughput, memory retained
+per conversation, the memory each turn allocates (p50/p95 of its tracemalloc peak) and peak RSS.
+The first pass over the transcripts warms up caches and lazily loaded pipelines and isn't counted.
+
+With `--baseline`, the results are compared with a stored run (`--save-baseline` writes one) and the
+script exits with status 1 if any latency or memory figure grew, or the throughput fell, by more
+than `--tolerance`. benchmarks/baseline.json is a run with the default options, and records the
+environment it was measured in. The allocation figures carry over between machines with the same
+Python and spaCy model; latencies, throughput and RSS are only comparable on the machine that wrote
+the baseline, so save your own before comparing those.
+
+Usage:
+    python -m benchmarks.conversation_replay [--transcripts benchmarks/transcripts/default.jsonl] [--repeat 20]
+        [--model-ms 0] [--webhook-ms 0] [--dynamo] [--baseline benchmarks/baseline.json] [--save-baseline]
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from agent import AgentResources
+from benchmarks.stub_server import StubServer, StubLLMServer
+from benchmarks.stubs import KeywordClassifier, ConstantSentiment
+from nlp.cancel import cancel_detector
+from nlp.entities import NER_ONLY
+from session import SessionManager
+
+DEFAULT_TRANSCRIPTS = os.path.join(os.path.dirname(__file__), "transcripts", "default.jsonl")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+STAGES = ("sentiment", "cancel", "classify", "entities", "webhooks", "rephrase", "other", "turn")
+
+
+def load_transcripts(paths):
+    """
+    Reads transcripts, grouping the messages by conversation in file order.
+
+    Args:
+        paths (list): The JSONL files.
+
+    Returns:
+        dict: The user messages of each conversation, keyed by conversation id.
+    """
+    conversations = defaultdict(list)
+    for path in paths:
+        with open(path) as file:
+            for number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    conversations[f"{os.path.basename(path)}:{record['conversation']}"].append(record["user"])
+                except (ValueError, KeyError) as e:
+                    raise ValueError(f"{path}:{number}: not a transcript line: {e}") from e
+    return dict(conversations)
+
+
+class StageTimer:
+    """
+    Times the stages of each turn by wrapping the callables that run them.
+
+    Timings are accumulated per thread, so stages of concurrent turns don't mix, and recorded as one
+    sample per stage per turn that ran it.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._turn = threading.local()
+        self._lock = threading.Lock()
+
+    def wrap(self, stage, function):
+        """Returns `function`, timed under `stage`."""
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                spent = getattr(self._turn, "stages", None)
+                if spent is not None:
+                    spent[stage] += time.perf_counter() - started
+        return timed
+
+    def patch(self, owner, name, stage):
+        """Times an attribute of an object, shadowing methods with an instance attribute."""
+        setattr(owner, name, self.wrap(stage, getattr(owner, name)))
+
+    def turn(self, function, *args):
+        """Runs a whole turn, then records its stages."""
+        self._turn.stages = spent = defaultdict(float)
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            total = time.perf_counter() - started
+            self._turn.stages = None
+            spent["other"] = max(0.0, total - sum(spent.values()))
+            spent["turn"] = total
+            with self._lock:
+                for stage, seconds in spent.items():
+                    self.samples[stage].append(seconds * 1000)
+
+    def reset(self):
+        with self._lock:
+            self.samples = defaultdict(list)
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def build_resources(args, webhook_url, llm_url, timer):
+    """Loads the agent resources on the stub models and webhooks, with every stage timed."""
+    with open(args.fulfilments) as file:
+        fulfilments = file.read().replace("http://127.0.0.1:8000", webhook_url)
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+        file.write(fulfilments)
+    try:
+        resources = AgentResources(KeywordClassifier(args.intents, delay=args.model_ms / 1000),
+                                   ConstantSentiment(delay=args.model_ms / 1000),
+                                   intents_path=args.intents, agent_config_path=args.agent_config, fulfilments_path=file.name)
+    finally:
+        os.unlink(file.name)
+
+    if llm_url:
+        from nlp.llm import GeminiBackend, set_backend
+        set_backend("gemini", GeminiBackend(api_key="stub", base_url=llm_url))
+        for intent in resources.intents.values():
+            intent["use_dynamo"] = True
+
+    timer.patch(resources, "sentiment_analyser", "sentiment")
+    timer.patch(resources, "intent_classifier", "classify")
+    if resources.fast_intent_matcher is not None:
+        timer.patch(resources.fast_intent_matcher, "match", "classify")
+    timer.patch(cancel_detector, "is_cancel", "cancel")
+    timer.patch(resources.entity_extractor, "extract_all", "entities")
+    timer.patch(resources.fulfilment_executor, "run", "webhooks")
+    timer.patch(resources.rephraser, "rephrase", "rephrase")
+    return resources
+
+
+def replay(manager, timer, conversations, run, concurrency):
+    """Plays every conversation once, each under its own session key; returns the elapsed seconds."""
+    def converse(item):
+        name, messages = item
+        for message in messages:
+            timer.turn(manager.interact, f"{run}:{name}", message)
+        manager.remove(f"{run}:{name}")
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as clients:
+            list(clients.map(converse, conversations.items()))
+    else:
+        for item in conversations.items():
+            converse(item)
+    return time.perf_counter() - started
+
+
+def measure_memory(manager, timer, conversations):
+    """
+    Replays the conversations once more under tracemalloc.
+
+    Returns:
+        tuple: The bytes still held per live conversation afterwards, and for each turn the most
+            memory it had allocated at once (its peak above what was traced when it started).
+    """
+    allocated = []
+
+    def traced_turn(key, message):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            return manager.interact(key, message)
+        finally:
+            allocated.append(tracemalloc.get_traced_memory()[1] - before)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for name, messages in conversations.items():
+        for message in messages:
+            timer.turn(traced_turn, f"memory:{name}", message)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    for name in conversations:
+        manager.remove(f"memory:{name}")
+    return (after - before) / len(conversations), allocated
+
+
+def environment():
+    """Describes what the figures were measured on, so a baseline from elsewhere can be told apart."""
+    from nlp.registry import registry
+    meta = registry.get_pipeline(disable=NER_ONLY).meta
+    return {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+            "spacy_model": f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}"}
+
+
+def compare(results, baseline, tolerance, min_ms):
+    """
+    Lists the figures that regressed against the baseline by more than `tolerance`.
+
+    Latencies below `min_ms` in both runs are timer noise and are skipped.
+    """
+    regressions = []
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if max(current[key], previous[key]) >= min_ms and current[key] > previous[key] * (1 + tolerance):
+                regressions.append(f"{stage} {key}: {previous[key]:.3f} -> {current[key]:.3f}")
+    for key in ("retained_bytes_per_conversation", "peak_rss_kb"):
+        if baseline.get(key) and results[key] > baseline[key] * (1 + tolerance):
+            regressions.append(f"{key}: {baseline[key]:.0f} -> {results[key]:.0f}")
+    for key, previous in baseline.get("allocated_bytes_per_turn", {}).items():
+        if previous and results["allocated_bytes_per_turn"][key] > previous * (1 + tolerance):
+            regressions.append(f"allocated_bytes_per_turn {key}: {previous:.0f} -> {results['allocated_bytes_per_turn'][key]:.0f}")
+    if baseline.get("turns_per_second") and results["turns_per_second"] < baseline["turns_per_second"] * (1 - tolerance):
+        regressions.append(f"turns_per_second: {baseline['turns_per_second']:.1f} -> {results['turns_per_second']:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transcripts", nargs="+", default=[DEFAULT_TRANSCRIPTS])
+    parser.add_argument("--repeat", type=int, default=20, help="timed passes over the transcripts")
+    parser.add_argument("--concurrency", type=int, default=1, help="conversations replayed at once")
+    parser.add_argument("--model-ms", type=float, default=0, help="simulated cost of each model call")
+    parser.add_argument("--webhook-ms", type=float, default=0, help="delay of the stub webhook server")
+    parser.add_argument("--dynamo", action="store_true", help="rephrase every prompt through a stub LLM")
+    parser.add_argument("--llm-ms", type=float, default=0, help="delay of the stub LLM server")
+    parser.add_argument("--intents", default="./intents.json")
+    parser.add_argument("--agent-config", default="./agent-config.json")
+    parser.add_argument("--fulfilments", default="./fulfilments.json")
+    parser.add_argument("--baseline", default=None, help=f"compare with this run (e.g. {os.path.relpath(DEFAULT_BASELINE)})")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--min-ms", type=float, default=0.05, help="ignore latencies below this in both runs")
+    args = parser.parse_args()
+
+    conversations = load_transcripts(args.transcripts)
+    turns = sum(len(messages) for messages in conversations.values())
+    timer = StageTimer()
+    # The agent prints as it goes; keep it out of the report (the printing is still timed)
+    with StubServer(delay=args.webhook_ms / 1000) as webhooks, StubLLMServer(delay=args.llm_ms / 1000) as llm, \
+            open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        resources = build_resources(args, webhooks.url, llm.url if args.dynamo else None, timer)
+        manager = SessionManager(resources)
+        replay(manager, timer, conversations, "warm-up", args.concurrency)
+        timer.reset()
+        elapsed = sum(replay(manager, timer, conversations, run, args.concurrency) for run in range(args.repeat))
+        samples = timer.samples
+        timer.reset()
+        retained, allocated = measure_memory(manager, timer, conversations)
+
+    results = {
+        "transcripts": [os.path.relpath(path) for path in args.transcripts],
+        "environment": environment(),
+        "turns": turns * args.repeat,
+        "turns_per_second": turns * args.repeat / elapsed,
+        "retained_bytes_per_conversation": retained,
+        "allocated_bytes_per_turn": {"p50": percentile(sorted(allocated), 0.5), "p95": percentile(sorted(allocated), 0.95)},
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,  # kB on Linux
+        "stages": {},
+    }
+    print(f"{len(conversations)} conversations, {turns} turns, {args.repeat} passes")
+    print(f"{'stage':>10} {'turns':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for stage in STAGES:
+        ordered = sorted(samples.get(stage, []))
+        if not ordered:
+            continue
+        stats = {"turns": len(ordered), "p50_ms": percentile(ordered, 0.5), "p95_ms": percentile(ordered, 0.95), "p99_ms": percentile(ordered, 0.99)}
+        results["stages"][stage] = stats
+        print(f"{stage:>10} {stats['turns']:>7} {stats['p50_ms']:>8.3f} {stats['p95_ms']:>8.3f} {stats['p99_ms']:>8.3f}")
+    print(f"throughput: {results['turns_per_second']:.1f} turns/s")
+    print(f"retained:   {retained:.0f} bytes per live conversation")
+    print(f"allocated:  {results['allocated_bytes_per_turn']['p50'] / 1024:.1f} kB per turn at p50, "
+          f"{results['allocated_bytes_per_turn']['p95'] / 1024:.1f} kB at p95 (tracemalloc peak)")
+    print(f"peak RSS:   {results['peak_rss_kb'] / 1024:.1f} MB")
+
+    if not args.baseline:
+        return 0
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"Saved the baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; write one with --save-baseline")
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline.get("environment") != results["environment"]:
+        print(f"The baseline was measured in {baseline.get('environment')}, not {results['environment']}")
+    regressions = compare(results, baseline, args.tolerance, args.min_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%} against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Reports how long the agent packages take to import, and checks they don't load heavy dependencies.
+
+Each module is imported in a fresh interpreter with `-X importtime`, `--repeat` times; the fastest
+run is reported with the module's total import time and its most expensive dependencies. The
+heavy dependencies (models, Streamlit, Twilio, HTTP clients) must only load when first used:
+the script exits with status 1 if importing any of the modules pulls one in.
+
+Usage:
+    python -m benchmarks.import_time [--modules agent utils ...] [--repeat 5] [--top 5]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["agent", "utils", "integrations", "nlp.dynamo", "session", "telemetry", "training"]
+HEAVY_MODULES = ["streamlit", "twilio", "requests", "dotenv", "transformers", "tensorflow", "torch", "onnxruntime",
+                 "spacy", "langchain_community", "datasets", "evaluate", "pandas", "huggingface_hub"]
+
+
+def import_profile(module):
+    """
+    Imports a module in a fresh interpreter.
+
+    Args:
+        module (str): The module name.
+
+    Returns:
+        tuple: The cumulative microseconds of the module, those of the other packages it imports
+            directly (by name), and the names of all the modules loaded afterwards.
+
+    Raises:
+        RuntimeError: If the module can't be imported.
+    """
+    code = f"import sys, json; import {module}; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name[1:].rstrip()
+        entries.append((len(name) - len(name.lstrip()), name.strip(), int(cumulative)))
+
+    # Imports are listed after the imports they trigger; walk back from the top to find each one's parent
+    package = module.split(".")[0]
+    total, dependencies, stack, parents = 0, {}, [], []
+    for depth, name, cumulative in reversed(entries):
+        while stack and stack[-1] >= depth:
+            stack.pop()
+            parents.pop()
+        parent = parents[-1] if stack else None
+        stack.append(depth)
+        parents.append(name)
+        if name == module and parent is None:
+            total = cumulative
+        elif parent is not None and parent.split(".")[0] == package and name.split(".")[0] != package:
+            dependencies[name] = dependencies.get(name, 0) + cumulative
+    return total, dependencies, json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="dependencies listed per module")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':>14} {'import ms':>10}  slowest dependencies")
+    for module in args.modules:
+        try:
+            runs = [import_profile(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{module:>14} {'-':>10}  could not import: {e}")
+            failed = True
+            continue
+        total, dependencies, loaded = min(runs, key=lambda run: run[0])
+        slowest = sorted(dependencies.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        print(f"{module:>14} {total / 1000:>10.1f}  {', '.join(f'{name} {us / 1000:.1f}' for name, us in slowest)}")
+        heavy = [name for name in HEAVY_MODULES if name in loaded]
+        if heavy:
+            print(f"{'':>14} {'':>10}  LOADS {', '.join(heavy)} at import")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Checks the ONNX intent classifier against the transformers pipeline and times both.
+
+Parity: every trainable training phrase in intents.json is classified by both backends. Reports
+each backend's accuracy against the phrase's own intent, how often the two agree on the top intent,
+and the largest difference in its score. Exits with status 1 if agreement is below `--min-agreement`.
+
+Latency: single-utterance p50/p95 per backend, and throughput on batches of `--batch-size`.
+
+Export the model first with `python -m training.export`.
+
+Usage:
+    python -m benchmarks.intent_backends [--onnx-dir ./artefacts/intent-onnx] [--graph model.int8.onnx] [--repeat 5]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+
+from agent.resources import INTENT_MODEL, INTENT_MODEL_REVISION
+from training.export import DEFAULT_EXPORT_DIR
+
+
+def labelled_phrases(intents_path):
+    with open(intents_path) as file:
+        intents = json.load(file)
+    return [(phrase, label) for label, intent in intents.items() if intent["trainable"] for phrase in intent["training_phrases"]]
+
+
+def latencies_ms(classifier, phrases, repeat):
+    timings = []
+    for _ in range(repeat):
+        for phrase in phrases:
+            started = time.perf_counter()
+            classifier(phrase, top_k=None)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95)]
+
+
+def throughput(classifier, phrases, batch_size, repeat):
+    batches = [phrases[i:i + batch_size] for i in range(0, len(phrases), batch_size)]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for batch in batches:
+            classifier(batch, top_k=None)
+    return repeat * len(phrases) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--intents", default="./intents.json")
+    parser.add_argument("--onnx-dir", default=DEFAULT_EXPORT_DIR)
+    parser.add_argument("--graph", default=None, help="ONNX file in --onnx-dir (default: the exported one)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--min-agreement", type=float, default=0.98)
+    args = parser.parse_args()
+
+    from transformers import pipeline
+    from nlp.onnx_classifier import OnnxTextClassifier
+
+    backends = {
+        "transformers": pipeline("text-classification", model=INTENT_MODEL, revision=INTENT_MODEL_REVISION),
+        "onnx": OnnxTextClassifier(args.onnx_dir, graph=args.graph),
+    }
+    phrases = labelled_phrases(args.intents)
+    texts = [phrase for phrase, _ in phrases]
+    for classifier in backends.values():
+        classifier("warm up", top_k=None)
+
+    predictions = {name: [classifier(text, top_k=None)[0] for text in texts] for name, classifier in backends.items()}
+    agree = sum(a["label"] == b["label"] for a, b in zip(predictions["transformers"], predictions["onnx"]))
+    max_score_diff = max(abs(a["score"] - b["score"]) for a, b in zip(predictions["transformers"], predictions["onnx"]))
+    agreement = agree / len(texts)
+
+    print(f"{len(texts)} training phrases")
+    for name, predicted in predictions.items():
+        correct = sum(prediction["label"] == label for prediction, (_, label) in zip(predicted, phrases))
+        print(f"{name:>12} accuracy: {correct}/{len(texts)}")
+    print(f"top-intent agreement: {agree}/{len(texts)} ({agreement:.1%}), max score difference {max_score_diff:.4f}")
+    for (text, label), a, b in zip(phrases, predictions["transformers"], predictions["onnx"]):
+        if a["label"] != b["label"]:
+            print(f"  DISAGREE {text!r} ({label}): transformers={a['label']} onnx={b['label']}")
+
+    print(f"{'backend':>12} {'p50 ms':>8} {'p95 ms':>8} {'batch/s':>10}")
+    for name, classifier in backends.items():
+        p50, p95 = latencies_ms(classifier, texts, args.repeat)
+        rate = throughput(classifier, texts, args.batch_size, args.repeat)
+        print(f"{name:>12} {p50:>8.2f} {p95:>8.2f} {rate:>10.1f}")
+    return 0 if agreement >= args.min_agreement else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Measures how conversation throughput scales with the number of pre-forked workers.
+
+Each run loads the (stub) models once, forks the workers with `PreforkDispatcher`, and plays
+scripted conversations against them concurrently; every conversation's turns are sequential, as
+they would be from one WhatsApp sender. The stub models spin the CPU for `--model-ms` per call to
+stand in for inference. Worker memory is reported as PSS (shared pages split between the
+processes sharing them) where /proc provides it, to show the models are not copied per worker.
+
+Usage:
+    python -m benchmarks.prefork_scaling [--workers 1 2 4] [--conversations 200] [--model-ms 2]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agent import AgentResources
+from benchmarks.conversation_memory import ACTIVE_TURNS
+from benchmarks.stubs import KeywordClassifier, ConstantSentiment
+from prefork_server import PreforkDispatcher
+
+
+def pss_kb(pid):
+    """Returns the proportional set size of a process in kB, or None where /proc doesn't report it."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as file:
+            for line in file:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def run(workers, conversations, concurrency, model_ms):
+    resources = AgentResources(KeywordClassifier(delay=model_ms / 1000), ConstantSentiment(delay=model_ms / 1000))
+    dispatcher = PreforkDispatcher(resources, workers=workers, threads=max(1, concurrency // workers))
+    dispatcher.start()
+
+    def converse(index):
+        for turn in ACTIVE_TURNS:
+            dispatcher.interact(f"conversation-{index}", turn)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as clients:
+            started = time.perf_counter()
+            list(clients.map(converse, range(conversations)))
+            elapsed = time.perf_counter() - started
+        memory = [pss_kb(worker["pid"]) for worker in dispatcher.get_stats()["workers"]]
+    finally:
+        dispatcher.stop()
+    return conversations * len(ACTIVE_TURNS) / elapsed, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="conversations in flight at once")
+    parser.add_argument("--model-ms", type=float, default=2.0, help="CPU time per model call")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.conversations} conversations of {len(ACTIVE_TURNS)} turns")
+    print(f"{'workers':>7} {'turns/s':>10} {'speedup':>8} {'PSS per worker':>15}")
+    baseline = None
+    for workers in args.workers:
+        throughput, memory = run(workers, args.conversations, args.concurrency, args.model_ms)
+        baseline = baseline or throughput
+        known = [kb for kb in memory if kb is not None]
+        pss = f"{sum(known) / len(known) / 1024:.1f} MB" if known else "n/a"
+        print(f"{workers:>7} {throughput:>10.1f} {throughput / baseline:>7.2f}x {pss:>15}")
+
+
+if __name__ == "__main__":
+    main()
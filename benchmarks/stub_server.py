@@ -0,0 +1,153 @@
+"""
+Local HTTP servers standing in for fulfilment webhooks and LLM APIs, for benchmarks and manual testing.
+
+Usage:
+    python -m benchmarks.stub_server [--port 8000] [--delay-ms 0] [--llm]
+"""
+import argparse
+import json
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers the endpoints in fulfilments.json: `POST /send_money` echoes the payload and
+    `GET /check_balance/<name>` returns a fixed balance.
+    """
+    protocol_version = "HTTP/1.1"  # Keep-alive, like a real backend
+    disable_nagle_algorithm = True  # Or every keep-alive response after the first waits out a delayed ACK
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            fail = server.failures_left > 0
+            if fail:
+                server.failures_left -= 1
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        time.sleep(server.delay)
+        if fail:
+            return self._reply(503, {"error": "stub failure"})
+        handler = server.routes.get((self.command, self.path.split("/")[1]))
+        if handler is None:
+            return self._reply(404, {"error": "not found"})
+        result = handler(self.path, json.loads(body) if body else None)
+        if isinstance(result, types.GeneratorType):
+            return self._stream(result)
+        self._reply(200, result)
+
+    def _stream(self, chunks):
+        """Sends each chunk as soon as it is produced, using chunked transfer encoding."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            data = chunk.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Threaded stub server. Use as a context manager to run it on a background thread.
+
+    Attributes:
+        delay (float): Seconds to wait before answering each request.
+        failures_left (int): How many upcoming requests get a 503.
+        requests (int): How many requests have been received.
+        routes (dict): Handlers keyed by (method, first path segment), returning the JSON body.
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, delay=0.0, failures=0):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.delay = delay
+        self.failures_left = failures
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.routes = {
+            ("POST", "send_money"): lambda path, payload: {"status": "sent", "payload": payload},
+            ("GET", "check_balance"): lambda path, payload: {"name": path.split("/")[-1], "balance": 100},
+        }
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class StubLLMServer(StubServer):
+    """
+    Stub server speaking the Ollama `/api/generate` and Gemini `generateContent` APIs.
+
+    Replies "Rephrased: <prompt>" word by word, waiting `token_delay` seconds between words when streaming.
+
+    Attributes:
+        token_delay (float): Seconds between streamed words.
+    """
+
+    def __init__(self, port=0, delay=0.0, failures=0, token_delay=0.0):
+        super().__init__(port, delay, failures)
+        self.token_delay = token_delay
+        self.routes = {
+            ("POST", "api"): self._ollama,
+            ("POST", "v1beta"): self._gemini,
+        }
+
+    def _words(self, prompt):
+        for i, word in enumerate(f"Rephrased: {prompt}".split(" ")):
+            if i:
+                time.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+    def _ollama(self, path, payload):
+        if not payload.get("stream", True):
+            return {"model": payload["model"], "response": "".join(self._words(payload["prompt"])), "done": True}
+        return (json.dumps({"response": word, "done": False}) + "\n" for word in [*self._words(payload["prompt"]), ""])
+
+    def _gemini(self, path, payload):
+        prompt = payload["contents"][0]["parts"][0]["text"]
+        reply = lambda text: {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+        if ":streamGenerateContent" not in path:
+            return reply("".join(self._words(prompt)))
+        return (f"data: {json.dumps(reply(word))}\n\n" for word in self._words(prompt))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--delay-ms", type=float, default=0)
+    parser.add_argument("--llm", action="store_true", help="serve the Ollama and Gemini APIs instead of the webhooks")
+    args = parser.parse_args()
+    server = StubLLMServer(args.port, args.delay_ms / 1000) if args.llm else StubServer(args.port, args.delay_ms / 1000)
+    print(f"Stub {'LLM' if args.llm else 'webhook'} server listening on {server.url}")
+    server.serve_forever()
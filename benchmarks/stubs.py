@@ -0,0 +1,77 @@
+"""
+Stand-in models for benchmarks, so the agent can be exercised without downloading transformer weights.
+"""
+import json
+
+
+class KeywordClassifier:
+    """
+    Mimics the transformers text-classification pipeline by scoring intents on training phrase word overlap.
+
+    Attributes:
+        labels (list): The intent names it can return.
+        delay (float): Seconds of busy work per utterance, to simulate model cost.
+    """
+
+    def __init__(self, intents_path="./intents.json", delay=0.0):
+        """
+        Initializes the classifier from an intents file.
+
+        Args:
+            intents_path (str): The path to the JSON file containing intent configurations.
+            delay (float): Seconds of busy work per utterance, to simulate model cost.
+        """
+        with open(intents_path) as file:
+            intents = json.load(file)
+        self.vocab = {}
+        for label, intent in intents.items():
+            if intent["trainable"]:
+                words = set()
+                for phrase in intent["training_phrases"]:
+                    words.update(phrase.lower().split())
+                self.vocab[label] = words
+        self.labels = list(self.vocab)
+        self.delay = delay
+
+    def _classify(self, utterance):
+        _busy(self.delay)
+        words = set(utterance.lower().split())
+        overlaps = {label: len(words & vocab) + 0.1 for label, vocab in self.vocab.items()}
+        total = sum(overlaps.values())
+        return sorted(({"label": label, "score": overlap / total} for label, overlap in overlaps.items()),
+                      key=lambda item: item["score"], reverse=True)
+
+    def __call__(self, inputs, top_k=1):
+        if isinstance(inputs, str):
+            result = self._classify(inputs)
+            return result if top_k is None else result[:top_k]
+        results = [self._classify(text) for text in inputs]
+        return results if top_k is None else [result[0] for result in results]
+
+
+class ConstantSentiment:
+    """
+    Mimics the transformers sentiment-analysis pipeline, always answering the same label.
+    """
+
+    def __init__(self, label="POSITIVE", score=0.9, delay=0.0):
+        self.result = {"label": label, "score": score}
+        self.delay = delay
+
+    def __call__(self, inputs):
+        if isinstance(inputs, str):
+            _busy(self.delay)
+            return [dict(self.result)]
+        for _ in inputs:
+            _busy(self.delay)
+        return [dict(self.result) for _ in inputs]
+
+
+def _busy(seconds):
+    """Spins the CPU for the given time, like a model forward pass would."""
+    if seconds <= 0:
+        return
+    import time
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
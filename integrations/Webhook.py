@@ -1,7 +1,6 @@
-import requests
-from string import Template
 import json
 import re
+from .templates import CompiledTemplate, PayloadBuilder
 
 
 class Webhook:
@@ -17,25 +16,29 @@ class Webhook:
         description (str): A brief description of the webhook's purpose.
         url (str): The URL of the webhook endpoint.
         request_type (str): The HTTP request type (POST or GET).
-        template_payload (str): A template string for the POST request payload.
         payload_data_needed (list): A list of variable names required for the template payload.
-        template_payload (Template): A Template object for the POST request payload.
+        template_payload (CompiledTemplate): The pre-tokenized template for the POST request payload.
+        payload_builder (PayloadBuilder): Builds the POST payload directly from the pre-parsed template.
+        timeout (float): Seconds to wait for the endpoint before giving up.
+        retries (int): How many times a failed call is retried.
+        backoff (float): Seconds before the first retry, doubled for each further one.
+        fire_and_forget (bool): Whether the agent can reply without waiting for this call.
     """
 
-    def __init__(self, name:str, fulfilments_path:str="./fulfilments.json"):
+    def __init__(self, name:str, fulfilments_path:str="./fulfilments.json", config:dict=None):
         """
         Initializes the Webhook object.
 
         Args:
             name (str): The name of the webhook.
-            fulfilments_path (str): The path to the JSON file containing webhook configurations.
+            fulfilments_path (str): The path to the JSON file containing webhook configurations. Parsed once per process.
+            config (dict, optional): The webhook's entry from the fulfilments file, if already parsed.
         """
         self.name = name
-        with open(fulfilments_path) as file:
-            fulfilments = file.read()
-        
-        fulfilments = json.loads(fulfilments)
-        webhook_dict = fulfilments[name]
+        if config is None:
+            from .registry import load_fulfilment_configs
+            config = load_fulfilment_configs(fulfilments_path)[name]
+        webhook_dict = config
 
         self.display_name = webhook_dict["display_name"]
         self.description = webhook_dict["description"]
@@ -43,13 +46,17 @@ class Webhook:
 
         self.url = webhook_dict.get('url')
         self.request_type = webhook_dict.get('request_type')
+        self.timeout = webhook_dict.get('timeout', 5)
+        self.retries = webhook_dict.get('retries', 0)
+        self.backoff = webhook_dict.get('backoff', 0.2)
+        self.fire_and_forget = webhook_dict.get('fire_and_forget', False)
 
         if self.request_type == 'POST':
-            self.template_payload = webhook_dict.get('template_payload')
-            self.payload_data_needed = self.get_variables(self.template_payload)
-            self.template_payload = Template(self.template_payload)
+            self.payload_builder = PayloadBuilder(webhook_dict.get('template_payload'))
+            self.template_payload = self.payload_builder.template
+            self.payload_data_needed = self.payload_builder.variables
         elif self.request_type == 'GET':
-            self.url = Template(self.url)
+            self.url = CompiledTemplate(self.url)
 
     def get_variables(self, tmp_str):
         """
@@ -67,9 +74,65 @@ class Webhook:
 
         return variables
 
+    def url_for(self, data_dict):
+        """
+        Returns the endpoint URL for the given data.
+
+        Args:
+            data_dict (dict): A dictionary containing data to be used for template substitution.
+
+        Returns:
+            str: The URL, with placeholders substituted for GET webhooks.
+        """
+        return self.url.safe_substitute(data_dict) if self.request_type == "GET" else self.url
+
+    def send(self, data_dict, session=None, timeout=None):
+        """
+        Sends the HTTP request to the webhook endpoint without interpreting the response.
+
+        Args:
+            data_dict (dict): A dictionary containing data to be used for template substitution.
+            session (requests.Session, optional): The keep-alive session to send on. Defaults to the shared pool's session for the host.
+            timeout (float, optional): Seconds to wait for the endpoint. Defaults to the webhook's timeout.
+
+        Returns:
+            requests.Response: The HTTP response.
+
+        Raises:
+            requests.RequestException: If the request could not be completed.
+            json.JSONDecodeError: If the POST payload template does not form valid JSON.
+        """
+        url = self.url_for(data_dict)
+        if session is None:
+            from .executor import get_default_executor
+            session = get_default_executor().session_for(url)
+        timeout = self.timeout if timeout is None else timeout
+
+        if self.request_type == "POST":
+            # Fill the pre-parsed payload template with data from data_dict
+            payload = self.payload_builder.build(data_dict)
+            headers = {'Content-Type': 'application/json'}
+            return session.post(url, headers=headers, json=payload, timeout=timeout)
+        return session.get(url, timeout=timeout)
+
+    def parse_response(self, response):
+        """
+        Extracts the result from a webhook response.
+
+        Args:
+            response (requests.Response): The HTTP response.
+
+        Returns:
+            tuple: A tuple containing the HTTP status code and the response data.
+        """
+        if self.request_type == "GET":
+            return response.status_code, response.json()["balance"]
+        return response.status_code, response.json() if 'application/json' in response.headers.get('Content-Type', '') else response.text
+
     def call(self, data_dict):
         """
-        Makes the HTTP request to the webhook endpoint.
+        Makes the HTTP request to the webhook endpoint, through the shared `FulfilmentExecutor`, so the
+        webhook's retries, backoff and timeout apply and the call is traced and counted.
 
         Args:
             data_dict (dict): A dictionary containing data to be used for template substitution.
@@ -77,21 +140,17 @@ class Webhook:
         Returns:
             tuple: A tuple containing the HTTP status code and the response data.
         """
+        import requests  # Imported on first use, so loading the agent doesn't pay for it
+        from .executor import get_default_executor
+
         # Make the HTTP request
         if self.request_type == "POST":
-            # Substitute placeholders in the template with data from data_dict
-            payload = self.template_payload.safe_substitute(data_dict)
-            payload = json.loads(payload)
-            headers = {'Content-Type': 'application/json'}
             try:
-                response = requests.post(self.url, headers=headers, json=payload)
-                return response.status_code, response.json() if 'application/json' in response.headers['Content-Type'] else response.text
+                return get_default_executor().call(self, data_dict)
             except json.JSONDecodeError as e:
                 return 400, {'error': f'Invalid JSON payload: {e}'}
         elif self.request_type == "GET":
             try:
-                url = self.url.safe_substitute(data_dict)
-                response = requests.get(url)
-                return response.json()["balance"]
-            except:
+                return get_default_executor().call(self, data_dict)[1]
+            except (requests.RequestException, ValueError, KeyError):
                 return 400, {'error': 'could not send the request'}
@@ -1,6 +1,4 @@
-from twilio.rest import Client
 import os
-from dotenv import load_dotenv
 
 class Whatsapp:
     """
@@ -37,6 +35,7 @@ class Whatsapp:
         Returns:
             bool: True if successful, False otherwise.
         """
+        from dotenv import load_dotenv
         if load_dotenv():  # Load environment variables from .env file
             try:
                 self.account_sid = os.getenv("TWILLIO_ACCOUNT_SID")  # Get account SID from environment
@@ -98,6 +97,7 @@ class Whatsapp:
             bool: True if client creation was successful, False otherwise.
         """
         if self.account_sid and self.auth_token:
+            from twilio.rest import Client  # Imported here, so importing integrations doesn't load twilio
             client = Client(self.account_sid, self.auth_token)  # Create Twilio client
             self.twilioClient = client
             return True
@@ -112,7 +112,7 @@ class Whatsapp:
         Returns:
             Client: The Twilio client object.
         """
-      return self.twilioClient
+        return self.twilioClient
 
     def receive_message(self):
         """
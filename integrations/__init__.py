@@ -1,2 +1,4 @@
 from .Whatsapp import Whatsapp
-from .Webhook import Webhook
\ No newline at end of file
+from .Webhook import Webhook
+from .executor import FulfilmentExecutor, get_default_executor
+from .registry import load_fulfilments, load_fulfilment_configs
\ No newline at end of file
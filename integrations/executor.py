@@ -0,0 +1,215 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import telemetry
+
+
+class FulfilmentExecutor:
+    """
+    Runs webhook fulfilments on a shared thread pool over keep-alive connections.
+
+    Each host gets its own `requests.Session` with a bounded connection pool, so repeated calls reuse
+    TCP/TLS connections. The fulfilments of an intent run concurrently; the caller only waits for the
+    ones that are not marked `fire_and_forget`. Every call honours its webhook's timeout, and
+    connection errors, timeouts and 5xx responses are retried with exponential backoff.
+
+    Attributes:
+        max_workers (int): The number of fulfilments that may run at once.
+        pool_maxsize (int): The number of keep-alive connections kept per host.
+    """
+
+    def __init__(self, max_workers=8, pool_maxsize=10):
+        """
+        Initializes the FulfilmentExecutor.
+
+        Args:
+            max_workers (int): The number of fulfilments that may run at once.
+            pool_maxsize (int): The number of keep-alive connections kept per host.
+        """
+        self.max_workers = max_workers
+        self.pool_maxsize = pool_maxsize
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fulfilment")
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._failed = 0  # Fire-and-forget calls that raised, which no caller sees
+        self._metrics = {}
+
+    def session_for(self, url):
+        """
+        Returns the keep-alive session for the host of a URL.
+
+        Args:
+            url (str): Any URL on the host.
+
+        Returns:
+            requests.Session: The host's session.
+        """
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    import requests  # Imported on first use, so loading the agent doesn't pay for it
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._sessions[host] = session
+        return session
+
+    @telemetry.traced("webhook")
+    def call(self, webhook, data_dict):
+        """
+        Calls a webhook, retrying with backoff as configured on it.
+
+        Args:
+            webhook (Webhook): The webhook to call.
+            data_dict (dict): The data used for template substitution.
+
+        Returns:
+            tuple: The HTTP status code and the response data.
+
+        Raises:
+            requests.RequestException: If the last attempt failed to connect or timed out.
+            Exception: Whatever `webhook.parse_response` raised for the last response.
+        """
+        import requests
+        with self._lock:
+            self._in_flight += 1
+        started = time.perf_counter()
+        retries, error = 0, None
+        try:
+            for attempt in range(webhook.retries + 1):
+                if attempt:
+                    retries += 1
+                    time.sleep(webhook.backoff * 2 ** (attempt - 1))
+                try:
+                    response = webhook.send(data_dict, session=self.session_for(webhook.url_for(data_dict)))
+                except requests.RequestException as e:
+                    error = e
+                    continue
+                if response.status_code >= 500 and attempt < webhook.retries:
+                    continue
+                # A final server error is still returned to the caller, but counted as a failure
+                error = requests.HTTPError(f"{response.status_code} from {webhook.name}", response=response) if response.status_code >= 500 else None
+                try:
+                    return webhook.parse_response(response)
+                except Exception as e:
+                    error = e
+                    raise
+            raise error
+        finally:
+            self._record(webhook.name, time.perf_counter() - started, retries, error)
+            with self._lock:
+                self._in_flight -= 1
+
+    def submit(self, webhook, data_dict):
+        """
+        Calls a webhook in the background.
+
+        Args:
+            webhook (Webhook): The webhook to call.
+            data_dict (dict): The data used for template substitution. A copy is taken.
+
+        Returns:
+            Future: A future resolving to the HTTP status code and the response data.
+        """
+        return self._pool.submit(self.call, webhook, dict(data_dict))
+
+    def run(self, webhooks, data_dict):
+        """
+        Calls several webhooks concurrently and waits for those that are not fire-and-forget.
+
+        Args:
+            webhooks (list): The webhooks to call.
+            data_dict (dict): The data used for template substitution.
+
+        Returns:
+            dict: The (status code, response data) tuple of each awaited webhook, or the exception it raised, keyed by name.
+        """
+        futures = {webhook.name: self.submit(webhook, data_dict) for webhook in webhooks}
+        awaited = {webhook.name: futures[webhook.name] for webhook in webhooks if not webhook.fire_and_forget}
+        for webhook in webhooks:
+            if webhook.fire_and_forget:
+                futures[webhook.name].add_done_callback(lambda future, name=webhook.name: self._forgotten(name, future))
+        wait(awaited.values())
+
+        results = {}
+        for name, future in awaited.items():
+            error = future.exception()
+            results[name] = error if error is not None else future.result()
+            if error is not None:
+                print(f"Fulfilment {name} failed: {error}")
+        return results
+
+    def _forgotten(self, name, future):
+        """Logs and counts the failure of a fire-and-forget call, which nothing else waits for."""
+        error = None if future.cancelled() else future.exception()
+        if error is not None:
+            print(f"Fire-and-forget fulfilment {name} failed: {error}")
+            with self._lock:
+                self._failed += 1
+
+    def _record(self, name, latency, retries, error):
+        with self._lock:
+            metric = self._metrics.setdefault(name, {"calls": 0, "failures": 0, "retries": 0, "total_latency_ms": 0.0, "max_latency_ms": 0.0})
+            metric["calls"] += 1
+            metric["failures"] += error is not None
+            metric["retries"] += retries
+            metric["total_latency_ms"] += latency * 1000
+            metric["max_latency_ms"] = max(metric["max_latency_ms"], latency * 1000)
+
+    def get_stats(self):
+        """
+        Returns pool and per-webhook latency metrics.
+
+        Returns:
+            dict: The pool state (including the fire-and-forget calls that "failed") under "pool" and, under "webhooks", each webhook's call/failure/retry counts and mean/max latency.
+        """
+        with self._lock:
+            webhooks = {}
+            for name, metric in self._metrics.items():
+                metric = dict(metric)
+                metric["mean_latency_ms"] = metric.pop("total_latency_ms") / metric["calls"]
+                webhooks[name] = metric
+            pool = {"hosts": len(self._sessions), "max_workers": self.max_workers,
+                    "pool_maxsize": self.pool_maxsize, "in_flight": self._in_flight, "failed": self._failed}
+        return {"pool": pool, "webhooks": webhooks}
+
+    def shutdown(self, wait=True):
+        """
+        Stops the thread pool and closes every keep-alive connection.
+
+        Args:
+            wait (bool): Whether to wait for running fulfilments first.
+        """
+        self._pool.shutdown(wait=wait)
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def get_default_executor():
+    """
+    Returns the process-wide fulfilment executor, creating it on first use.
+
+    Returns:
+        FulfilmentExecutor: The shared executor.
+    """
+    global _default_executor
+    if _default_executor is None:
+        with _default_executor_lock:
+            if _default_executor is None:
+                _default_executor = FulfilmentExecutor()
+    return _default_executor
@@ -0,0 +1,60 @@
+import json
+import os
+import threading
+from .Webhook import Webhook
+
+_configs = {}
+_webhooks = {}
+_lock = threading.Lock()
+
+
+def _cache_key(fulfilments_path):
+    path = os.path.abspath(fulfilments_path)
+    return path, os.stat(path).st_mtime_ns
+
+
+def load_fulfilment_configs(fulfilments_path="./fulfilments.json"):
+    """
+    Returns the parsed fulfilments file, reading it only once per process (and again if it changes on disk).
+
+    Args:
+        fulfilments_path (str): The path to the JSON file containing fulfilment configurations.
+
+    Returns:
+        dict: The fulfilment configurations, keyed by name. Treat as read-only.
+    """
+    key = _cache_key(fulfilments_path)
+    configs = _configs.get(key)
+    if configs is None:
+        with _lock:
+            configs = _configs.get(key)
+            if configs is None:
+                with open(key[0]) as file:
+                    configs = json.load(file)
+                _configs[key] = configs
+    return configs
+
+
+def load_fulfilments(fulfilments_path="./fulfilments.json", reload=False):
+    """
+    Returns compiled Webhook objects for every fulfilment in the file, shared by all agents and sessions.
+
+    The file is parsed in a single pass and each webhook's templates are compiled once.
+
+    Args:
+        fulfilments_path (str): The path to the JSON file containing fulfilment configurations.
+        reload (bool): Whether to rebuild the webhooks even if the file hasn't changed.
+
+    Returns:
+        dict: The Webhook objects, keyed by name. Treat as read-only.
+    """
+    key = _cache_key(fulfilments_path)
+    webhooks = None if reload else _webhooks.get(key)
+    if webhooks is None:
+        configs = load_fulfilment_configs(fulfilments_path)
+        with _lock:
+            webhooks = None if reload else _webhooks.get(key)
+            if webhooks is None:
+                webhooks = {name: Webhook(name, config=config) for name, config in configs.items()}
+                _webhooks[key] = webhooks
+    return webhooks
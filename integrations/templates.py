@@ -0,0 +1,134 @@
+import json
+from string import Template
+
+
+class CompiledTemplate:
+    """
+    A `string.Template` tokenized once into literal and placeholder segments.
+
+    Rendering joins the segments instead of re-scanning the template with a regex on every call.
+    Follows `Template.safe_substitute` semantics: `$$` is a literal `$`, and placeholders missing from
+    the mapping are left as written.
+
+    Attributes:
+        template (str): The template text.
+        variables (list): The placeholder names, in order of first appearance.
+    """
+
+    def __init__(self, template):
+        """
+        Tokenizes the template.
+
+        Args:
+            template (str): The template text.
+        """
+        self.template = template
+        self._segments = []  # (literal, None) or (placeholder text, name)
+        self.variables = []
+        position = 0
+        for match in Template.pattern.finditer(template):
+            start, end = match.span()
+            if start > position:
+                self._segments.append((template[position:start], None))
+            name = match.group("named") or match.group("braced")
+            if name:
+                self._segments.append((match.group(0), name))
+                if name not in self.variables:
+                    self.variables.append(name)
+            elif match.group("escaped") is not None:
+                self._segments.append(("$", None))
+            else:
+                self._segments.append((match.group(0), None))
+            position = end
+        if position < len(template):
+            self._segments.append((template[position:], None))
+        # Constant templates render to themselves, so callers can skip rendering them
+        self.is_constant = not self.variables and "".join(text for text, _ in self._segments) == template
+
+    def safe_substitute(self, mapping):
+        """
+        Renders the template.
+
+        Args:
+            mapping (dict): Values for the placeholders.
+
+        Returns:
+            str: The rendered text.
+        """
+        parts = []
+        for text, name in self._segments:
+            if name is not None and name in mapping:
+                parts.append(str(mapping[name]))
+            else:
+                parts.append(text)
+        return "".join(parts)
+
+    def __str__(self):
+        return self.template
+
+
+class PayloadBuilder:
+    """
+    Builds a JSON payload from a template without rendering it to text and parsing it back.
+
+    The template is parsed once, and every string in it (keys included) that contains a placeholder
+    is compiled. Building walks the parsed structure and only renders those strings. Templates
+    that aren't valid JSON before substitution (e.g. an unquoted `$amount`) fall back to
+    substituting the text and parsing the result.
+
+    Attributes:
+        template (CompiledTemplate): The compiled template text.
+        variables (list): The placeholder names used by the template.
+    """
+
+    def __init__(self, template):
+        """
+        Compiles the payload template.
+
+        Args:
+            template (str): The JSON payload template.
+        """
+        self.template = CompiledTemplate(template)
+        self.variables = self.template.variables
+        try:
+            self._tree = self._compile(json.loads(template))
+            self._structured = True
+        except json.JSONDecodeError:
+            self._tree = None
+            self._structured = False
+
+    def _compile(self, node):
+        if isinstance(node, str):
+            compiled = CompiledTemplate(node)
+            return node if compiled.is_constant else compiled
+        if isinstance(node, dict):
+            return [(self._compile(key), self._compile(value)) for key, value in node.items()]
+        if isinstance(node, list):
+            return tuple(self._compile(item) for item in node)
+        return node
+
+    def _render(self, node, mapping):
+        if isinstance(node, CompiledTemplate):
+            return node.safe_substitute(mapping)
+        if isinstance(node, list):
+            return {self._render(key, mapping): self._render(value, mapping) for key, value in node}
+        if isinstance(node, tuple):
+            return [self._render(item, mapping) for item in node]
+        return node
+
+    def build(self, mapping):
+        """
+        Builds the payload for the given data.
+
+        Args:
+            mapping (dict): Values for the placeholders.
+
+        Returns:
+            object: The payload, ready to be sent as JSON.
+
+        Raises:
+            json.JSONDecodeError: If a non-JSON template does not form valid JSON after substitution.
+        """
+        if self._structured:
+            return self._render(self._tree, mapping)
+        return json.loads(self.template.safe_substitute(mapping))
@@ -0,0 +1,174 @@
+"""
+A local cache of the Hugging Face models the agent serves, so servers start without network calls.
+
+Each model is stored once per pinned revision under `<root>/<owner>--<name>/<revision>`, and
+`<root>/manifest.json` records what is there. Fill the cache ahead of time (e.g. when building the
+image), then start the servers with `HF_HUB_OFFLINE=1` to make a missing model an error rather than
+a download.
+
+Usage:
+    python -m nlp.artefacts [--root ./artefacts/models] [--list]
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+DEFAULT_MODEL_DIR = "./artefacts/models"
+MANIFEST_FILE = "manifest.json"
+# Weights for frameworks we don't serve with
+IGNORE_PATTERNS = ["*.msgpack", "flax_model*", "rust_model*", "*.ot", "onnx/*", "*.onnx", "coreml/*"]
+
+
+class ModelArtefacts:
+    """
+    A local directory of Hugging Face model snapshots pinned by revision, with a manifest.
+
+    Attributes:
+        root (str): The cache directory.
+        offline (bool): Whether fetching is forbidden, so a model that isn't cached is an error.
+        manifest (dict): The cached snapshots, keyed by "<model>@<revision>".
+    """
+
+    def __init__(self, root=None, offline=None):
+        """
+        Opens the cache.
+
+        Args:
+            root (str, optional): The cache directory. Defaults to `$MODEL_CACHE_DIR` or `DEFAULT_MODEL_DIR`.
+            offline (bool, optional): Forbid fetching. Defaults to `$HF_HUB_OFFLINE`.
+        """
+        self.root = root or os.getenv("MODEL_CACHE_DIR", DEFAULT_MODEL_DIR)
+        if offline is None:
+            offline = os.getenv("HF_HUB_OFFLINE", "").lower() in ("1", "true", "yes", "on")
+        self.offline = offline
+        self.manifest = self._read_manifest()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            print(f"Ignoring the unreadable model manifest {self.manifest_path}: {e}")
+            return {}
+
+    def _write_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        temporary = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(self.manifest, file, indent=4, sort_keys=True)
+        os.replace(temporary, self.manifest_path)
+
+    def path_for(self, model, revision):
+        """
+        Returns where a snapshot is (or would be) stored.
+
+        Args:
+            model (str): The Hugging Face model id.
+            revision (str): The pinned revision.
+
+        Returns:
+            str: The snapshot directory.
+        """
+        return os.path.join(self.root, model.replace("/", "--"), revision)
+
+    def get(self, model, revision):
+        """
+        Returns the directory of a cached snapshot.
+
+        Args:
+            model (str): The Hugging Face model id.
+            revision (str): The pinned revision.
+
+        Returns:
+            str: The snapshot directory, or None if it isn't cached.
+        """
+        entry = self.manifest.get(f"{model}@{revision}")
+        if entry is None:
+            return None
+        path = os.path.join(self.root, entry["path"])
+        return path if os.path.isdir(path) else None
+
+    def fetch(self, model, revision):
+        """
+        Downloads a snapshot into the cache and records it in the manifest.
+
+        The files are downloaded next to the cache and moved into place once complete, so an
+        interrupted download never leaves a partial snapshot behind.
+
+        Args:
+            model (str): The Hugging Face model id.
+            revision (str): The pinned revision.
+
+        Returns:
+            str: The snapshot directory.
+
+        Raises:
+            FileNotFoundError: If the cache is offline.
+        """
+        if self.offline:
+            raise FileNotFoundError(f"{model}@{revision} is not in the model cache {self.root} and fetching is disabled; "
+                                    f"fill the cache with `python -m nlp.artefacts`")
+        from huggingface_hub import snapshot_download
+
+        path = self.path_for(model, revision)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".fetch-", dir=os.path.dirname(path))
+        try:
+            started = time.perf_counter()
+            snapshot_download(repo_id=model, revision=revision, local_dir=staging, ignore_patterns=IGNORE_PATTERNS)
+            shutil.rmtree(os.path.join(staging, ".cache"), ignore_errors=True)  # huggingface_hub's download metadata
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.replace(staging, path)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        files = [os.path.join(directory, name) for directory, _, names in os.walk(path) for name in names]
+        self.manifest[f"{model}@{revision}"] = {
+            "model": model,
+            "revision": revision,
+            "path": os.path.relpath(path, self.root),
+            "files": len(files),
+            "bytes": sum(os.path.getsize(file) for file in files),
+            "fetched": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "fetch_seconds": round(time.perf_counter() - started, 3),
+        }
+        self._write_manifest()
+        return path
+
+    def resolve(self, model, revision):
+        """
+        Returns the local directory of a model, fetching it first if it isn't cached.
+
+        Args:
+            model (str): The Hugging Face model id.
+            revision (str): The pinned revision.
+
+        Returns:
+            str: The snapshot directory, to load the model from instead of the hub.
+        """
+        return self.get(model, revision) or self.fetch(model, revision)
+
+
+if __name__ == "__main__":
+    from agent.resources import INTENT_MODEL, INTENT_MODEL_REVISION, SENTIMENT_MODEL, SENTIMENT_MODEL_REVISION
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=None, help=f"the cache directory (default: $MODEL_CACHE_DIR or {DEFAULT_MODEL_DIR})")
+    parser.add_argument("--list", action="store_true", help="only list the cached models")
+    args = parser.parse_args()
+    artefacts = ModelArtefacts(args.root, offline=args.list)
+    if not args.list:
+        for model, revision in ((INTENT_MODEL, INTENT_MODEL_REVISION), (SENTIMENT_MODEL, SENTIMENT_MODEL_REVISION)):
+            print(f"{model}@{revision}: {artefacts.resolve(model, revision)}")
+    for key, entry in sorted(artefacts.manifest.items()):
+        print(f"{key}: {entry['files']} files, {entry['bytes'] / 2 ** 20:.1f} MB, fetched {entry['fetched']}")
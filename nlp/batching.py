@@ -0,0 +1,156 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BatchedPipeline:
+    """
+    Micro-batching wrapper around a transformers pipeline.
+
+    Single utterances submitted from many sessions are queued and handed to the wrapped pipeline
+    together, once per batch, after either `max_batch_size` utterances are pending or `max_wait_ms`
+    has passed since the oldest one arrived. Each caller blocks only until its own result is ready.
+
+    The wrapper is a drop-in replacement for the pipeline: calling it with a single string returns
+    the same shape the pipeline would (e.g. `sentiment_analyser(text)[0]`, `classifier(text, top_k=None)`).
+    Lists are passed straight through since they are already batched.
+
+    Attributes:
+        pipeline (callable): The wrapped pipeline.
+        name (str): A label used in stats and thread names.
+        max_batch_size (int): The maximum number of utterances per pipeline call.
+        max_wait_ms (float): How long the oldest pending utterance may wait for the batch to fill.
+    """
+
+    def __init__(self, pipeline, max_batch_size=16, max_wait_ms=5, name="pipeline"):
+        """
+        Initializes the BatchedPipeline. The worker thread starts on first use.
+
+        Args:
+            pipeline (callable): The transformers pipeline (or any callable accepting a list of strings).
+            max_batch_size (int): The maximum number of utterances per pipeline call.
+            max_wait_ms (float): The batching window in milliseconds.
+            name (str): A label used in stats and thread names.
+        """
+        self.pipeline = pipeline
+        self.name = name
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._stats = {"batches": 0, "items": 0, "max_batch_size": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0}
+
+    def __call__(self, inputs, **kwargs):
+        """
+        Runs the pipeline on the input, batching single strings with other pending calls.
+
+        Args:
+            inputs (str | list): A single utterance, or a list of utterances.
+            **kwargs: Keyword arguments for the pipeline, e.g. `top_k=None`.
+
+        Returns:
+            list: The pipeline output for the input.
+        """
+        if not isinstance(inputs, str):
+            return self.pipeline(inputs, **kwargs)
+        return self.submit(inputs, **kwargs).result()
+
+    def submit(self, text, **kwargs):
+        """
+        Queues a single utterance for the next batch.
+
+        Args:
+            text (str): The utterance.
+            **kwargs: Keyword arguments for the pipeline. Only calls with equal kwargs share a batch.
+
+        Returns:
+            Future: A future resolving to the pipeline output for the utterance.
+        """
+        if self._closed:
+            raise RuntimeError(f"BatchedPipeline '{self.name}' is closed")
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, tuple(sorted(kwargs.items())), time.perf_counter(), future))
+        return future
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        """Collects pending utterances into batches and runs them until closed."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = item[2] + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Finish this batch, then stop
+                    break
+                batch.append(item)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[1], []).append(item)
+
+        for kwargs, items in groups.items():
+            try:
+                results = self.pipeline([text for text, _, _, _ in items], **dict(kwargs))
+            except Exception as e:
+                for _, _, _, future in items:
+                    future.set_exception(e)
+                continue
+            for (_, _, _, future), result in zip(items, results):
+                # A single string input returns a list even when the batched output is a bare dict
+                future.set_result([result] if isinstance(result, dict) else result)
+
+        waits = [(started - enqueued) * 1000 for _, _, enqueued, _ in batch]
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["items"] += len(batch)
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch))
+            self._stats["total_wait_ms"] += sum(waits)
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], max(waits))
+
+    def get_stats(self):
+        """
+        Returns batch size and queue wait statistics.
+
+        Returns:
+            dict: Number of batches and items, mean/max batch size, mean/max queue wait in ms and current queue depth.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches, items = stats["batches"], stats["items"]
+        stats["mean_batch_size"] = items / batches if batches else 0.0
+        total_wait_ms = stats.pop("total_wait_ms")
+        stats["mean_wait_ms"] = total_wait_ms / items if items else 0.0
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+    def close(self):
+        """
+        Stops the worker thread after the pending utterances have been processed.
+        """
+        self._closed = True
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
@@ -0,0 +1,132 @@
+import re
+import threading
+
+# Explicit keywords that signal a cancellation
+CANCEL_WORDS = ["cancel", "stop","n't","not", "nevermind", "forget", "leave"]
+
+# Rule-based patterns (customize these further)
+CANCEL_PATTERNS = [
+    [{"POS": "VERB"}, {"LOWER": "cancel"}],
+    [{"DEP": "ROOT"}, {"LOWER": "forget"}, {"LOWER": "it"}],
+    [{"TEXT": "Ugh"}, {"LOWER": "nevermind"}],
+    [{"DEP": "neg"}, {"POS": "VERB"}, {"OP": "?"}, {"LOWER": "continue"}],
+    [{"LOWER": "i"}, {"POS": "VERB"},{"DEP": "neg"}, {"LOWER": "want"}, {"LOWER": "to"},
+       {"LOWER": "do"}, {"LOWER": "this"}],
+    [{"LOWER": {"REGEX": "^(i|do)n't"}}, {"LOWER": "want"}, {"LOWER": "to"},
+       {"LOWER": "do"}, {"LOWER": "this"}] ,
+    [{"LOWER": "i"}, {"DEP": "neg"}, {"LOWER": "want"}, {"LOWER": "to"},
+       {"POS": "VERB"}, {"LOWER": "this"}],
+    [{"LOWER": "actually"}, {"OP": "?"}, {"LOWER": "i"}, {"LOWER": "want"},
+       {"LOWER": "to"}, {"ENT_TYPE": "intent_name"}],
+    [{"TEXT": {"REGEX": "^ugh|argh|grr"}}, {"OP": "?"},
+       {"LOWER": "just"}, {"LOWER": "cancel"}],
+    [{"LOWER": "this"}, {"LOWER": "is"}, {"LOWER": "not"}, {"POS": "VERB"},
+       {"OP": "?"}, {"LOWER": "forget"}, {"LOWER": "it"}],
+    [{"LOWER": "actually"}, {"OP": "?"}, {"LOWER": "never"}, {"LOWER": "mind"}],
+    [{"LOWER": "never"}, {"LOWER": "mind"},
+       {"OP": "?"}, {"LOWER": "forget"}, {"LOWER": "it"}],
+    [{"LOWER": "i"}, {"POS": "VERB"}, {"DEP": "neg"}, {"LOWER": "want"}, {"LOWER": "to"},
+       {"POS": "VERB"}, {"LOWER": "this"}]
+]
+
+
+# Words the dependency patterns above need besides a negation; without one of them only a keyword can match
+_PATTERN_ANCHORS = re.compile(r"\b(?:continue|want|mind)\b")
+# Tokens the parser may label as negations that are not keywords themselves
+_NEGATIONS = re.compile(r"\b(?:never|no|nt|neither|nor)\b|n\u2019t\b")
+# The keyword check, on text instead of spaCy tokens ("cannot" is tokenized as "can" + "not")
+_KEYWORDS = re.compile(r"\b(?:cancel|stop|not|nevermind|forget|leave|cannot)\b|n't\b")
+
+
+class CancelIntentDetector:
+    """
+    Two-stage detector for messages that cancel the current slot filling.
+
+    Stage one is a compiled regex pass over the lowercased text. It accepts messages containing a
+    cancel keyword, and rejects messages that cannot match any of `CANCEL_PATTERNS` because they lack
+    a negation or the word the pattern is anchored on. Only the remaining, ambiguous messages are
+    parsed by spaCy, with the unused components disabled and the matcher compiled once.
+
+    Attributes:
+        model (str): The spaCy model used for the second stage.
+        disable (tuple): The pipeline components the second stage doesn't need.
+        stats (dict): How many messages each stage decided.
+    """
+
+    def __init__(self, model="en_core_web_sm", disable=("ner", "lemmatizer")):
+        """
+        Initializes the detector. The spaCy pipeline is loaded on the first ambiguous message.
+
+        Args:
+            model (str): The spaCy model used for the second stage.
+            disable (tuple): The pipeline components the second stage doesn't need.
+        """
+        self.model = model
+        self.disable = tuple(disable)
+        self._lock = threading.Lock()
+        self.stats = {"keyword": 0, "rejected": 0, "parsed": 0}
+
+    def _count(self, stage):
+        with self._lock:
+            self.stats[stage] += 1
+
+    def is_cancel(self, text):
+        """
+        Detects whether the given text indicates a desire to cancel the current process.
+
+        Args:
+            text (str): The user's input text.
+
+        Returns:
+            bool: True if cancellation intent is detected, False otherwise.
+        """
+        lowered = text.lower()
+        if _KEYWORDS.search(lowered):
+            self._count("keyword")
+            return True
+        if not (_NEGATIONS.search(lowered) and _PATTERN_ANCHORS.search(lowered)):
+            self._count("rejected")
+            return False
+        self._count("parsed")
+        return self.is_cancel_parsed(text)
+
+    def is_cancel_parsed(self, text):
+        """
+        Runs the spaCy stage on its own: the keyword check on tokens, then the rule-based patterns.
+
+        Args:
+            text (str): The user's input text.
+
+        Returns:
+            bool: True if cancellation intent is detected, False otherwise.
+        """
+        from .registry import registry
+
+        nlp = registry.get_pipeline(self.model, self.disable)
+        doc = nlp(text)
+        if any(token.text.lower() in CANCEL_WORDS for token in doc):
+            return True
+        matcher = registry.get_matcher("cancel_intent", CANCEL_PATTERNS, self.model, self.disable)
+        return len(matcher(doc)) > 0
+
+    def preload(self):
+        """
+        Loads the spaCy pipeline and compiles the matcher ahead of the first ambiguous message.
+        """
+        from .registry import registry
+
+        registry.get_matcher("cancel_intent", CANCEL_PATTERNS, self.model, self.disable)
+
+    def get_stats(self):
+        """
+        Returns how many messages each stage decided.
+
+        Returns:
+            dict: Counts for keyword matches, fast rejections and spaCy parses.
+        """
+        with self._lock:
+            return dict(self.stats)
+
+
+# Shared detector used by utils.is_cancel_intent
+cancel_detector = CancelIntentDetector()
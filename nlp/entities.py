@@ -0,0 +1,284 @@
+import re
+from collections import deque
+
+# "nlp" entities only need the named entity recogniser, so the pipeline is loaded without the rest
+NER_ONLY = ("parser", "lemmatizer")
+# Anchors, word boundaries and lookarounds: a pattern with any of these can't match an arbitrary run of characters
+_ANCHORED = re.compile(r"\\[bBAZ]|\(\?<?[=!]|(?<![\\\[])[\^$]")
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+class ValuesIndex:
+    """
+    Aho-Corasick automaton over the values (and synonyms) of a "values" entity.
+
+    Built once from the entity configuration; matching is a single pass over the utterance, linear
+    in its length, however many values the catalog has. Matches must fall on word boundaries, and
+    the longest one wins (the leftmost among equally long ones), so "platinum plus" beats "platinum".
+    Matching is case-insensitive and returns the canonical value as written in the configuration.
+
+    Attributes:
+        values (list): The canonical values.
+    """
+
+    def __init__(self, values, synonyms=None):
+        """
+        Compiles the automaton.
+
+        Args:
+            values (list): Canonical values. Each is a string, or a dict with "value" and optional "synonyms".
+            synonyms (dict, optional): Extra surface forms, keyed by canonical value.
+        """
+        self.values = []
+        surface_forms = {}
+        for entry in values:
+            if isinstance(entry, dict):
+                value, forms = entry["value"], [entry["value"], *entry.get("synonyms", [])]
+            else:
+                value, forms = entry, [entry]
+            self.values.append(value)
+            forms += (synonyms or {}).get(value, [])
+            for form in forms:
+                form = form.lower().strip()
+                if form:
+                    surface_forms.setdefault(form, value)  # The first canonical value claiming a form keeps it
+
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [()]  # (length, value) pairs ending at each state, fail chain included
+        for form, value in surface_forms.items():
+            state = 0
+            for char in form:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append(())
+                state = next_state
+            self._outputs[state] = ((len(form), value),)
+
+        # Breadth-first pass to set failure links and merge outputs along them
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[fail]
+
+    def find_all(self, utterance):
+        """
+        Finds every value occurring on word boundaries in the utterance.
+
+        Args:
+            utterance (str): The user's input.
+
+        Returns:
+            list: (start, end, value) tuples, in order of their end position.
+        """
+        text = utterance.lower()
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        matches = []
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in outputs[state]:
+                start = end - length
+                if (start == 0 or not _is_word_char(text[start - 1])) and (end == len(text) or not _is_word_char(text[end])):
+                    matches.append((start, end, value))
+        return matches
+
+    def match(self, utterance):
+        """
+        Returns the longest value on word boundaries in the utterance.
+
+        Args:
+            utterance (str): The user's input.
+
+        Returns:
+            str: The canonical value, or None if no value occurs.
+        """
+        best = None
+        for start, end, value in self.find_all(utterance):
+            if best is None or end - start > best[1] - best[0] or (end - start == best[1] - best[0] and start < best[0]):
+                best = (start, end, value)
+        return best[2] if best else None
+
+
+def _overlaps(start, end, spans):
+    return any(start < span_end and span_start < end for span_start, span_end in spans)
+
+
+class EntityExtractor:
+    """
+    Entity extraction compiled once from entities.json and shared by every conversation.
+
+    "values" entities get a `ValuesIndex`, "regex" entities a compiled pattern, and "nlp" entities are
+    read from a spaCy NER parse. `extract_all` fills several slots from one utterance, so a user who
+    answers "gold tier, pin 1234" doesn't need a turn per slot.
+
+    Attributes:
+        entities (dict): The entity configuration.
+        indexes (dict): The `ValuesIndex` of each "values" entity.
+        patterns (dict): The compiled pattern of each "regex" entity.
+        anchored (set): The "regex" entities whose pattern is anchored (e.g. with lookarounds or `\b`),
+            so they can be filled from text the user wasn't asked for.
+    """
+
+    def __init__(self, entities):
+        """
+        Compiles the extractors.
+
+        Args:
+            entities (dict): The entity configuration, keyed by entity name.
+        """
+        self.entities = entities
+        self.indexes = {name: ValuesIndex(entity["values"], entity.get("synonyms"))
+                        for name, entity in entities.items() if entity["given"] == "values"}
+        self.patterns = {name: re.compile(entity["values"])
+                         for name, entity in entities.items() if entity["given"] == "regex"}
+        self.anchored = {name for name, pattern in self.patterns.items() if _ANCHORED.search(pattern.pattern)}
+        self._combined = {}  # Combined patterns, keyed by the tuple of entity names in priority order
+        self._cues = {name: re.compile(rf"\b{re.escape(name)}\b", re.IGNORECASE) for name in self.patterns}
+
+    def extract(self, name, utterance):
+        """
+        Extracts one entity from the utterance.
+
+        Args:
+            name (str): The entity name.
+            utterance (str): The user's input.
+
+        Returns:
+            str: The extracted value, or None if it wasn't found.
+        """
+        index = self.indexes.get(name)
+        if index is not None:
+            return index.match(utterance)
+        pattern = self.patterns.get(name)
+        if pattern is not None:
+            match = pattern.search(utterance)
+            return match.group(0) if match else None
+        from utils import extract_entity_given_nlp
+        return extract_entity_given_nlp(self.entities[name]["values"], utterance)
+
+    def extract_all(self, names, utterance, topic=None):
+        """
+        Extracts as many of the given entities as the utterance contains, each from its own span.
+
+        Earlier names take priority when two entities could claim the same text, so pass the slot the
+        user was just asked about first. A regex match goes to the entity the user named right before
+        it instead, as in "pin 1234", when that entity's pattern accepts it.
+
+        Only the slot that was asked for (`topic`) is filled from anything its extractor finds. Other
+        slots are filled opportunistically, and only from evidence that can't be a coincidence: a
+        "values" match, an anchored "regex" match, or any "regex" match right after the entity's name
+        ("phone is 0300..."). "nlp" entities need a spaCy parse, so they are only extracted when asked for.
+
+        Args:
+            names (list): The entity names, in priority order.
+            utterance (str): The user's input.
+            topic (str, optional): The entity the user was just asked about, if any.
+
+        Returns:
+            dict: The extracted values, keyed by entity name.
+        """
+        found, claimed = {}, []
+
+        for name in names:
+            index = self.indexes.get(name)
+            if index is None:
+                continue
+            candidates = [match for match in index.find_all(utterance) if not _overlaps(match[0], match[1], claimed)]
+            if candidates:
+                start, end, value = max(candidates, key=lambda match: (match[1] - match[0], -match[0]))
+                found[name] = value
+                claimed.append((start, end))
+
+        regex_names = tuple(name for name in names if name in self.patterns and (name == topic or name in self.anchored))
+        if regex_names:
+            self._extract_regex(regex_names, utterance, found, claimed)
+        for name in names:
+            if name in self.patterns and name not in found and name not in regex_names:
+                self._extract_cued(name, utterance, found, claimed)
+
+        if topic is not None and self.entities[topic]["given"] == "nlp":
+            from .registry import registry
+            doc = registry.get_pipeline(disable=NER_ONLY)(utterance)
+            label = self.entities[topic]["values"]
+            for ent in doc.ents:
+                if ent.label_ == label and not _overlaps(ent.start_char, ent.end_char, claimed):
+                    found[topic] = ent.text
+                    claimed.append((ent.start_char, ent.end_char))
+                    break
+        return found
+
+    def _extract_cued(self, name, utterance, found, claimed):
+        """Fills an unanchored regex entity only from a match right after the entity's name."""
+        for match in self.patterns[name].finditer(utterance):
+            window = utterance[max(0, match.start() - 24):match.start()]
+            if self._cues[name].search(window) and not _overlaps(match.start(), match.end(), claimed):
+                found[name] = match.group(0)
+                claimed.append(match.span())
+                return
+
+    def _extract_regex(self, names, utterance, found, claimed):
+        """Fills regex entities in one scan with a combined pattern, then searches for any left over."""
+        combined = self._combined_pattern(names)
+        if combined is not None:
+            for match in combined.finditer(utterance):
+                name = self._cued_entity(names, utterance, match, found) or names[int(match.lastgroup[1:])]
+                if name not in found and not _overlaps(match.start(), match.end(), claimed):
+                    found[name] = match.group(0)
+                    claimed.append(match.span())
+
+        # An entity can be shadowed in the combined scan by an earlier alternative matching the same text
+        for name in names:
+            if name in found:
+                continue
+            for match in self.patterns[name].finditer(utterance):
+                if not _overlaps(match.start(), match.end(), claimed):
+                    found[name] = match.group(0)
+                    claimed.append(match.span())
+                    break
+
+    def _cued_entity(self, names, utterance, match, found):
+        """Returns the entity the user named right before a match ("pin 1234"), if its pattern accepts the matched text."""
+        window = utterance[max(0, match.start() - 24):match.start()]
+        cued, position = None, -1
+        for name in names:
+            if name in found:
+                continue
+            for cue in self._cues[name].finditer(window):
+                if cue.start() > position:
+                    cued, position = name, cue.start()
+        if cued is not None and self.patterns[cued].fullmatch(match.group(0)):
+            return cued
+        return None
+
+    def _combined_pattern(self, names):
+        """Compiles one alternation of the given entities' patterns, or None if they can't be combined."""
+        if names not in self._combined:
+            self._combined[names] = self._compile_combined(names)
+        return self._combined[names]
+
+    def _compile_combined(self, names):
+        sources = [self.patterns[name].pattern for name in names]
+        # Numbered or named backreferences would point at the wrong group once combined
+        if any(re.search(r"\\[1-9]|\(\?P=", source) for source in sources):
+            return None
+        try:
+            return re.compile("|".join(f"(?P<e{i}>{source})" for i, source in enumerate(sources)))
+        except re.error:
+            return None
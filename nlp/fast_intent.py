@@ -0,0 +1,164 @@
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text):
+    """
+    Normalizes an utterance for matching: lowercase, apostrophes dropped ("don't" is "dont"), other
+    punctuation replaced by spaces, whitespace collapsed.
+
+    Args:
+        text (str): The utterance.
+
+    Returns:
+        str: The normalized utterance.
+    """
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", text.lower().replace("'", "").replace("\u2019", ""))).strip()
+
+
+def _terms(normalized):
+    """Word unigrams and bigrams of a normalized utterance."""
+    words = normalized.split()
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+class FastIntentMatcher:
+    """
+    Answers the easy intent classifications without running the transformer.
+
+    Built once from the training phrases in intents.json. An utterance that, once normalized, is
+    exactly a training phrase gets that phrase's intent; otherwise the most similar training phrase
+    is looked up in a TF-IDF index (word unigrams and bigrams, cosine similarity), and its intent is
+    used if the similarity is at least `min_similarity` and beats the best phrase of any other intent
+    by `min_margin`. Anything less certain returns None, and the caller falls back to the classifier.
+
+    Only intents the classifier is trained on are matched, and callers pass the intents allowed by
+    the conversation's context, so the fast path never answers something the classifier couldn't.
+
+    Attributes:
+        min_similarity (float): The lowest cosine similarity answered from the index.
+        min_margin (float): How much the best intent must beat the runner-up by.
+        stats (dict): Hits and total milliseconds per path ("exact", "nearest", "classifier").
+    """
+
+    def __init__(self, intents, min_similarity=0.8, min_margin=0.1):
+        """
+        Compiles the matcher.
+
+        Args:
+            intents (dict): The intents configuration.
+            min_similarity (float): The lowest cosine similarity answered from the index.
+            min_margin (float): How much the best intent must beat the runner-up by.
+        """
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+
+        exact, phrases = {}, []
+        for label, intent in intents.items():
+            if not intent.get("trainable"):
+                continue
+            for phrase in intent.get("training_phrases", []):
+                normalized = normalize(phrase)
+                if not normalized:
+                    continue
+                exact.setdefault(normalized, set()).add(label)
+                phrases.append((label, _terms(normalized)))
+        # A phrase trained under several intents is ambiguous; leave it to the classifier
+        self._exact = {phrase: next(iter(labels)) for phrase, labels in exact.items() if len(labels) == 1}
+
+        document_frequency = defaultdict(int)
+        for _, terms in phrases:
+            for term in set(terms):
+                document_frequency[term] += 1
+        count = len(phrases)
+        self._idf = {term: math.log((1 + count) / (1 + frequency)) + 1 for term, frequency in document_frequency.items()}
+        # What a term no phrase contains weighs in a query: as much as the rarest possible term. It has
+        # no postings, so it can't match anything, but it counts in the query's norm, so an utterance
+        # saying more than (or the opposite of) a phrase scores lower than the phrase itself
+        self._unknown_idf = math.log(1 + count) + 1
+        self._labels = []
+        self._postings = defaultdict(list)  # term -> [(phrase index, weight)]
+        for index, (label, terms) in enumerate(phrases):
+            self._labels.append(label)
+            for term, weight in self._vector(terms).items():
+                self._postings[term].append((index, weight))
+
+        self._lock = threading.Lock()
+        self.stats = {path: {"hits": 0, "total_ms": 0.0} for path in ("exact", "nearest", "classifier")}
+
+    def _vector(self, terms):
+        """L2-normalized TF-IDF weights, with sublinear term frequency; unknown terms get `_unknown_idf`."""
+        counts = defaultdict(int)
+        for term in terms:
+            counts[term] += 1
+        vector = {term: (1 + math.log(tf)) * self._idf.get(term, self._unknown_idf) for term, tf in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+    def match(self, utterance, allowed=None):
+        """
+        Classifies an utterance if it is an easy case.
+
+        Args:
+            utterance (str): The user's input.
+            allowed (callable, optional): Takes an intent name and says whether it may be returned.
+
+        Returns:
+            dict: {"label", "score", "path"} with the intent, or None to fall back to the classifier.
+        """
+        started = time.perf_counter()
+        normalized = normalize(utterance)
+        label = self._exact.get(normalized)
+        if label is not None and (allowed is None or allowed(label)):
+            self.record("exact", time.perf_counter() - started)
+            return {"label": label, "score": 1.0, "path": "exact"}
+
+        best = {}  # label -> best similarity among its phrases
+        scores = defaultdict(float)
+        for term, weight in self._vector(_terms(normalized)).items():
+            for index, phrase_weight in self._postings.get(term, ()):
+                scores[index] += weight * phrase_weight
+        for index, score in scores.items():
+            label = self._labels[index]
+            if score > best.get(label, 0.0) and (allowed is None or allowed(label)):
+                best[label] = score
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        if ranked and ranked[0][1] >= self.min_similarity and (len(ranked) == 1 or ranked[0][1] - ranked[1][1] >= self.min_margin):
+            self.record("nearest", time.perf_counter() - started)
+            return {"label": ranked[0][0], "score": min(1.0, ranked[0][1]), "path": "nearest"}
+        return None
+
+    def record(self, path, seconds):
+        """
+        Counts a classification answered by a path.
+
+        Args:
+            path (str): "exact", "nearest" or "classifier".
+            seconds (float): How long it took.
+        """
+        with self._lock:
+            stats = self.stats[path]
+            stats["hits"] += 1
+            stats["total_ms"] += seconds * 1000
+
+    def get_stats(self):
+        """
+        Returns the hit rate and mean latency of each path.
+
+        Returns:
+            dict: Per path, the hits, their share of all classifications and the mean milliseconds.
+        """
+        with self._lock:
+            stats = {path: dict(values) for path, values in self.stats.items()}
+        total = sum(values["hits"] for values in stats.values())
+        for values in stats.values():
+            values["hit_rate"] = values["hits"] / total if total else 0.0
+            total_ms = values.pop("total_ms")
+            values["mean_ms"] = total_ms / values["hits"] if values["hits"] else 0.0
+        return stats
@@ -0,0 +1,239 @@
+import re
+import threading
+from collections import OrderedDict
+
+_SPACES = re.compile(r"\s+")
+_EDGE_PUNCTUATION = re.compile(r"^[^\w]+|[^\w]+$")
+
+
+def cache_key(utterance):
+    """
+    Normalizes an utterance for the intent cache: lowercase, whitespace collapsed, and punctuation
+    stripped from both ends, so "Yes!", " yes" and "YES." share one entry.
+
+    Args:
+        utterance (str): The utterance.
+
+    Returns:
+        str: The cache key.
+    """
+    return _EDGE_PUNCTUATION.sub("", _SPACES.sub(" ", utterance.lower())).strip()
+
+
+def classifier_revision(classifier):
+    """
+    Finds the revision of the model behind a classifier.
+
+    Looks for a `revision` attribute, then the Hugging Face commit hash (or name) of a pipeline's
+    model, unwrapping `BatchedPipeline` and `CachedClassifier` on the way.
+
+    Args:
+        classifier (callable): The classifier.
+
+    Returns:
+        str: The revision, or None if it can't be told.
+    """
+    while classifier is not None:
+        revision = getattr(classifier, "revision", None)
+        if isinstance(revision, str):
+            return revision
+        config = getattr(getattr(classifier, "model", None), "config", None)
+        if config is not None:
+            return getattr(config, "_commit_hash", None) or getattr(config, "_name_or_path", None)
+        classifier = getattr(classifier, "classifier", None) or getattr(classifier, "pipeline", None)
+    return None
+
+
+class CachedClassifier:
+    """
+    A bounded LRU cache in front of the intent classifier.
+
+    Short utterances like "yes", "no", "hi" and "cancel" make up much of the traffic, and each one
+    used to run the transformer again. This wrapper keeps the full label/score vector per normalized
+    utterance (see `cache_key`), and is called like the pipeline it wraps. On a miss the utterance is
+    classified as the user wrote it, so casing and punctuation the model relies on are kept; the
+    first spelling seen stands for the others. Only the full vector is cached, so filtering by
+    context (see `ContextMasks`) happens on top of it.
+
+    Entries are tagged with the classifier's revision, and entries of any other revision are never
+    returned. The agent doesn't swap models at runtime, but code that does should assign the new
+    one to `classifier` (or call `set_classifier`), which drops the cache if the revision differs.
+
+    Attributes:
+        max_entries (int): The maximum number of utterances kept.
+        revision (str): The revision of the wrapped classifier, or None if it can't be told.
+        stats (dict): Hits, misses, evictions and invalidations.
+    """
+
+    def __init__(self, classifier, max_entries=4096, revision=None):
+        """
+        Wraps a classifier.
+
+        Args:
+            classifier (callable): The classifier, called like a transformers text-classification pipeline.
+            max_entries (int): The maximum number of utterances kept.
+            revision (str, optional): The classifier's revision. Defaults to `classifier_revision(classifier)`.
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (revision, ((label, score), ...) best first), least recently used first
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self._classifier = classifier
+        self.revision = revision if revision is not None else classifier_revision(classifier)
+
+    @property
+    def classifier(self):
+        """The wrapped classifier."""
+        return self._classifier
+
+    @classifier.setter
+    def classifier(self, classifier):
+        self.set_classifier(classifier)
+
+    def set_classifier(self, classifier, revision=None):
+        """
+        Replaces the wrapped classifier, dropping the cache if its revision differs.
+
+        Args:
+            classifier (callable): The new classifier.
+            revision (str, optional): Its revision. Defaults to `classifier_revision(classifier)`.
+        """
+        revision = revision if revision is not None else classifier_revision(classifier)
+        with self._lock:
+            if revision is None or revision != self.revision:
+                self._entries.clear()
+                self.stats["invalidations"] += 1
+            self._classifier = classifier
+            self.revision = revision
+
+    def _lookup(self, key, revision):
+        """Returns the cached vector of a key, or None. Must hold the lock."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != revision:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _store(self, key, revision, classes):
+        """Caches the vector of a key, evicting the least recently used. Must hold the lock."""
+        if revision != self.revision:
+            return  # The classifier was replaced while this was being classified
+        self._entries[key] = (revision, classes)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    @staticmethod
+    def _format(classes, top_k):
+        """Builds fresh pipeline-style output from a cached vector, so callers can't alter the cache."""
+        ranked = [{"label": label, "score": score} for label, score in classes]
+        return ranked if top_k is None else ranked[:top_k]
+
+    def __call__(self, inputs, top_k=1, **kwargs):
+        """
+        Classifies one utterance or a batch, from the cache where possible.
+
+        Args:
+            inputs (str | list): The utterance(s).
+            top_k (int, optional): How many labels to return per utterance; None for all of them.
+            **kwargs: Other pipeline arguments. Calls with any are passed straight through, uncached.
+
+        Returns:
+            list: The same shape as the wrapped pipeline returns.
+        """
+        if kwargs:
+            return self._classifier(inputs, top_k=top_k, **kwargs)
+        single = isinstance(inputs, str)
+        texts = [inputs] if single else list(inputs)
+        keys = [cache_key(text) for text in texts]
+
+        with self._lock:
+            classifier, revision = self._classifier, self.revision
+            vectors = [self._lookup(key, revision) for key in keys]
+            # Each key missing from the cache, with the first utterance that normalized to it
+            missing = {}
+            for key, text, vector in zip(keys, texts, vectors):
+                if vector is None:
+                    missing.setdefault(key, text)
+            self.stats["hits"] += len(keys) - sum(vector is None for vector in vectors)
+            self.stats["misses"] += len(missing)
+
+        if missing:
+            # A single miss is passed as a string, which keeps it on the batching path of a BatchedPipeline
+            originals = list(missing.values())
+            results = [classifier(originals[0], top_k=None)] if len(originals) == 1 else classifier(originals, top_k=None)
+            classified = {key: tuple(sorted(((item["label"], item["score"]) for item in result), key=lambda item: item[1], reverse=True))
+                          for key, result in zip(missing, results)}
+            with self._lock:
+                for key, classes in classified.items():
+                    self._store(key, revision, classes)
+            vectors = [classified[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+
+        results = [self._format(vector, top_k) for vector in vectors]
+        if single:
+            return results[0]
+        return [result[0] for result in results] if top_k == 1 else results
+
+    def clear(self):
+        """
+        Empties the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: Hits, misses, evictions, invalidations, the number of entries and the hit rate.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+class ContextMasks:
+    """
+    The intents allowed in each conversation context, computed once from intents.json.
+
+    An intent with an `input_context` is only allowed while that context is active; one without is
+    always allowed. Rather than checking every class against the intents on every turn, the allowed
+    labels of each context are kept as a frozenset.
+
+    Attributes:
+        always (frozenset): The intents allowed in any context.
+    """
+
+    def __init__(self, intents):
+        """
+        Computes the masks.
+
+        Args:
+            intents (dict): The intents configuration.
+        """
+        self.always = frozenset(label for label, intent in intents.items() if not intent.get("input_context"))
+        contexts = {}
+        for label, intent in intents.items():
+            if intent.get("input_context"):
+                contexts.setdefault(intent["input_context"], set()).add(label)
+        self._masks = {context: self.always | labels for context, labels in contexts.items()}
+
+    def allowed(self, context_label):
+        """
+        Returns the intents allowed while a context is active.
+
+        Args:
+            context_label (str): The active context label, or "" for none.
+
+        Returns:
+            frozenset: The allowed intent names.
+        """
+        return self._masks.get(context_label, self.always)
@@ -0,0 +1,239 @@
+import json
+import os
+import threading
+
+
+class LLMBackend:
+    """
+    A long-lived client for an LLM HTTP API.
+
+    Keeps one keep-alive `requests.Session` for the life of the process and caps the number of
+    requests in flight, so a burst of rephrases queues instead of opening a connection each.
+    Subclasses implement `_generate_request`/`_stream_request` for their API.
+
+    Attributes:
+        base_url (str): The API root.
+        model (str): The model name.
+        timeout (float): Seconds to wait for the API to respond.
+        max_concurrency (int): The maximum number of requests in flight.
+        queue_timeout (float): Seconds a request may wait for one in flight to finish before failing.
+    """
+
+    def __init__(self, base_url, model, timeout=30, max_concurrency=4, queue_timeout=None):
+        """
+        Initializes the backend.
+
+        Args:
+            base_url (str): The API root.
+            model (str): The model name.
+            timeout (float): Seconds to wait for the API to respond.
+            max_concurrency (int): The maximum number of requests in flight.
+            queue_timeout (float, optional): Seconds a request may wait for a free slot. Defaults to `timeout`.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = timeout if queue_timeout is None else queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        import requests  # Imported on first use, so importing dynamo doesn't pay for it
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def generate(self, prompt):
+        """
+        Generates a complete reply.
+
+        Args:
+            prompt (str): The prompt.
+
+        Returns:
+            str: The generated text.
+
+        Raises:
+            requests.RequestException: If the API could not be reached, returned an error, or no slot
+                was free within `queue_timeout`.
+        """
+        self._acquire()
+        try:
+            return self._generate_request(prompt)
+        finally:
+            self._slots.release()
+
+    def stream(self, prompt):
+        """
+        Generates a reply token by token, so the caller can show the first words early.
+
+        The request holds one of the `max_concurrency` slots from the first piece until the generator
+        is exhausted or closed. A caller that may stop iterating early must `close()` it (e.g. with
+        `contextlib.closing`) rather than leave it to the garbage collector.
+
+        Args:
+            prompt (str): The prompt.
+
+        Yields:
+            str: Successive pieces of the generated text.
+
+        Raises:
+            requests.RequestException: If the API could not be reached, returned an error, or no slot
+                was free within `queue_timeout`.
+        """
+        self._acquire()
+        try:
+            yield from self._stream_request(prompt)
+        finally:
+            self._slots.release()
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            import requests
+            raise requests.RequestException(f"No free slot for a request to {self.base_url} within {self.queue_timeout}s")
+
+    def _generate_request(self, prompt):
+        raise NotImplementedError
+
+    def _stream_request(self, prompt):
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Closes the keep-alive connections.
+        """
+        self.session.close()
+
+
+class OllamaBackend(LLMBackend):
+    """
+    Client for a local Ollama server (`/api/generate`).
+    """
+
+    def __init__(self, model="llama2", base_url=None, timeout=60, max_concurrency=2):
+        """
+        Initializes the backend.
+
+        Args:
+            model (str): The Ollama model name.
+            base_url (str, optional): The server root. Defaults to `$OLLAMA_HOST` or http://localhost:11434.
+            timeout (float): Seconds to wait for the server to respond.
+            max_concurrency (int): The maximum number of requests in flight.
+        """
+        super().__init__(base_url or os.getenv("OLLAMA_HOST", "http://localhost:11434"), model, timeout, max_concurrency)
+
+    def _generate_request(self, prompt):
+        response = self.session.post(f"{self.base_url}/api/generate", json={"model": self.model, "prompt": prompt, "stream": False}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["response"]
+
+    def _stream_request(self, prompt):
+        with self.session.post(f"{self.base_url}/api/generate", json={"model": self.model, "prompt": prompt, "stream": True}, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Client for the Google Gemini `generateContent` API. The API key is read once, from `GOOGLE_AI_API`.
+    """
+
+    def __init__(self, model="gemini-pro", api_key=None, base_url="https://generativelanguage.googleapis.com", timeout=30, max_concurrency=4):
+        """
+        Initializes the backend.
+
+        Args:
+            model (str): The Gemini model name.
+            api_key (str, optional): The API key. Defaults to `GOOGLE_AI_API` from the environment or `.env` file.
+            base_url (str): The API root.
+            timeout (float): Seconds to wait for the API to respond.
+            max_concurrency (int): The maximum number of requests in flight.
+        """
+        super().__init__(base_url, model, timeout, max_concurrency)
+        if api_key is None:
+            from dotenv import load_dotenv
+            load_dotenv()
+            api_key = os.getenv("GOOGLE_AI_API")
+        self.api_key = api_key
+
+    def _url(self, method):
+        if not self.api_key:
+            import requests
+            raise requests.RequestException("Google AI API key not found in the environment")
+        return f"{self.base_url}/v1beta/models/{self.model}:{method}"
+
+    @staticmethod
+    def _body(prompt):
+        return {"contents": [{"parts": [{"text": prompt}]}]}
+
+    @staticmethod
+    def _text(data):
+        return data["candidates"][0]["content"]["parts"][0]["text"]
+
+    def _generate_request(self, prompt):
+        response = self.session.post(self._url("generateContent"), params={"key": self.api_key}, json=self._body(prompt), timeout=self.timeout)
+        response.raise_for_status()
+        return self._text(response.json())
+
+    def _stream_request(self, prompt):
+        with self.session.post(self._url("streamGenerateContent"), params={"key": self.api_key, "alt": "sse"},
+                               json=self._body(prompt), timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line.startswith(b"data:"):
+                    yield self._text(json.loads(line[5:]))
+
+
+# Factories for the model names dynamo accepts
+BACKENDS = {
+    "llama2": lambda: OllamaBackend(model="llama2"),
+    "gemini": lambda: GeminiBackend(),
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name):
+    """
+    Returns the shared backend for a model name, creating it on first use.
+
+    Args:
+        name (str): The model name, one of `BACKENDS`.
+
+    Returns:
+        LLMBackend: The backend.
+
+    Raises:
+        KeyError: If the model name is unknown.
+    """
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                backend = BACKENDS[name]()
+                _backends[name] = backend
+    return backend
+
+
+def set_backend(name, backend):
+    """
+    Replaces the shared backend for a model name, e.g. to point it at a local mock server.
+
+    Args:
+        name (str): The model name.
+        backend (LLMBackend): The backend to use.
+    """
+    with _backends_lock:
+        old = _backends.get(name)
+        _backends[name] = backend
+    if old is not None and old is not backend:
+        old.close()
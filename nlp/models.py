@@ -0,0 +1,42 @@
+def load_intent_classifier(model, revision, backend="transformers", onnx_dir="./artefacts/intent-onnx", artefacts=None):
+    """
+    Loads the intent classifier.
+
+    Args:
+        model (str): The Hugging Face model id.
+        revision (str): The model revision.
+        backend (str): "transformers" for the full-precision pipeline, or "onnx" for the graph exported by
+            `python -m training.export`, int8-quantized by default.
+        onnx_dir (str): The exported model directory, for the "onnx" backend.
+        artefacts (ModelArtefacts, optional): Load the model from this local cache instead of the hub.
+
+    Returns:
+        callable: The classifier, called like a transformers text-classification pipeline.
+    """
+    if backend == "onnx":
+        from nlp.onnx_classifier import OnnxTextClassifier
+        return OnnxTextClassifier(onnx_dir)
+    if backend != "transformers":
+        raise ValueError(f"Unknown intent classifier backend: {backend}")
+    if artefacts is not None:
+        model, revision = artefacts.resolve(model, revision), None
+    from transformers import pipeline
+    return pipeline("text-classification", model=model, revision=revision)
+
+
+def load_sentiment_analyser(model=None, revision=None, artefacts=None):
+    """
+    Loads the sentiment analyser.
+
+    Args:
+        model (str, optional): The Hugging Face model id. Defaults to the transformers default for the task.
+        revision (str, optional): The model revision.
+        artefacts (ModelArtefacts, optional): Load the model from this local cache instead of the hub.
+
+    Returns:
+        callable: The transformers sentiment-analysis pipeline.
+    """
+    if model is not None and artefacts is not None:
+        model, revision = artefacts.resolve(model, revision), None
+    from transformers import pipeline
+    return pipeline("sentiment-analysis", model=model, revision=revision)
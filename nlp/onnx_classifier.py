@@ -0,0 +1,82 @@
+import json
+import os
+
+import numpy as np
+
+
+class OnnxTextClassifier:
+    """
+    A drop-in for the transformers text-classification pipeline, running an exported ONNX graph.
+
+    Loads the directory written by `training.export.export_onnx` and runs it on onnxruntime's CPU
+    provider, which is several times faster than the full-precision pipeline with an int8 graph.
+    Calls and outputs follow the pipeline: a string gives a list of {"label", "score"} dicts (the best
+    one, or all of them sorted with `top_k=None`), and a list of strings is classified as one batch.
+
+    Attributes:
+        model_dir (str): The exported model directory.
+        id2label (dict): The label name of each output index.
+        revision (str): The model revision recorded at export, or None.
+    """
+
+    def __init__(self, model_dir, graph=None, max_length=128, threads=None):
+        """
+        Loads the exported model.
+
+        Args:
+            model_dir (str): The directory written by `export_onnx`.
+            graph (str, optional): The ONNX file in it to run. Defaults to the one recorded at export.
+            max_length (int): The maximum number of tokens per utterance.
+            threads (int, optional): The number of intra-op threads. Defaults to onnxruntime's choice.
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer, AutoConfig
+
+        self.model_dir = model_dir
+        with open(os.path.join(model_dir, "export.json")) as file:
+            export = json.load(file)
+        self.revision = export.get("revision")
+        if graph is None:
+            graph = export["graph"]
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(os.path.join(model_dir, graph), options, providers=["CPUExecutionProvider"])
+        self._input_names = [node.name for node in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        config = AutoConfig.from_pretrained(model_dir)
+        self.id2label = {int(index): label for index, label in config.id2label.items()}
+        self.max_length = max_length
+        self._sigmoid = len(self.id2label) == 1  # As the pipeline: softmax unless there is a single label
+
+    def _scores(self, texts):
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        logits = self.session.run(["logits"], {name: encoded[name].astype(np.int64) for name in self._input_names})[0]
+        if self._sigmoid:
+            return 1 / (1 + np.exp(-logits))
+        exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+    def _format(self, scores, top_k):
+        ranked = [{"label": self.id2label[index], "score": float(scores[index])} for index in np.argsort(-scores)]
+        return ranked if top_k is None else ranked[:top_k]
+
+    def __call__(self, inputs, top_k=1):
+        """
+        Classifies one utterance or a batch of them.
+
+        Args:
+            inputs (str | list): The utterance(s).
+            top_k (int, optional): How many labels to return per utterance; None for all of them.
+
+        Returns:
+            list: For a string, its labels. For a list, its labels per utterance: a dict each with
+                `top_k=1`, or a list each otherwise.
+        """
+        if isinstance(inputs, str):
+            return self._format(self._scores([inputs])[0], top_k)
+        if not inputs:
+            return []
+        results = [self._format(scores, top_k) for scores in self._scores(list(inputs))]
+        return [result[0] for result in results] if top_k == 1 else results
@@ -0,0 +1,140 @@
+import threading
+
+
+class NLPRegistry:
+    """
+    Process-wide registry of loaded spaCy pipelines and compiled matchers.
+
+    Loading `en_core_web_sm` takes hundreds of milliseconds, so pipelines are loaded lazily on first
+    use and then shared by every agent and session in the process. Matchers are compiled once per
+    pipeline and cached under a caller supplied key. All methods are thread-safe.
+
+    Attributes:
+        default_model (str): The spaCy model loaded when no name is given.
+        stats (dict): Counters of pipeline/matcher loads and cache hits.
+    """
+
+    def __init__(self, default_model="en_core_web_sm"):
+        """
+        Initializes an empty registry.
+
+        Args:
+            default_model (str): The spaCy model loaded when no name is given.
+        """
+        self.default_model = default_model
+        self._pipelines = {}
+        self._matchers = {}
+        self._lock = threading.RLock()
+        self.stats = {"pipeline_loads": 0, "pipeline_hits": 0, "matcher_builds": 0, "matcher_hits": 0}
+
+    def get_pipeline(self, name=None, disable=()):
+        """
+        Returns a loaded spaCy pipeline, loading it on first use.
+
+        Args:
+            name (str, optional): The spaCy model name. Defaults to `default_model`.
+            disable (iterable, optional): Pipeline components to disable. Each distinct set is loaded once.
+
+        Returns:
+            Language: The loaded spaCy pipeline.
+        """
+        key = (name or self.default_model, tuple(sorted(disable)))
+        nlp = self._pipelines.get(key)
+        if nlp is not None:
+            self.stats["pipeline_hits"] += 1
+            return nlp
+
+        with self._lock:
+            nlp = self._pipelines.get(key)  # Another thread may have loaded it while we waited
+            if nlp is None:
+                import spacy
+                nlp = spacy.load(key[0], disable=list(key[1]))
+                self._pipelines[key] = nlp
+                self.stats["pipeline_loads"] += 1
+            else:
+                self.stats["pipeline_hits"] += 1
+        return nlp
+
+    def get_matcher(self, key, patterns, name=None, disable=()):
+        """
+        Returns a spaCy Matcher compiled from the given patterns, building it on first use.
+
+        Args:
+            key (str): A unique name for the matcher, e.g. "cancel_intent".
+            patterns (list): A list of token patterns, each added under its own rule.
+            name (str, optional): The spaCy model whose vocab the matcher is bound to.
+            disable (iterable, optional): Pipeline components disabled on that model.
+
+        Returns:
+            Matcher: The compiled matcher.
+        """
+        cache_key = (key, name or self.default_model, tuple(sorted(disable)))
+        matcher = self._matchers.get(cache_key)
+        if matcher is not None:
+            self.stats["matcher_hits"] += 1
+            return matcher
+
+        with self._lock:
+            matcher = self._matchers.get(cache_key)
+            if matcher is None:
+                from spacy.matcher import Matcher
+                nlp = self.get_pipeline(name, disable)
+                matcher = Matcher(nlp.vocab)
+                for i, pattern in enumerate(patterns):
+                    matcher.add(f"{key}_{i}", [pattern])
+                self._matchers[cache_key] = matcher
+                self.stats["matcher_builds"] += 1
+            else:
+                self.stats["matcher_hits"] += 1
+        return matcher
+
+    def preload(self, names=None, disable=()):
+        """
+        Eagerly loads pipelines so the first user turn does not pay for it.
+
+        Args:
+            names (list, optional): The spaCy model names to load. Defaults to `[default_model]`.
+            disable (iterable, optional): Pipeline components to disable.
+
+        Returns:
+            list: The loaded pipelines.
+        """
+        return [self.get_pipeline(name, disable) for name in (names or [self.default_model])]
+
+    def get_stats(self):
+        """
+        Returns a snapshot of the load and hit counters.
+
+        Returns:
+            dict: The counters plus the number of cached pipelines and matchers.
+        """
+        stats = dict(self.stats)
+        stats["pipelines_cached"] = len(self._pipelines)
+        stats["matchers_cached"] = len(self._matchers)
+        return stats
+
+    def clear(self):
+        """
+        Drops every cached pipeline and matcher.
+        """
+        with self._lock:
+            self._pipelines.clear()
+            self._matchers.clear()
+
+
+# Shared registry used by the whole process
+registry = NLPRegistry()
+
+
+def preload(names=None, disable=()):
+    """
+    Eagerly loads spaCy pipelines into the shared registry. Call this at server startup.
+
+    Args:
+        names (list, optional): The spaCy model names to load.
+        disable (iterable, optional): Pipeline components to disable.
+
+    Returns:
+        list: The loaded pipelines.
+    """
+    return registry.preload(names, disable)
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from string import Template
+
+
+def placeholders(text):
+    """
+    Lists the `string.Template` placeholders in a text.
+
+    Args:
+        text (str): The text, e.g. "Thanks $name, what is your ${field}?".
+
+    Returns:
+        set: The placeholder names, e.g. {"name", "field"}.
+    """
+    return {match.group("named") or match.group("braced") for match in Template.pattern.finditer(text)
+            if match.group("named") or match.group("braced")}
+
+
+class RephraseCache:
+    """
+    Caches LLM rephrasings of the agent's fixed prompts.
+
+    Reprompts and fallbacks come from a small, fixed set of strings, so rephrasing each of them on
+    every turn spends seconds and API calls for nearly identical output. Entries are keyed by the
+    agent identity, the text to rephrase and a coarse conversation fingerprint (e.g. intent, topic
+    and mood), so a rephrasing is only reused in a similar situation. Callers should cache the
+    prompt's template, placeholders and all, and fill in the user's values afterwards, so entries
+    are shared between users and never hold their data.
+
+    Each key keeps up to `variants` rephrasings, and a lookup picks one at random, so users don't get
+    the same wording every time. A key is served as soon as it has one; `missing_variants` tells the
+    caller to collect more (see `RephraseScheduler`, which does so in the background).
+    Variants expire after `ttl` seconds, and the least recently used keys are evicted beyond
+    `max_entries`. With a `path`, the cache is loaded from and saved to a JSON file.
+
+    Attributes:
+        max_entries (int): The maximum number of keys kept.
+        ttl (float): Seconds a variant stays valid; None keeps them forever.
+        variants (int): The number of rephrasings kept per key.
+        path (str): The JSON file the cache persists to, or None.
+        save_every (int): Save after this many new variants.
+    """
+
+    def __init__(self, max_entries=1024, ttl=24 * 3600, variants=3, path=None, save_every=20, clock=time.time):
+        """
+        Initializes the cache, loading it from `path` if the file exists.
+
+        Args:
+            max_entries (int): The maximum number of keys kept.
+            ttl (float, optional): Seconds a variant stays valid; None keeps them forever.
+            variants (int): The number of rephrasings kept per key.
+            path (str, optional): The JSON file to persist the cache to.
+            save_every (int): Save after this many new variants.
+            clock (callable): Returns the current wall-clock time; stored with each variant.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self.path = path
+        self.save_every = save_every
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> [[text, created], ...], least recently used first
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0}
+        if path and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def make_key(identity, text, fingerprint=()):
+        """
+        Builds a cache key.
+
+        Args:
+            identity (str): The agent identity the LLM rephrases as.
+            text (str): The text to rephrase.
+            fingerprint (tuple): A coarse description of the conversation, e.g. (intent, topic, mood).
+
+        Returns:
+            str: The key.
+        """
+        identity_hash = hashlib.sha1(identity.encode()).hexdigest()[:12]  # Identities are long and shared by every key
+        return json.dumps([identity_hash, text, [str(part) for part in fingerprint]], ensure_ascii=False)
+
+    def get(self, key):
+        """
+        Returns one of a key's cached rephrasings at random, or None if it has none.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str: A rephrasing, or None.
+        """
+        with self._lock:
+            variants = self._live_variants(key)
+            if variants is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return random.choice(variants)[0]
+
+    def missing_variants(self, key):
+        """
+        Counts the rephrasings a key still lacks.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            int: How many more variants the key can hold.
+        """
+        with self._lock:
+            variants = self._live_variants(key)
+            return self.variants - (len(variants) if variants else 0)
+
+    def put(self, key, text):
+        """
+        Stores a rephrasing under a key.
+
+        Args:
+            key (str): The cache key.
+            text (str): The rephrasing.
+        """
+        with self._lock:
+            variants = self._live_variants(key)
+            if variants is None:
+                variants = self._entries[key] = []
+            self._entries.move_to_end(key)
+            # A repeat still counts towards `variants`, or a key an LLM always answers the same way
+            # (e.g. at temperature 0) would never fill up and be rephrased on every turn
+            variants.append([text, self._clock()])
+            del variants[:-self.variants]
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._unsaved += 1
+            save = self.path and self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def rephrase(self, identity, text, fingerprint, rephrase_fn):
+        """
+        Returns a cached rephrasing of `text`, calling `rephrase_fn` and caching its result on a miss.
+
+        A failed rephrasing (None, empty, or the input echoed back) is returned but not cached. Only a
+        miss calls `rephrase_fn`, so this collects one variant per key; `RephraseScheduler` collects the rest.
+
+        Args:
+            identity (str): The agent identity the LLM rephrases as.
+            text (str): The text to rephrase.
+            fingerprint (tuple): A coarse description of the conversation.
+            rephrase_fn (callable): Takes the text and returns its rephrasing.
+
+        Returns:
+            str: The rephrased text.
+        """
+        key = self.make_key(identity, text, fingerprint)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        reply = rephrase_fn(text)
+        if reply and reply != text:
+            self.put(key, reply)
+        return reply
+
+    def _live_variants(self, key):
+        """Returns the unexpired variants of a key, dropping expired ones. Must hold the lock."""
+        variants = self._entries.get(key)
+        if variants is None or self.ttl is None:
+            return variants
+        cutoff = self._clock() - self.ttl
+        live = [variant for variant in variants if variant[1] > cutoff]
+        if len(live) == len(variants):
+            return variants
+        self.stats["expirations"] += len(variants) - len(live)
+        if not live:
+            del self._entries[key]
+            return None
+        self._entries[key] = live
+        return live
+
+    def save(self):
+        """
+        Writes the cache to `path`, replacing the file atomically.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            data = {"version": 1, "entries": [(key, [list(variant) for variant in variants]) for key, variants in self._entries.items()]}
+            self._unsaved = 0
+        temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w") as file:
+                json.dump(data, file, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Could not save the rephrase cache to {self.path}: {e}")
+
+    def load(self):
+        """
+        Loads the cache from `path`, skipping expired variants.
+        """
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Could not load the rephrase cache from {self.path}: {e}")
+            return
+        with self._lock:
+            for key, variants in data.get("entries", []):
+                self._entries[key] = [list(variant) for variant in variants][-self.variants:]
+                self._live_variants(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: Hits, misses, stores, evictions, expirations, the hit rate and the number of keys.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,153 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+class RephraseScheduler:
+    """
+    Races LLM rephrasings against a deadline so a slow backend can't hold up the reply.
+
+    A cache miss is rephrased on a small worker pool. If the rephrasing isn't ready when the
+    deadline passes, the caller gets the template text and the rephrasing carries on in the
+    background; when it arrives it is stored in the cache for the next turn. Turns asking for the
+    same key while it is being rephrased wait on the same call instead of starting another, and
+    beyond `max_pending` calls in flight new misses skip the LLM altogether.
+
+    A hit on a key that holds fewer than the cache's `variants` is served at once, and another
+    variant is collected in the background for later turns.
+
+    Attributes:
+        cache (RephraseCache): The cache rephrasings are read from and stored in.
+        max_workers (int): The number of rephrasings that may run at once.
+        max_pending (int): The number of rephrasings that may be queued or running before misses are shed.
+    """
+
+    def __init__(self, cache, max_workers=4, max_pending=32):
+        """
+        Initializes the scheduler.
+
+        Args:
+            cache (RephraseCache): The cache to read from and store in.
+            max_workers (int): The number of rephrasings that may run at once.
+            max_pending (int): The number of rephrasings that may be queued or running before misses are shed.
+        """
+        self.cache = cache
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool = None  # Created on the first deadline-bound miss
+        self._pending = {}  # key -> Future
+        self._lock = threading.Lock()
+        self.stats = {"on_time": 0, "late": 0, "joined": 0, "shed": 0, "failed": 0, "warmed": 0, "collected": 0}
+
+    def rephrase(self, identity, text, fingerprint, rephrase_fn, timeout=None):
+        """
+        Returns a rephrasing of `text`, or `text` itself if none is ready within `timeout` seconds.
+
+        Args:
+            identity (str): The agent identity the LLM rephrases as.
+            text (str): The text to rephrase.
+            fingerprint (tuple): A coarse description of the conversation.
+            rephrase_fn (callable): Takes the text and returns its rephrasing.
+            timeout (float, optional): Seconds to wait for the rephrasing. None waits as long as it takes.
+
+        Returns:
+            str: The rephrased text, or the original text if the rephrasing missed the deadline or failed.
+        """
+        key = self.cache.make_key(identity, text, fingerprint)
+        cached = self.cache.get(key)
+        if cached is not None:
+            if self.cache.missing_variants(key):
+                self.collect(key, text, rephrase_fn)
+            return cached
+        if timeout is None:
+            reply = rephrase_fn(text)
+            if reply and reply != text:
+                self.cache.put(key, reply)
+            return reply
+
+        submitted = False
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                self.stats["joined"] += 1
+            elif len(self._pending) >= self.max_pending:
+                self.stats["shed"] += 1
+                return text
+            else:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="rephrase")
+                future = self._pool.submit(rephrase_fn, text)
+                self._pending[key] = future
+                submitted = True
+        if submitted:
+            # Outside the lock: a future that has already finished runs the callback right here, and _finish takes the lock
+            future.add_done_callback(lambda future: self._finish(key, text, future))
+
+        try:
+            reply = future.result(timeout=timeout)
+        except TimeoutError:
+            with self._lock:
+                self.stats["late"] += 1
+            return text
+        except Exception as e:
+            print(f"Given text could not be rephrased responding with echo: {e}")
+            return text
+        with self._lock:
+            self.stats["on_time"] += 1
+        return reply or text
+
+    def collect(self, key, text, rephrase_fn):
+        """
+        Rephrases `text` in the background for another variant of `key`, unless the key is already
+        being rephrased or too many rephrasings are in flight.
+
+        Args:
+            key (str): The cache key.
+            text (str): The text to rephrase.
+            rephrase_fn (callable): Takes the text and returns its rephrasing.
+        """
+        with self._lock:
+            if key in self._pending or len(self._pending) >= self.max_pending:
+                return
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="rephrase")
+            future = self._pool.submit(rephrase_fn, text)
+            self._pending[key] = future
+            self.stats["collected"] += 1
+        future.add_done_callback(lambda future: self._finish(key, text, future))
+
+    def _finish(self, key, text, future):
+        """Stores a finished rephrasing in the cache, whether or not its caller is still waiting."""
+        with self._lock:
+            self._pending.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            with self._lock:
+                self.stats["failed"] += 1
+            return
+        reply = future.result()
+        if reply and reply != text:
+            self.cache.put(key, reply)
+            with self._lock:
+                self.stats["warmed"] += 1
+
+    def shutdown(self, wait=True):
+        """
+        Stops the worker pool.
+
+        Args:
+            wait (bool): Whether to wait for rephrasings in flight.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+
+    def get_stats(self):
+        """
+        Returns the scheduler counters.
+
+        Returns:
+            dict: Rephrasings on time, late, joined, shed, failed, stored by the background calls and
+                started to collect more variants, and the number in flight.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._pending)
+        return stats
@@ -0,0 +1,449 @@
+"""
+Pre-fork server for the Twilio `/sms` webhook: one copy of the models, one worker process per core.
+
+The parent loads the models and configuration once, then forks the workers, so every worker
+shares the model weights copy-on-write instead of loading its own. The parent serves HTTP (with the
+same routes as `async_server.py`) and dispatches each message to a worker chosen by hashing the
+sender's WaId, so a conversation always reaches the worker that holds its state. Each worker runs
+its conversations on its own thread pool, like the async server does in-process.
+
+Fork is only available on POSIX systems. A worker that dies takes its conversations with it: the
+messages it was handling fail, and the server reports not ready (answering 503) until restarted.
+
+Usage:
+    python prefork_server.py [--host 0.0.0.0] [--port 5000] [--workers N] [--threads 8] [--session-db sessions.db]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from multiprocessing import Pipe
+
+from aiohttp import web
+
+import telemetry
+from agent import load_resources
+from async_server import AgentService, SERVICE, sms_reply, healthz, readyz
+from nlp import registry as nlp_registry
+from nlp.entities import NER_ONLY
+from session import SQLiteSessionStore
+
+
+class WorkerUnavailable(RuntimeError):
+    """Raised for messages routed to a worker that has died."""
+
+
+def _run_worker(conn, resources, threads, torch_threads, store_factory):
+    """
+    The worker process: answers the messages the parent sends over `conn` until told to stop.
+
+    Messages are (request id, conversation key, text), or ("metrics", request id) for the worker's
+    rendered metrics; replies are (request id, response, error).
+    """
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)  # Workers share the cores, so each keeps its inference to a few threads
+    except ImportError:
+        pass
+    service = AgentService(lambda: resources, workers=threads, store_factory=store_factory)
+    service.load()
+    conn.send(("ready", service.timings, None))
+    send_lock = threading.Lock()
+
+    def handle(request_id, key, text):
+        try:
+            reply, error = service.reply(key, text), None
+        except Exception as e:
+            reply, error = None, repr(e)
+        with send_lock:
+            conn.send((request_id, reply, error))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        if message[0] == "metrics":
+            with send_lock:
+                conn.send((message[1], telemetry.render(), None))
+            continue
+        service.executor.submit(handle, *message)
+    service.executor.shutdown(wait=True)
+    if service.sessions.store is not None:
+        service.sessions.store.close()
+
+
+class PreforkDispatcher:
+    """
+    Forks the worker processes and routes conversations to them.
+
+    Attributes:
+        resources (AgentResources): The models and configuration, loaded in the parent and shared with the workers.
+        workers (int): The number of worker processes.
+        threads (int): The number of conversations each worker may run at once.
+    """
+
+    def __init__(self, resources, workers=None, threads=8, torch_threads=1, store_factory=None):
+        """
+        Initializes the dispatcher; the workers are forked by `start`.
+
+        Args:
+            resources (AgentResources): The loaded models and configuration.
+            workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+            threads (int): The number of conversations each worker may run at once.
+            torch_threads (int): The number of inference threads each worker's models may use.
+            store_factory (callable, optional): Opens the `SessionStore` a worker saves conversations to. Called in each worker.
+        """
+        self.resources = resources
+        self.store_factory = store_factory
+        self.workers = workers or os.cpu_count() or 1
+        self.threads = threads
+        self.torch_threads = torch_threads
+        self._workers = []  # Per worker: {"pid", "conn", "lock", "pending", "alive", "ready", "requests"}
+        self._next_id = 0
+        self._id_lock = threading.Lock()
+        self._settled = threading.Event()  # Set once every worker is ready, or one has died while loading
+        self.timings = {}
+        self.error = None
+        self._stopping = False
+
+    def start(self, timeout=None):
+        """
+        Forks the workers and waits for them to be ready.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the workers to load.
+
+        Returns:
+            bool: Whether every worker became ready in time.
+        """
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")  # The tokenizers thread pool doesn't survive a fork
+        # Keep the collector from touching (and so copying) every object inherited from the parent
+        gc.collect()
+        gc.freeze()
+        for index in range(self.workers):
+            parent_conn, child_conn = Pipe()
+            pid = os.fork()
+            if pid == 0:
+                parent_conn.close()
+                for other in self._workers:
+                    other["conn"].close()
+                code = 0
+                try:
+                    _run_worker(child_conn, self.resources, self.threads, self.torch_threads, self.store_factory)
+                except BaseException as e:
+                    print(f"Worker {index} failed: {e!r}")
+                    code = 1
+                finally:
+                    os._exit(code)
+            child_conn.close()
+            self._workers.append({"pid": pid, "conn": parent_conn, "lock": threading.Lock(), "pending": {},
+                                  "alive": True, "ready": False, "requests": 0})
+        gc.unfreeze()
+        for index in range(self.workers):
+            threading.Thread(target=self._read, args=(index,), name=f"prefork-reader-{index}", daemon=True).start()
+        self._settled.wait(timeout)
+        return self.ready
+
+    @property
+    def ready(self):
+        """bool: Whether every worker has loaded and is still running."""
+        return bool(self._workers) and all(worker["ready"] and worker["alive"] for worker in self._workers)
+
+    def worker_for(self, key):
+        """
+        Returns the index of the worker a conversation belongs to. Stable across processes and restarts.
+
+        Args:
+            key (str): The conversation key.
+
+        Returns:
+            int: The worker index.
+        """
+        return zlib.crc32(key.encode()) % self.workers
+
+    def submit(self, key, text):
+        """
+        Sends a message to its conversation's worker.
+
+        Args:
+            key (str): The conversation key.
+            text (str): The user's message.
+
+        Returns:
+            Future: A future resolving to the agent's response.
+        """
+        return self._send(self._workers[self.worker_for(key)], lambda request_id: (request_id, key, text), count=True)
+
+    def _send(self, worker, make_message, count=False):
+        """Sends a worker the message made from a new request id, and returns the future of its reply."""
+        future = Future()
+        if not worker["alive"]:
+            future.set_exception(WorkerUnavailable(f"Worker {worker['pid']} is not running"))
+            return future
+        with self._id_lock:
+            self._next_id += 1
+            request_id = self._next_id
+        with worker["lock"]:
+            worker["pending"][request_id] = future
+            worker["requests"] += count
+            try:
+                worker["conn"].send(make_message(request_id))
+            except OSError as e:
+                worker["pending"].pop(request_id, None)
+                future.set_exception(WorkerUnavailable(f"Worker {worker['pid']} is not running: {e}"))
+        return future
+
+    def collect_metrics(self, timeout=2):
+        """
+        Asks every running worker for its metrics.
+
+        Args:
+            timeout (float): Seconds to wait for each worker.
+
+        Returns:
+            dict: Each worker's rendered metrics, keyed by its index as a string. Workers that didn't
+                answer in time are left out.
+        """
+        futures = {str(index): self._send(worker, lambda request_id: ("metrics", request_id))
+                   for index, worker in enumerate(self._workers) if worker["alive"]}
+        expositions = {}
+        for index, future in futures.items():
+            try:
+                expositions[index] = future.result(timeout)
+            except Exception as e:
+                print(f"Could not collect the metrics of worker {index}: {e!r}")
+        return expositions
+
+    def interact(self, key, text, timeout=None):
+        """
+        Sends a message to its conversation's worker and waits for the response.
+
+        Args:
+            key (str): The conversation key.
+            text (str): The user's message.
+            timeout (float, optional): Seconds to wait.
+
+        Returns:
+            dict: The agent's response.
+        """
+        return self.submit(key, text).result(timeout)
+
+    def _read(self, index):
+        """Resolves the futures of one worker's replies until it exits."""
+        worker = self._workers[index]
+        while True:
+            try:
+                request_id, reply, error = worker["conn"].recv()
+            except (EOFError, OSError):
+                break
+            if request_id == "ready":
+                worker["ready"] = True
+                self.timings[index] = reply
+                if all(other["ready"] for other in self._workers):
+                    self._settled.set()
+                continue
+            with worker["lock"]:
+                future = worker["pending"].pop(request_id, None)
+            if future is None:
+                continue
+            if error is None:
+                future.set_result(reply)
+            else:
+                future.set_exception(RuntimeError(error))
+
+        with worker["lock"]:
+            worker["alive"] = False
+            pending, worker["pending"] = worker["pending"], {}
+        if not self._stopping:
+            self.error = f"Worker {worker['pid']} exited"
+            print(self.error)
+            self._settled.set()
+        for future in pending.values():
+            future.set_exception(WorkerUnavailable(f"Worker {worker['pid']} exited"))
+
+    def stop(self, timeout=10):
+        """
+        Asks the workers to finish their messages and exit, and waits for them.
+
+        Args:
+            timeout (float): Seconds to wait before killing the workers still running.
+        """
+        self._stopping = True
+        for worker in self._workers:
+            try:
+                with worker["lock"]:
+                    worker["conn"].send(None)
+            except OSError:
+                pass
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            while True:
+                pid, _ = os.waitpid(worker["pid"], os.WNOHANG)
+                if pid:
+                    break
+                if time.monotonic() > deadline:
+                    os.kill(worker["pid"], 9)
+                    os.waitpid(worker["pid"], 0)
+                    break
+                time.sleep(0.05)
+            worker["conn"].close()
+
+    def get_stats(self):
+        """
+        Returns the per-worker counters.
+
+        Returns:
+            dict: The pid, liveness, requests sent and requests in flight of each worker.
+        """
+        return {"workers": [{"pid": worker["pid"], "alive": worker["alive"], "requests": worker["requests"],
+                             "in_flight": len(worker["pending"])} for worker in self._workers]}
+
+
+class PreforkService:
+    """
+    Serves the async server's routes from a `PreforkDispatcher` instead of in-process sessions.
+
+    Attributes:
+        dispatcher (PreforkDispatcher): The workers.
+        timings (dict): Seconds spent on each loading step, in the parent and in each worker.
+        error (str): Why a worker failed to start, if one did.
+    """
+
+    def __init__(self, dispatcher, timings=None):
+        """
+        Initializes the service.
+
+        Args:
+            dispatcher (PreforkDispatcher): The started workers.
+            timings (dict, optional): Seconds spent loading in the parent.
+        """
+        self.dispatcher = dispatcher
+        self.timings = dict(timings or {})
+        self.timings["workers"] = dispatcher.timings
+
+    @property
+    def ready(self):
+        """bool: Whether every worker has loaded and is still running."""
+        return self.dispatcher.ready
+
+    @property
+    def error(self):
+        """str: Why a worker stopped, if one did."""
+        return self.dispatcher.error
+
+    async def stop(self, app=None):
+        """
+        Stops the workers.
+
+        Args:
+            app (web.Application, optional): The application, when used as a cleanup hook.
+        """
+        self.dispatcher.stop()
+
+    async def interact(self, key, text):
+        """
+        Runs one agent turn on the conversation's worker.
+
+        Args:
+            key (str): The conversation key.
+            text (str): The user's message.
+
+        Returns:
+            dict: The agent's response.
+        """
+        return await asyncio.wrap_future(self.dispatcher.submit(key, text))
+
+    def get_stats(self):
+        """
+        Returns the serving stats reported by `/readyz`.
+
+        Returns:
+            dict: The per-worker counters.
+        """
+        return self.dispatcher.get_stats()
+
+
+def load_and_fork(workers=None, threads=8, torch_threads=1, resources_factory=load_resources, store_factory=None):
+    """
+    Loads the models once in this process and forks the workers sharing them.
+
+    Args:
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+        threads (int): The number of conversations each worker may run at once.
+        torch_threads (int): The number of inference threads each worker's models may use.
+        resources_factory (callable): Loads the `AgentResources`.
+        store_factory (callable, optional): Opens the `SessionStore` a worker saves conversations to. Called in each worker.
+
+    Returns:
+        PreforkService: The service, with its workers started.
+    """
+    timings = {}
+    started = time.perf_counter()
+    nlp_registry.preload(disable=NER_ONLY)
+    timings["spacy"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    resources = resources_factory()
+    timings["models"] = round(time.perf_counter() - started, 3)
+    # Warm up in the parent so lazily built model state is shared too, without starting the
+    # micro-batcher threads, which must only be started in the workers.
+    timings["warm_up"] = resources.warm_up(fork_safe=True)
+
+    dispatcher = PreforkDispatcher(resources, workers, threads, torch_threads, store_factory)
+    dispatcher.start()
+    return PreforkService(dispatcher, timings)
+
+
+async def metrics(request):
+    """
+    The metrics of the parent and of every worker in the Prometheus text exposition format, told
+    apart by a `worker` label ("parent" or the worker index).
+    """
+    service = request.app[SERVICE]
+    expositions = {"parent": telemetry.render()}
+    expositions.update(await asyncio.get_running_loop().run_in_executor(None, service.dispatcher.collect_metrics))
+    return web.Response(text=telemetry.merge_expositions(expositions), content_type="text/plain",
+                        headers={"X-Prometheus-Format": "0.0.4"})
+
+
+def create_app(service):
+    """
+    Creates the aiohttp application serving the pre-forked workers.
+
+    Args:
+        service (PreforkService): The started service.
+
+    Returns:
+        web.Application: The application.
+    """
+    app = web.Application()
+    app[SERVICE] = service
+    app.on_cleanup.append(service.stop)
+    app.router.add_route("GET", "/sms", sms_reply)
+    app.router.add_route("POST", "/sms", sms_reply)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/readyz", readyz)
+    app.router.add_get("/metrics", metrics)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--threads", type=int, default=8, help="conversations each worker may run at once")
+    parser.add_argument("--torch-threads", type=int, default=1, help="inference threads per worker")
+    parser.add_argument("--session-db", help="SQLite file the workers save conversations to, so they survive restarts")
+    args = parser.parse_args()
+    # Each worker opens its own connection after the fork; WAL lets them write the shared file side by side
+    store_factory = (lambda: SQLiteSessionStore(args.session_db)) if args.session_db else None
+    web.run_app(create_app(load_and_fork(args.workers, args.threads, args.torch_threads, store_factory=store_factory)),
+                host=args.host, port=args.port)
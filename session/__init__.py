@@ -1 +1,4 @@
-from .session import Session
\ No newline at end of file
+from .session import Session
+from .manager import SessionManager
+from .expiry import ExpiryWheel
+from .store import SessionStore, MemorySessionStore, SQLiteSessionStore
\ No newline at end of file
@@ -0,0 +1,218 @@
+import threading
+import time
+
+
+class _Timer:
+    __slots__ = ("key", "deadline", "callback", "cancelled")
+
+    def __init__(self, key, deadline, callback):
+        self.key = key
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+
+class ExpiryWheel:
+    """
+    A hashed timer wheel that expires many sessions from a single thread.
+
+    Timers are hashed into `slots` buckets by the tick their deadline falls in. Scheduling,
+    renewing and cancelling are O(1): a renewal only moves the deadline forward, and the timer is
+    re-hashed when its old bucket comes round. Each tick only visits its own bucket, so the cost per
+    timer is O(1) amortized regardless of how many are pending.
+
+    Attributes:
+        tick (float): The wheel resolution in seconds.
+        slots (int): The number of buckets. Deadlines further than `tick * slots` away just go round again.
+        clock (callable): A monotonic clock returning seconds.
+    """
+
+    def __init__(self, tick=1.0, slots=1024, clock=time.monotonic):
+        """
+        Initializes an empty wheel. Call `start()` to run it on a background thread, or `advance()` manually.
+
+        Args:
+            tick (float): The wheel resolution in seconds.
+            slots (int): The number of buckets.
+            clock (callable): A monotonic clock returning seconds.
+        """
+        self.tick = tick
+        self.slots = slots
+        self.clock = clock
+        self._wheel = [[] for _ in range(slots)]
+        self._timers = {}
+        self._current_tick = self._tick_of(clock())
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {"scheduled": 0, "renewed": 0, "cancelled": 0, "expired": 0, "rehashed": 0}
+
+    def _tick_of(self, timestamp):
+        return int(timestamp // self.tick)
+
+    def _insert(self, timer):
+        # Never hash into a tick that has already been processed
+        tick = max(self._tick_of(timer.deadline), self._current_tick + 1)
+        self._wheel[tick % self.slots].append(timer)
+
+    def schedule(self, key, deadline, callback):
+        """
+        Schedules a callback for a key, replacing any timer the key already has.
+
+        Args:
+            key (hashable): The timer key, e.g. a session id.
+            deadline (float): When to fire, on the wheel's clock.
+            callback (callable): Called with no arguments once the deadline passes.
+        """
+        timer = _Timer(key, deadline, callback)
+        with self._lock:
+            old = self._timers.get(key)
+            if old is not None:
+                old.cancelled = True
+            self._timers[key] = timer
+            self._insert(timer)
+            self.stats["scheduled"] += 1
+
+    def renew(self, key, deadline):
+        """
+        Moves a pending timer's deadline. Only later deadlines are applied without re-hashing.
+
+        Args:
+            key (hashable): The timer key.
+            deadline (float): The new deadline, on the wheel's clock.
+
+        Returns:
+            bool: True if the key had a pending timer, False otherwise.
+        """
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                return False
+            if deadline < timer.deadline:
+                # Earlier deadlines need a new bucket
+                timer.cancelled = True
+                timer = _Timer(key, deadline, timer.callback)
+                self._timers[key] = timer
+                self._insert(timer)
+            else:
+                timer.deadline = deadline
+            self.stats["renewed"] += 1
+            return True
+
+    def cancel(self, key):
+        """
+        Cancels the pending timer for a key, if any.
+
+        Args:
+            key (hashable): The timer key.
+
+        Returns:
+            bool: True if a timer was cancelled, False otherwise.
+        """
+        with self._lock:
+            timer = self._timers.pop(key, None)
+            if timer is None:
+                return False
+            timer.cancelled = True
+            self.stats["cancelled"] += 1
+            return True
+
+    def advance(self, now=None):
+        """
+        Fires every timer whose deadline has passed.
+
+        Args:
+            now (float, optional): The current time on the wheel's clock. Defaults to `clock()`.
+
+        Returns:
+            int: The number of timers fired.
+        """
+        now = self.clock() if now is None else now
+        target = self._tick_of(now)
+        due = []
+        with self._lock:
+            start = self._current_tick + 1
+            if target < start:
+                return 0
+            # After a long pause every bucket is due once; visiting it more often would find nothing new
+            ticks = range(max(start, target - self.slots + 1), target + 1)
+            self._current_tick = target
+            for tick in ticks:
+                index = tick % self.slots
+                bucket, self._wheel[index] = self._wheel[index], []
+                for timer in bucket:
+                    if timer.cancelled:
+                        continue
+                    if timer.deadline <= now:
+                        del self._timers[timer.key]
+                        due.append(timer)
+                    else:
+                        self._insert(timer)
+                        self.stats["rehashed"] += 1
+            self.stats["expired"] += len(due)
+
+        for timer in due:
+            try:
+                timer.callback()
+            except Exception as e:
+                print(f"Expiry callback for {timer.key} failed: {e}")
+        return len(due)
+
+    def start(self):
+        """
+        Starts the background thread that advances the wheel once per tick.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="session-expiry", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            self.advance()
+
+    def stop(self):
+        """
+        Stops the background thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __len__(self):
+        return len(self._timers)
+
+    def get_stats(self):
+        """
+        Returns timer counters.
+
+        Returns:
+            dict: Scheduled/renewed/cancelled/expired/rehashed counters and the number of pending timers.
+        """
+        stats = dict(self.stats)
+        stats["pending"] = len(self._timers)
+        return stats
+
+
+_default_wheel = None
+_default_wheel_lock = threading.Lock()
+
+
+def get_default_wheel():
+    """
+    Returns the process-wide expiry wheel, starting it on first use.
+
+    Returns:
+        ExpiryWheel: The shared wheel.
+    """
+    global _default_wheel
+    if _default_wheel is None:
+        with _default_wheel_lock:
+            if _default_wheel is None:
+                wheel = ExpiryWheel()
+                wheel.start()
+                _default_wheel = wheel
+    return _default_wheel
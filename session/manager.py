@@ -0,0 +1,144 @@
+import threading
+from .session import Session
+from .expiry import get_default_wheel
+
+
+class SessionManager:
+    """
+    Keeps one Session per conversation key (e.g. a WhatsApp `WaId`) on top of shared agent resources.
+
+    Every session gets its own Agent, built from the already loaded `AgentResources`, so a new
+    conversation never reloads JSON files or models. Sessions expire on a shared `ExpiryWheel`;
+    expired sessions are evicted and their agent state is freed.
+
+    With a `SessionStore`, the agent's state is saved after every turn, and a conversation with no
+    session in this process resumes from its stored snapshot (if it is younger than the lifespan),
+    so slot filling survives restarts and can move between servers.
+
+    Attributes:
+        resources (AgentResources): The shared models and configuration.
+        agent_factory (callable): Builds a new Agent from the resources.
+        lifespan (int): The session lifespan in seconds.
+        wheel (ExpiryWheel): The scheduler that expires sessions.
+        store (SessionStore): Where conversation snapshots are saved, or None to keep them in memory only.
+    """
+
+    def __init__(self, resources, agent_factory=None, lifespan=10 * 60, wheel=None, store=None):
+        """
+        Initializes the SessionManager.
+
+        Args:
+            resources (AgentResources): The shared models and configuration.
+            agent_factory (callable, optional): Builds a new Agent from the resources. Defaults to `Agent(resources=resources)`.
+            lifespan (int): The session lifespan in seconds.
+            wheel (ExpiryWheel, optional): The scheduler that expires sessions. Defaults to the process-wide wheel.
+            store (SessionStore, optional): Where to save conversation snapshots.
+        """
+        if agent_factory is None:
+            from agent import Agent
+            agent_factory = lambda resources: Agent(resources=resources)
+        self.resources = resources
+        self.agent_factory = agent_factory
+        self.lifespan = lifespan
+        self.wheel = wheel if wheel is not None else get_default_wheel()
+        self.store = store
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "replaced": 0, "removed": 0, "evicted": 0, "restored": 0}
+
+    def get(self, key):
+        """
+        Returns the active session for a key, creating a new one if there is none or it has expired.
+
+        Args:
+            key (str): The conversation key.
+
+        Returns:
+            Session: The active session.
+        """
+        session = self._sessions.get(key)
+        if session is not None and session.is_active():
+            return session
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None or not session.is_active():
+                if session is not None:
+                    self.stats["replaced"] += 1
+                agent = self.agent_factory(self.resources)
+                # A replaced session has expired, so only resume conversations unknown to this process
+                snapshot = self.store.get(key, max_age=self.lifespan) if self.store is not None and session is None else None
+                if snapshot is not None:
+                    try:
+                        agent.restore(snapshot)
+                        self.stats["restored"] += 1
+                    except (ValueError, KeyError) as e:
+                        print(f"Could not restore conversation {key}: {e!r}")
+                        agent = self.agent_factory(self.resources)
+                session = Session(agent, lifespan=self.lifespan, wheel=self.wheel,
+                                  on_expire=lambda expired, key=key: self._evict(key, expired), free_on_expire=True)
+                self._sessions[key] = session
+                self.stats["created"] += 1
+        return session
+
+    def interact(self, key, user_input):
+        """
+        Sends user input to the conversation identified by the key.
+
+        Args:
+            key (str): The conversation key.
+            user_input (str): The user's input message.
+
+        Returns:
+            dict: A dictionary containing the agent's response.
+        """
+        session = self.get(key)
+        if self.store is None:
+            return session.interact(user_input)
+        return session.interact(user_input, on_turn=lambda agent: self.store.put(key, agent.snapshot()))
+
+    def _evict(self, key, session):
+        """Drops an expired session, unless the key already maps to a newer one."""
+        with self._lock:
+            if self._sessions.get(key) is session:
+                del self._sessions[key]
+                self.stats["evicted"] += 1
+                if self.store is not None:
+                    self.store.delete(key)  # The conversation is over; don't resume it
+
+    def remove(self, key):
+        """
+        Drops the session for a key, if any.
+
+        Args:
+            key (str): The conversation key.
+
+        Returns:
+            Session: The removed session, or None.
+        """
+        with self._lock:
+            session = self._sessions.pop(key, None)
+            if session is not None:
+                self.stats["removed"] += 1
+        if session is not None:
+            session.close()
+        if self.store is not None:
+            self.store.delete(key)
+        return session
+
+    def __contains__(self, key):
+        return key in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get_stats(self):
+        """
+        Returns session counters.
+
+        Returns:
+            dict: Created/replaced/removed/evicted counters and the number of live sessions.
+        """
+        stats = dict(self.stats)
+        stats["live"] = len(self._sessions)
+        return stats
@@ -1,6 +1,7 @@
 import uuid
 import time
 import threading
+from .expiry import get_default_wheel
 
 
 class Session:
@@ -8,47 +9,80 @@ class Session:
     Represents a user session with an agent.
 
     This class manages the lifecycle of a user session, including session ID generation,
-    expiration tracking, and interaction with the agent.
+    expiration tracking, and interaction with the agent. Expiry is driven by a shared
+    `ExpiryWheel` rather than a thread per session.
 
     Attributes:
         session_id (uuid.UUID): A unique identifier for the session.
         start_time (float): The POSIX timestamp when the session was created.
         agent (Agent): The agent associated with the session.
         lifespan (int): The duration in seconds for which the session remains active.
+        sliding (bool): Whether each interaction renews the lifespan.
+        expires_at (float): When the session expires, on the expiry wheel's monotonic clock.
         expired (bool): A flag indicating whether the session has expired.
         session_state (dict): A dictionary to store session-specific data.
     """
-    def __init__(self, agent):
+    def __init__(self, agent, lifespan=10 * 60, sliding=True, wheel=None, on_expire=None, free_on_expire=False):
         """
         Initializes a new Session object.
 
         Args:
             agent (Agent): The agent associated with the session.
+            lifespan (int): The duration in seconds for which the session remains active. Defaults to 10 minutes.
+            sliding (bool): Whether each interaction renews the lifespan. Defaults to True.
+            wheel (ExpiryWheel, optional): The expiry scheduler. Defaults to the process-wide wheel.
+            on_expire (callable, optional): Called with the session once it expires.
+            free_on_expire (bool): Whether to drop the agent and session state on expiry to free memory.
         """
         self.session_id = uuid.uuid4()  # Generate a unique session ID
         self.start_time = time.time()   # Record the session start time
         self.agent = agent
-        self.lifespan = 10 * 60  # Set the session lifespan to 10 minutes (600 seconds)
+        self.lifespan = lifespan  # Set the session lifespan, 10 minutes (600 seconds) by default
+        self.sliding = sliding
         self.expired = False  # Initialize the expired flag to False
+        self.on_expire = on_expire
+        self.free_on_expire = free_on_expire
+        self._lock = threading.Lock()  # Serialises turns of the same conversation
+        self._wheel = wheel if wheel is not None else get_default_wheel()
 
-        # Start a background thread to monitor session expiration
+        # Register the session with the expiry wheel
         self._start_expiration_timer()
         self.session_state = {}  # Initialize the session state dictionary
 
     def _start_expiration_timer(self):
         """
-        Starts a background thread to set the session as expired after its lifespan.
+        Schedules the session to expire after its lifespan.
 
-        This method creates a separate thread that sleeps for the session lifespan.
-        Once the thread wakes up, it sets the `expired` flag to True, effectively ending the session.
+        Once the deadline passes the wheel calls `_expire`, which sets the `expired` flag to True,
+        effectively ending the session.
         """
-        def expire():
-            """Sets the session as expired after the lifespan."""
-            time.sleep(self.lifespan)  # Sleep for the session lifespan
-            self.expired = True  # Set the expired flag to True
+        self.expires_at = self._wheel.clock() + self.lifespan
+        self._wheel.schedule(self.session_id, self.expires_at, self._expire)
 
-        expiration_thread = threading.Thread(target=expire, daemon=True)  # Create a daemon thread for expiration
-        expiration_thread.start()  # Start the expiration thread
+    def _expire(self):
+        """Sets the session as expired and optionally frees its agent state."""
+        self.expired = True  # Set the expired flag to True
+        if self.free_on_expire:
+            self.agent = None
+            self.session_state = {}
+        if self.on_expire:
+            self.on_expire(self)
+
+    def renew(self):
+        """
+        Extends the session by a full lifespan from now.
+        """
+        if not self.expired:
+            self.expires_at = self._wheel.clock() + self.lifespan
+            self._wheel.renew(self.session_id, self.expires_at)
+
+    def close(self):
+        """
+        Expires the session immediately and removes its timer.
+        """
+        self._wheel.cancel(self.session_id)
+        if not self.expired:
+            self._expire()
 
     def is_active(self):
         """
@@ -57,9 +91,10 @@ class Session:
         Returns:
             bool: True if the session is active, False otherwise.
         """
-        return not self.expired  # Return the opposite of the expired flag
+        # The wheel fires within one tick of the deadline; don't serve a session in that gap
+        return not self.expired and self._wheel.clock() < self.expires_at
 
-    def interact(self, user_input):
+    def interact(self, user_input, on_turn=None):
         """
         Interacts with the agent if the session is active.
 
@@ -68,13 +103,23 @@ class Session:
 
         Args:
             user_input (str): The user's input message.
+            on_turn (callable, optional): Called with the agent after it has processed the input, before the next turn can start.
 
         Returns:
             dict: A dictionary containing the agent's response.
         """
         if not self.is_active():  # Check if the session is active
             return {"reply":"Sorry, your current session has expired."}  # Return an expiration message
-        return self.agent.process_input(user_input)  # Process the input using the agent
+        if self.sliding:
+            self.renew()  # Every interaction restarts the lifespan
+        with self._lock:
+            agent = self.agent
+            if agent is None:  # Expired and freed while waiting for the lock
+                return {"reply":"Sorry, your current session has expired."}
+            response = agent.process_input(user_input)  # Process the input using the agent
+            if on_turn is not None:
+                on_turn(agent)
+            return response
 
     def get_session_info(self):
         """
@@ -0,0 +1,304 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionStore:
+    """
+    Where conversation snapshots live outside the process, so conversations survive restarts and
+    can be picked up by another server.
+
+    Snapshots are the JSON-serialisable dicts from `ConversationState.snapshot`. Subclasses
+    implement `_load`, `_save` and `_delete`; this class adds the read-through LRU cache, so a
+    conversation that is being talked to is read from memory.
+
+    Attributes:
+        cache_size (int): The number of snapshots kept in memory.
+        stats (dict): Cache hits, backend reads, writes and deletes.
+    """
+
+    def __init__(self, cache_size=10000):
+        """
+        Initializes the store.
+
+        Args:
+            cache_size (int): The number of snapshots kept in memory.
+        """
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # key -> (encoded snapshot, updated), least recently used first
+        self._cache_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "deletes": 0}
+
+    def get(self, key, max_age=None):
+        """
+        Returns the snapshot stored for a key.
+
+        Args:
+            key (str): The conversation key.
+            max_age (float, optional): Ignore snapshots last written more than this many seconds ago.
+
+        Returns:
+            dict: The snapshot, or None if there is none (or it is too old).
+        """
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+        if entry is None:
+            entry = self._load(key)
+            with self._cache_lock:
+                self.stats["misses"] += 1
+                if entry is not None:
+                    self._remember(key, entry)
+        if entry is None or (max_age is not None and entry[1] < time.time() - max_age):
+            return None
+        return json.loads(entry[0])  # Decoded per call, so callers never share a snapshot
+
+    def put(self, key, snapshot):
+        """
+        Stores the snapshot for a key.
+
+        Args:
+            key (str): The conversation key.
+            snapshot (dict): The snapshot.
+        """
+        entry = (json.dumps(snapshot, separators=(",", ":")), time.time())
+        with self._cache_lock:
+            self._remember(key, entry)
+            self.stats["writes"] += 1
+        self._save(key, entry)
+
+    def delete(self, key):
+        """
+        Removes the snapshot for a key, if any.
+
+        Args:
+            key (str): The conversation key.
+        """
+        with self._cache_lock:
+            self._cache.pop(key, None)
+            self.stats["deletes"] += 1
+        self._delete(key)
+
+    def _remember(self, key, entry):
+        """Caches an entry, evicting the least recently used. Must hold the cache lock."""
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _load(self, key):
+        raise NotImplementedError
+
+    def _save(self, key, entry):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        Waits until every write so far has reached the backend.
+        """
+
+    def close(self):
+        """
+        Flushes and releases the backend.
+        """
+        self.flush()
+
+    def get_stats(self):
+        """
+        Returns the store counters.
+
+        Returns:
+            dict: Cache hits, backend reads, writes, deletes and the number of cached snapshots.
+        """
+        with self._cache_lock:
+            stats = dict(self.stats)
+            stats["cached"] = len(self._cache)
+        return stats
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Keeps snapshots in a dict. For tests and single-process deployments that only need the snapshots
+    to outlive the sessions, not the process.
+    """
+
+    def __init__(self, cache_size=10000):
+        super().__init__(cache_size)
+        self._entries = {}
+
+    def _load(self, key):
+        return self._entries.get(key)
+
+    def _save(self, key, entry):
+        self._entries[key] = entry
+
+    def _delete(self, key):
+        self._entries.pop(key, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Keeps snapshots in a local SQLite database in WAL mode.
+
+    Writes are batched behind the caller: `put` only updates the cache and marks the key dirty, and a
+    background thread writes the dirty snapshots in one transaction every `flush_interval` seconds
+    (or as soon as `batch_size` are waiting). A conversation writes at most once per flush however many
+    turns it takes in between. Reads go to the cache first; only snapshots that are neither cached nor
+    waiting to be written are read from the database.
+
+    Attributes:
+        path (str): The database file.
+        flush_interval (float): Seconds between background writes.
+        batch_size (int): The number of dirty snapshots that triggers a write straight away.
+    """
+
+    def __init__(self, path="./sessions.db", cache_size=10000, flush_interval=0.05, batch_size=256):
+        """
+        Opens (or creates) the database and starts the writer thread.
+
+        Args:
+            path (str): The database file.
+            cache_size (int): The number of snapshots kept in memory.
+            flush_interval (float): Seconds between background writes.
+            batch_size (int): The number of dirty snapshots that triggers a write straight away.
+        """
+        super().__init__(cache_size)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # Durable across crashes of the process; a power cut may lose the last writes
+        self._db.execute("CREATE TABLE IF NOT EXISTS sessions (key TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)")
+        self._db_lock = threading.Lock()
+        self._dirty = {}  # key -> entry, or None for a delete
+        self._dirty_lock = threading.Condition()
+        self._flushed = threading.Condition(self._dirty_lock)
+        self._writing = False
+        self._closed = False
+        self.stats.update({"flushes": 0, "flushed": 0})
+        self._writer = threading.Thread(target=self._run, name="session-store", daemon=True)
+        self._writer.start()
+
+    def _load(self, key):
+        with self._dirty_lock:
+            if key in self._dirty:
+                return self._dirty[key]
+        with self._db_lock:
+            row = self._db.execute("SELECT data, updated FROM sessions WHERE key = ?", (key,)).fetchone()
+        return tuple(row) if row else None
+
+    def _save(self, key, entry):
+        self._mark(key, entry)
+
+    def _delete(self, key):
+        self._mark(key, None)
+
+    def _mark(self, key, entry):
+        with self._dirty_lock:
+            if self._closed:
+                raise RuntimeError("The session store is closed")
+            self._dirty[key] = entry
+            if len(self._dirty) >= self.batch_size:
+                self._dirty_lock.notify()
+
+    def _run(self):
+        """Writes the dirty snapshots in batches until the store is closed."""
+        while True:
+            with self._dirty_lock:
+                if len(self._dirty) < self.batch_size and not self._closed:
+                    self._dirty_lock.wait(self.flush_interval)
+                batch, self._dirty = self._dirty, {}
+                self._writing = bool(batch)
+                closed = self._closed
+            if batch:
+                self._write(batch)
+            with self._dirty_lock:
+                self._writing = False
+                self._flushed.notify_all()
+            if closed and not self._dirty:
+                return
+
+    def _write(self, batch):
+        upserts = [(key, entry[0], entry[1]) for key, entry in batch.items() if entry is not None]
+        deletes = [(key,) for key, entry in batch.items() if entry is None]
+        try:
+            with self._db_lock:
+                self._db.execute("BEGIN")
+                if upserts:
+                    self._db.executemany("INSERT INTO sessions (key, data, updated) VALUES (?, ?, ?) "
+                                         "ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated = excluded.updated", upserts)
+                if deletes:
+                    self._db.executemany("DELETE FROM sessions WHERE key = ?", deletes)
+                self._db.execute("COMMIT")
+        except sqlite3.Error as e:
+            print(f"Could not write {len(batch)} session snapshots: {e}")
+            with self._db_lock:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+            with self._dirty_lock:
+                for key, entry in batch.items():
+                    self._dirty.setdefault(key, entry)  # Retry with the next batch unless overwritten since
+            return
+        with self._dirty_lock:
+            self.stats["flushes"] += 1
+            self.stats["flushed"] += len(batch)
+
+    def purge(self, max_age):
+        """
+        Deletes the snapshots last written more than `max_age` seconds ago.
+
+        Args:
+            max_age (float): The age in seconds.
+
+        Returns:
+            int: The number of snapshots deleted.
+        """
+        self.flush()
+        with self._db_lock:
+            cursor = self._db.execute("DELETE FROM sessions WHERE updated < ?", (time.time() - max_age,))
+        return cursor.rowcount
+
+    def flush(self):
+        """
+        Waits until every write so far has reached the database.
+        """
+        with self._dirty_lock:
+            self._dirty_lock.notify()
+            while self._dirty or self._writing:
+                if not self._writer.is_alive():
+                    return
+                self._flushed.wait(self.flush_interval)
+                self._dirty_lock.notify()
+
+    def close(self):
+        """
+        Writes the remaining snapshots, stops the writer thread and closes the database.
+        """
+        with self._dirty_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._dirty_lock.notify()
+        self._writer.join()
+        with self._db_lock:
+            self._db.close()
+
+    def get_stats(self):
+        """
+        Returns the store counters.
+
+        Returns:
+            dict: Cache hits, backend reads, writes, deletes, batch writes, snapshots written and the number waiting.
+        """
+        stats = super().get_stats()
+        with self._dirty_lock:
+            stats["dirty"] = len(self._dirty)
+        return stats
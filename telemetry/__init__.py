@@ -0,0 +1,16 @@
+from .metrics import Counter, Histogram, MetricsRegistry, DEFAULT_BUCKETS, merge_expositions
+from .tracing import Tracer, Span, NOOP_SPAN, configure_from_env
+
+# The process-wide registry and tracer
+registry = MetricsRegistry()
+tracer = Tracer(registry)
+configure_from_env(tracer)
+
+span = tracer.span
+turn = tracer.turn
+traced = tracer.traced
+configure = tracer.configure
+counter = registry.counter
+histogram = registry.histogram
+register_stats = registry.register_stats
+render = registry.render
\ No newline at end of file
@@ -0,0 +1,274 @@
+import math
+import re
+import threading
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    A monotonically increasing count, per combination of label values.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): The description exported with it.
+        labelnames (tuple): The label names; `inc` takes their values in the same order.
+    """
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, labels=()):
+        """
+        Adds to the count.
+
+        Args:
+            amount (float): How much to add.
+            labels (tuple): The label values.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in values)
+        return lines
+
+
+class Histogram:
+    """
+    Counts observations (e.g. durations in seconds) into cumulative buckets, per combination of label values.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): The description exported with it.
+        labelnames (tuple): The label names; `observe` takes their values in the same order.
+        buckets (tuple): The upper bounds of the buckets, ascending.
+    """
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [count per bucket (not cumulative) + overflow, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        """
+        Records an observation.
+
+        Args:
+            value (float): The observed value.
+            labels (tuple): The label values.
+        """
+        index = bisect_left(self.buckets, value)  # The first bucket with value <= bound, or the overflow
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, labels=()):
+        with self._lock:
+            counts = self._values.get(labels)
+            return sum(counts[:-1]) if counts else 0
+
+    def render(self):
+        with self._lock:
+            values = sorted((labels, list(counts)) for labels, counts in self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+_SAMPLE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (.*)$")
+
+
+def merge_expositions(expositions, label="worker"):
+    """
+    Merges the metrics of several processes into one exposition, telling them apart by a label.
+
+    Each sample gets the label, set to the key of the exposition it came from, and the samples of a
+    metric are grouped under a single HELP/TYPE header, as the text format requires.
+
+    Args:
+        expositions (dict): Rendered expositions, keyed by the label value (e.g. the worker index).
+        label (str): The name of the label added to every sample.
+
+    Returns:
+        str: The merged exposition.
+    """
+    families = {}  # metric name -> (header lines, sample lines)
+    for value, text in expositions.items():
+        family = families.setdefault("", ([], []))
+        pair = f'{label}="{_escape(value)}"'
+        for line in text.splitlines():
+            if line.startswith("#"):
+                parts = line.split(" ", 3)
+                family = families.setdefault(parts[2] if len(parts) > 2 else "", ([], []))
+                if line not in family[0]:
+                    family[0].append(line)
+                continue
+            match = _SAMPLE.match(line)
+            if match is None:
+                continue
+            name, labels, rest = match.groups()
+            family[1].append(f"{name}{{{pair}{',' + labels if labels else ''}}} {rest}")
+    return "".join(line + "\n" for header, samples in families.values() for line in header + samples)
+
+
+def _flatten(stats, path=()):
+    """Yields (stat name, path of the enclosing keys, value) for every number in a nested stats dict."""
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, path + (str(key),))
+        elif isinstance(value, bool):
+            yield str(key), path, int(value)
+        elif isinstance(value, (int, float)):
+            yield str(key), path, value
+
+
+class MetricsRegistry:
+    """
+    The metrics of a process, exported together in the Prometheus text format.
+
+    Besides counters and histograms updated as things happen, components that already keep their own
+    counters (anything with a `get_stats` method) can be registered as collectors: their numbers are
+    read when the metrics are rendered and exported as gauges.
+
+    Attributes:
+        prefix (str): Prepended to every metric name.
+    """
+
+    def __init__(self, prefix="crimson_"):
+        self.prefix = prefix
+        self._metrics = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args):
+        name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {type(metric).__name__}")
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        """
+        Returns the counter with a name, creating it on first use.
+
+        Args:
+            name (str): The metric name, without the prefix.
+            help (str): The description exported with it.
+            labelnames (tuple): The label names.
+
+        Returns:
+            Counter: The counter.
+        """
+        return self._register(Counter, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Returns the histogram with a name, creating it on first use.
+
+        Args:
+            name (str): The metric name, without the prefix.
+            help (str): The description exported with it.
+            labelnames (tuple): The label names.
+            buckets (tuple): The upper bounds of the buckets.
+
+        Returns:
+            Histogram: The histogram.
+        """
+        return self._register(Histogram, name, help, labelnames, buckets)
+
+    def register_stats(self, component, get_stats):
+        """
+        Exports a component's own counters as gauges named `<prefix><component>_<stat>`.
+
+        Numbers in nested dicts get a `key` label with the path to them, e.g. the executor's
+        `{"webhooks": {"make_payment": {"calls": 3}}}` becomes
+        `crimson_fulfilments_calls{key="webhooks.make_payment"} 3`. Registering a component again
+        replaces its collector.
+
+        Args:
+            component (str): The component name.
+            get_stats (callable): Returns the component's stats dict.
+        """
+        with self._lock:
+            self._collectors[component] = get_stats
+
+    def unregister_stats(self, component):
+        with self._lock:
+            self._collectors.pop(component, None)
+
+    def _collect(self):
+        lines = []
+        with self._lock:
+            collectors = sorted(self._collectors.items())
+        for component, get_stats in collectors:
+            try:
+                stats = get_stats()
+            except Exception as e:
+                print(f"Could not collect the {component} stats: {e}")
+                continue
+            gauges = {}
+            for stat, path, value in _flatten(stats or {}):
+                gauges.setdefault(f"{self.prefix}{component}_{stat}", []).append((path, value))
+            for name, samples in gauges.items():
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(f"{name}{_labels((), (), [('key', '.'.join(path))] if path else ())} {_number(value)}" for path, value in samples)
+        return lines
+
+    def render(self):
+        """
+        Renders every metric and collector in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition.
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        lines = []
+        for _, metric in metrics:
+            lines.extend(metric.render())
+        lines.extend(self._collect())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,210 @@
+import functools
+import os
+import random
+import threading
+import time
+
+
+class _NoopSpan:
+    """What `span` returns when nothing is recorded: entering and leaving it does nothing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    Times one stage of a turn. Use as a context manager.
+
+    On exit the duration is observed in the tracer's stage histogram, an error is counted if the
+    stage raised, and the span is added to the trace of the enclosing turn.
+
+    Attributes:
+        stage (str): The stage name.
+        duration (float): The seconds it took, once finished.
+    """
+    __slots__ = ("tracer", "stage", "started", "duration", "trace")
+
+    def __init__(self, tracer, stage, trace=None):
+        self.tracer = tracer
+        self.stage = stage
+        self.trace = trace
+        self.duration = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.started
+        self.tracer.stage_seconds.observe(self.duration, (self.stage,))
+        if exc_type is not None:
+            self.tracer.stage_errors.inc(labels=(self.stage,))
+        if self.trace is not None:
+            self.trace.append((self.stage, self.started, self.duration))
+        return False
+
+
+class Turn(Span):
+    """
+    The span of a whole turn. Decides whether the turn is sampled, and collects its stages' spans.
+    """
+    __slots__ = ("_previous",)
+
+    def __enter__(self):
+        local = self.tracer._local
+        self._previous = getattr(local, "trace", None)
+        local.trace = self.trace = []
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer._local.trace = self._previous
+        trace, self.trace = self.trace, None  # The turn itself isn't one of its stages
+        super().__exit__(exc_type, exc, tb)
+        slow = self.tracer.slow_turn_ms
+        if slow is not None and self.duration * 1000 >= slow:
+            stages = ", ".join(f"{stage} {duration * 1000:.1f}ms" for stage, _, duration in trace)
+            print(f"Slow turn {self.duration * 1000:.1f}ms: {stages or 'no stages recorded'}")
+        return False
+
+
+class _Unsampled:
+    """Marks a turn that isn't sampled, so its spans are skipped too."""
+    __slots__ = ("_previous", "tracer")
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def __enter__(self):
+        local = self.tracer._local
+        self._previous = getattr(local, "trace", None)
+        local.trace = False
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._local.trace = self._previous
+        return False
+
+
+class Tracer:
+    """
+    Records how long each stage of a turn takes.
+
+    Wrap a turn in `turn()` and its stages in `span(stage)`. Durations go to the
+    `<prefix>stage_seconds{stage=...}` histogram (the turn itself as stage "turn"), and stages
+    that raise are counted in `<prefix>stage_errors_total`. With `slow_turn_ms`, any turn at least
+    that slow is printed with the time spent in each of its stages.
+
+    With a `sample_rate` below 1 only that fraction of turns is recorded, all their spans or none.
+    Spans outside a turn (e.g. on a worker thread) are sampled one by one. Disabled, `turn` and
+    `span` return a shared object whose `with` block does nothing.
+
+    Attributes:
+        enabled (bool): Whether anything is recorded.
+        sample_rate (float): The fraction of turns recorded.
+        slow_turn_ms (float): Print turns at least this slow, or None.
+    """
+
+    def __init__(self, registry, enabled=True, sample_rate=1.0, slow_turn_ms=None):
+        """
+        Initializes the tracer.
+
+        Args:
+            registry (MetricsRegistry): Where the stage metrics are registered.
+            enabled (bool): Whether anything is recorded.
+            sample_rate (float): The fraction of turns recorded.
+            slow_turn_ms (float, optional): Print turns at least this slow.
+        """
+        self.stage_seconds = registry.histogram("stage_seconds", "Seconds spent in each stage of a turn.", ("stage",))
+        self.stage_errors = registry.counter("stage_errors_total", "Stages that raised an exception.", ("stage",))
+        self._local = threading.local()
+        self.configure(enabled, sample_rate, slow_turn_ms)
+
+    def configure(self, enabled=True, sample_rate=1.0, slow_turn_ms=None):
+        """
+        Changes what is recorded.
+
+        Args:
+            enabled (bool): Whether anything is recorded.
+            sample_rate (float): The fraction of turns recorded; 0 is the same as disabled.
+            slow_turn_ms (float, optional): Print turns at least this slow.
+        """
+        self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+        self.enabled = bool(enabled) and self.sample_rate > 0
+        self.slow_turn_ms = slow_turn_ms
+
+    def _sampled(self):
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def turn(self):
+        """
+        Returns the span of a whole turn.
+
+        Returns:
+            Turn: The span, or a no-op one if the turn isn't recorded.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        if not self._sampled():
+            return _Unsampled(self)
+        return Turn(self, "turn")
+
+    def span(self, stage):
+        """
+        Returns the span of one stage.
+
+        Args:
+            stage (str): The stage name.
+
+        Returns:
+            Span: The span, or a no-op one if it isn't recorded.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        trace = getattr(self._local, "trace", None)
+        if trace is False or (trace is None and not self._sampled()):
+            return NOOP_SPAN
+        return Span(self, stage, trace)
+
+    def traced(self, stage):
+        """
+        Decorates a function so each call is a span of the given stage.
+
+        Args:
+            stage (str): The stage name.
+
+        Returns:
+            callable: The decorator.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self.span(stage):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+def configure_from_env(tracer):
+    """
+    Configures a tracer from the environment.
+
+    `TELEMETRY=off` disables it, `TELEMETRY_SAMPLE_RATE` sets the fraction of turns recorded
+    (default 1), and `TELEMETRY_SLOW_TURN_MS` prints the turns at least that slow.
+
+    Args:
+        tracer (Tracer): The tracer.
+    """
+    slow = os.getenv("TELEMETRY_SLOW_TURN_MS")
+    tracer.configure(enabled=os.getenv("TELEMETRY", "on").lower() not in ("off", "0", "false", "no"),
+                     sample_rate=float(os.getenv("TELEMETRY_SAMPLE_RATE", "1")),
+                     slow_turn_ms=float(slow) if slow else None)
@@ -0,0 +1,63 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from agent.Agent import Agent
+from nlp.rephrase_cache import RephraseCache
+from nlp.rephrase_scheduler import RephraseScheduler
+
+
+def make_agent(cache, stream=False):
+    """Just the state `Agent.rephrase` reads, without loading any models."""
+    agent = SimpleNamespace(
+        active_intent="subscribe", active_topic="name", customer_mood="POSITIVE", turn_deadline=None,
+        messages=SimpleNamespace(render=lambda: ""), stream_rephrasings=stream, reply_stream=None,
+        dynamo_identity="You are a helpful agent",
+        resources=SimpleNamespace(rephrase_cache=cache, rephraser=RephraseScheduler(cache)),
+    )
+    agent._stream_rephrase = lambda *args: Agent._stream_rephrase(agent, *args)
+    return agent
+
+
+class AgentRephraseTest(unittest.TestCase):
+
+    def test_the_template_is_cached_and_the_values_filled_in_afterwards(self):
+        cache = RephraseCache(variants=1)
+        calls = []
+
+        def natural_rephrase(identity, history, text):
+            calls.append(text)
+            return "Could you tell me your $field, $user?"
+
+        with mock.patch("nlp.dynamo.natural_rephrase", natural_rephrase):
+            first = Agent.rephrase(make_agent(cache), "What is your $field, $user?", {"field": "email", "user": "Ann"})
+            second = Agent.rephrase(make_agent(cache), "What is your $field, $user?", {"field": "phone", "user": "Bob"})
+
+        self.assertEqual(first, "Could you tell me your email, Ann?")
+        self.assertEqual(second, "Could you tell me your phone, Bob?")
+        self.assertEqual(calls, ["What is your $field, $user?"])
+        self.assertNotIn("Ann", str(cache._entries))
+
+    def test_a_rephrasing_that_drops_a_placeholder_is_not_used(self):
+        cache = RephraseCache(variants=1)
+        with mock.patch("nlp.dynamo.natural_rephrase", lambda identity, history, text: "What is your email?"):
+            reply = Agent.rephrase(make_agent(cache), "What is your email, $user?", {"user": "Ann"})
+        self.assertEqual(reply, "What is your email, Ann?")
+        self.assertEqual(len(cache), 0)
+
+    def test_streamed_pieces_are_filled_in_across_piece_boundaries(self):
+        cache = RephraseCache(variants=1)
+
+        def stream_rephrase(identity, history, text):
+            yield from ["Thanks $us", "er, your ", "$", "{field}?"]
+
+        with mock.patch("nlp.dynamo.stream_rephrase", stream_rephrase):
+            agent = make_agent(cache, stream=True)
+            Agent.rephrase(agent, "Your $field, $user?", {"field": "email", "user": "Ann"})
+            self.assertEqual("".join(agent.reply_stream), "Thanks Ann, your email?")
+        self.assertEqual(cache.get(cache.make_key(agent.dynamo_identity, "Your $field, $user?", ("subscribe", "name", "POSITIVE"))),
+                         "Thanks $user, your ${field}?")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+import spacy
+
+from benchmarks.cancel_intent import LABELLED_PHRASES, reference_is_cancel
+from nlp.cancel import CANCEL_WORDS, CancelIntentDetector, _KEYWORDS
+
+
+class LexicalStageOnly(CancelIntentDetector):
+    """Answers None instead of parsing, to check what the regex stage decides on its own."""
+
+    def is_cancel_parsed(self, text):
+        return None
+
+
+class CancelIntentTest(unittest.TestCase):
+
+    def test_every_keyword_is_accepted_without_parsing(self):
+        for word in CANCEL_WORDS:
+            self.assertTrue(_KEYWORDS.search(f"well {word} ok"), word)
+
+    def test_lexical_stage_agrees_with_the_labels(self):
+        detector = LexicalStageOnly()
+        for phrase, label in LABELLED_PHRASES:
+            decided = detector.is_cancel(phrase)
+            if decided is not None:
+                self.assertEqual(decided, label, phrase)
+
+    @unittest.skipUnless(spacy.util.is_package("en_core_web_sm"), "en_core_web_sm is not installed")
+    def test_parity_with_a_full_parse(self):
+        detector = CancelIntentDetector()
+        for phrase, _ in LABELLED_PHRASES:
+            self.assertEqual(detector.is_cancel(phrase), reference_is_cancel(phrase), phrase)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import json
+import unittest
+
+from nlp.entities import EntityExtractor
+from nlp.registry import registry
+
+with open("entities.json") as file:
+    ENTITIES = json.load(file)
+
+
+class ExtractAllTest(unittest.TestCase):
+
+    def setUp(self):
+        self.extractor = EntityExtractor(ENTITIES)
+
+    def test_stray_numbers_do_not_fill_unanchored_slots(self):
+        found = self.extractor.extract_all(["tier", "pin", "phone"], "I want gold for 3 months, pin 1234")
+        self.assertEqual(found, {"tier": "gold", "pin": "1234"})
+
+    def test_named_unanchored_slot_is_filled(self):
+        found = self.extractor.extract_all(["pin", "phone"], "my phone is 03001234567 and my pin is 1234")
+        self.assertEqual(found, {"pin": "1234", "phone": "03001234567"})
+
+    def test_asked_for_slot_takes_any_match(self):
+        found = self.extractor.extract_all(["phone", "pin"], "it's 03001234567", topic="phone")
+        self.assertEqual(found, {"phone": "03001234567"})
+
+    def test_nlp_slot_is_not_parsed_unless_asked_for(self):
+        loads = registry.get_stats()["pipeline_loads"] + registry.get_stats()["pipeline_hits"]
+        self.extractor.extract_all(["name", "tier"], "I am Ali Khan and want silver")
+        self.assertEqual(registry.get_stats()["pipeline_loads"] + registry.get_stats()["pipeline_hits"], loads)
+
+
+if __name__ == "__main__":
+    unittest.main()
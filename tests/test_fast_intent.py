@@ -0,0 +1,31 @@
+import json
+import unittest
+
+from nlp.fast_intent import FastIntentMatcher
+
+with open("intents.json") as file:
+    INTENTS = json.load(file)
+
+
+class FastIntentMatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = FastIntentMatcher(INTENTS)
+
+    def test_training_phrase_is_an_exact_match(self):
+        self.assertEqual(self.matcher.match("I want to subscribe!"), {"label": "subscribe-intent", "score": 1.0, "path": "exact"})
+
+    def test_near_duplicate_of_a_training_phrase_is_matched(self):
+        phrase = next(phrase for phrase in INTENTS["subscribe-intent"]["training_phrases"] if len(phrase.split()) >= 4)
+        match = self.matcher.match(f"{phrase} please")
+        self.assertIsNotNone(match)
+        self.assertEqual(match["label"], "subscribe-intent")
+
+    def test_negated_or_extra_content_falls_through_to_the_classifier(self):
+        for utterance in ["I never want to subscribe to anything",
+                          "I want to subscribe my grandmother to a newsletter"]:
+            self.assertIsNone(self.matcher.match(utterance), utterance)
+
+
+if __name__ == "__main__":
+    unittest.main()
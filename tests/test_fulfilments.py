@@ -0,0 +1,97 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from integrations import Webhook
+from integrations.executor import FulfilmentExecutor
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    Answers GETs with 503 the first time a path is requested, then with the balance, or with no
+    balance for paths under /unparsable/. Answers every POST with 503.
+    """
+    disable_nagle_algorithm = True
+    seen = set()
+
+    def do_GET(self):
+        if self.path not in self.seen:
+            self.seen.add(self.path)
+            self.send_response(503)
+            self.end_headers()
+            return
+        self._send_json(200, {} if self.path.startswith("/unparsable/") else {"balance": 42})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._send_json(503, {"error": "down for maintenance"})
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def webhook_config(url, retries, fire_and_forget=False, request_type="GET"):
+    return {"display_name": "Check Balance", "description": "Check Balance",
+            "webhook": {"url": url, "request_type": request_type, "timeout": 2, "retries": retries, "backoff": 0.01,
+                        "fire_and_forget": fire_and_forget, "template_payload": '{"name": "$name"}'}}
+
+
+class FulfilmentTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_webhook_call_retries_as_configured(self):
+        webhook = Webhook("check_balance", config=webhook_config(f"{self.base_url}/check_balance/$name", retries=1))
+        self.assertEqual(webhook.call({"name": "retried"}), 42)
+
+    def test_webhook_call_without_retries_reports_the_failure(self):
+        webhook = Webhook("check_balance", config=webhook_config(f"{self.base_url}/check_balance/$name", retries=0))
+        status, error = webhook.call({"name": "not-retried"})
+        self.assertEqual(status, 400)
+        self.assertIn("error", error)
+
+    def test_fire_and_forget_failures_are_counted(self):
+        executor = FulfilmentExecutor(max_workers=2)
+        # Nothing listens on port 9 (discard), so the connection is refused
+        webhook = Webhook("check_balance", config=webhook_config("http://127.0.0.1:9/$name", retries=0, fire_and_forget=True))
+        self.assertEqual(executor.run([webhook], {"name": "x"}), {})
+        executor.shutdown(wait=True)
+        self.assertEqual(executor.get_stats()["pool"]["failed"], 1)
+
+    def test_final_server_error_is_counted_as_a_failure(self):
+        executor = FulfilmentExecutor(max_workers=1)
+        webhook = Webhook("check_balance", config=webhook_config(f"{self.base_url}/check_balance/$name", retries=1, request_type="POST"))
+        status, data = executor.call(webhook, {"name": "down"})
+        self.assertEqual((status, data), (503, {"error": "down for maintenance"}))
+        self.assertEqual(executor.get_stats()["webhooks"]["check_balance"]["failures"], 1)
+        executor.shutdown()
+
+    def test_unparsable_response_is_counted_as_a_failure(self):
+        executor = FulfilmentExecutor(max_workers=1)
+        webhook = Webhook("check_balance", config=webhook_config(f"{self.base_url}/unparsable/$name", retries=1))
+        with self.assertRaises(KeyError):
+            executor.call(webhook, {"name": "x"})
+        self.assertEqual(executor.get_stats()["webhooks"]["check_balance"]["failures"], 1)
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from nlp.intent_cache import CachedClassifier
+
+
+class RecordingClassifier:
+    """Labels "Yes!" (as written) "affirm" and anything else "other", and records what it was given."""
+    revision = "r1"
+
+    def __init__(self):
+        self.seen = []
+
+    def __call__(self, inputs, top_k=None):
+        texts = [inputs] if isinstance(inputs, str) else inputs
+        self.seen.extend(texts)
+        results = [[{"label": "affirm" if text == "Yes!" else "other", "score": 0.9}] for text in texts]
+        return results[0] if isinstance(inputs, str) else results
+
+
+class CachedClassifierTest(unittest.TestCase):
+
+    def test_a_miss_classifies_the_utterance_as_written(self):
+        classifier = RecordingClassifier()
+        cached = CachedClassifier(classifier)
+        self.assertEqual(cached("Yes!")[0]["label"], "affirm")
+        self.assertEqual(classifier.seen, ["Yes!"])
+
+    def test_the_first_spelling_of_a_key_stands_for_the_others(self):
+        classifier = RecordingClassifier()
+        cached = CachedClassifier(classifier)
+        labels = [result["label"] for result in cached(["Yes!", "yes", "  YES. "])]
+        self.assertEqual(labels, ["affirm"] * 3)
+        self.assertEqual(classifier.seen, ["Yes!"])
+        self.assertEqual(cached("yes")[0]["label"], "affirm")
+        self.assertEqual(classifier.seen, ["Yes!"])
+
+    def test_a_new_revision_drops_the_cache(self):
+        classifier = RecordingClassifier()
+        cached = CachedClassifier(classifier)
+        cached("Yes!")
+        replacement = RecordingClassifier()
+        replacement.revision = "r2"
+        cached.classifier = replacement
+        cached("Yes!")
+        self.assertEqual(replacement.seen, ["Yes!"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+import requests
+
+from benchmarks.stub_server import StubLLMServer
+from nlp.llm import GeminiBackend, LLMBackend, OllamaBackend
+
+
+class FakeBackend(LLMBackend):
+
+    def _generate_request(self, prompt):
+        return prompt.upper()
+
+    def _stream_request(self, prompt):
+        yield from prompt.split()
+
+
+class LLMBackendTest(unittest.TestCase):
+
+    def test_abandoned_stream_frees_its_slot_when_closed(self):
+        backend = FakeBackend("http://llm.invalid", "fake", max_concurrency=1, queue_timeout=0.1)
+        stream = backend.stream("one two three")
+        self.assertEqual(next(stream), "one")
+        stream.close()
+        self.assertEqual(backend.generate("hi"), "HI")
+
+    def test_no_free_slot_fails_after_the_queue_timeout(self):
+        backend = FakeBackend("http://llm.invalid", "fake", max_concurrency=1, queue_timeout=0.05)
+        stream = backend.stream("one two")
+        next(stream)
+        with self.assertRaises(requests.RequestException):
+            backend.generate("hi")
+        list(stream)
+        self.assertEqual(backend.generate("hi"), "HI")
+
+    def test_unstarted_stream_holds_no_slot(self):
+        backend = FakeBackend("http://llm.invalid", "fake", max_concurrency=1, queue_timeout=0.05)
+        backend.stream("one two")
+        self.assertEqual(backend.generate("hi"), "HI")
+
+
+class StubServerStreamingTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubLLMServer().__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.__exit__(None, None, None)
+
+    def test_gemini_streams_word_by_word(self):
+        backend = GeminiBackend(api_key="stub", base_url=self.server.url, max_concurrency=1)
+        pieces = list(backend.stream("hello there"))
+        self.assertEqual(pieces, ["Rephrased:", " hello", " there"])
+        self.assertEqual(backend.generate("hello there"), "".join(pieces))
+
+    def test_ollama_streams_word_by_word(self):
+        backend = OllamaBackend(base_url=self.server.url, max_concurrency=1)
+        self.assertEqual("".join(backend.stream("hello there")), "Rephrased: hello there")
+
+    def test_closing_a_stream_early_frees_its_slot(self):
+        backend = GeminiBackend(api_key="stub", base_url=self.server.url, max_concurrency=1)
+        stream = backend.stream("one two three four")
+        self.assertEqual(next(stream), "Rephrased:")
+        stream.close()
+        self.assertEqual(backend.generate("hi"), "Rephrased: hi")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import threading
+import time
+import unittest
+
+from nlp.rephrase_cache import RephraseCache
+from nlp.rephrase_scheduler import RephraseScheduler
+
+
+def run_with_timeout(fn, seconds=5):
+    """Runs `fn` on a daemon thread, so a deadlock fails the test instead of hanging the run."""
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=fn()), daemon=True)
+    thread.start()
+    thread.join(seconds)
+    if thread.is_alive():
+        raise AssertionError(f"Still running after {seconds}s, probably deadlocked")
+    return result["value"]
+
+
+def wait_until(condition):
+    while not condition():
+        time.sleep(0.001)
+    return True
+
+
+class RephraseSchedulerTest(unittest.TestCase):
+
+    def test_instant_rephrase_does_not_deadlock(self):
+        scheduler = RephraseScheduler(RephraseCache())
+        for i in range(20):
+            text = f"text{i}"
+            reply = run_with_timeout(lambda: scheduler.rephrase("id", text, (), lambda t: t.upper(), timeout=1.0))
+            self.assertEqual(reply, text.upper())
+        scheduler.shutdown()
+        stats = scheduler.get_stats()
+        self.assertEqual(stats["on_time"], 20)
+        self.assertEqual(stats["in_flight"], 0)
+
+    def test_failing_rephrase_returns_the_text(self):
+        def fail(text):
+            raise ConnectionRefusedError("no backend")
+
+        scheduler = RephraseScheduler(RephraseCache())
+        for i in range(20):
+            text = f"text{i}"
+            self.assertEqual(run_with_timeout(lambda: scheduler.rephrase("id", text, (), fail, timeout=1.0)), text)
+        scheduler.shutdown()
+        stats = scheduler.get_stats()
+        self.assertEqual(stats["failed"], 20)
+        self.assertEqual(stats["in_flight"], 0)
+
+    def test_rephrasing_is_cached_for_the_next_turn(self):
+        cache = RephraseCache()
+        scheduler = RephraseScheduler(cache)
+        run_with_timeout(lambda: scheduler.rephrase("id", "hello", (), lambda t: "hi there", timeout=1.0))
+        scheduler.shutdown()
+        self.assertEqual(cache.get(cache.make_key("id", "hello", ())), "hi there")
+
+    def test_late_rephrasing_is_served_on_the_next_turn(self):
+        cache = RephraseCache(variants=3)
+        scheduler = RephraseScheduler(cache)
+        release = threading.Event()
+        replies = iter(["hi there", "hello there", "hey"])
+
+        def slow(text):
+            release.wait(5)
+            return next(replies)
+
+        self.assertEqual(run_with_timeout(lambda: scheduler.rephrase("id", "hello", (), slow, timeout=0.01)), "hello")
+        release.set()
+        run_with_timeout(lambda: wait_until(lambda: scheduler.get_stats()["in_flight"] == 0))
+
+        # One variant is enough to serve, and the next one is collected in the background
+        self.assertEqual(run_with_timeout(lambda: scheduler.rephrase("id", "hello", (), slow, timeout=0.01)), "hi there")
+        scheduler.shutdown()
+        key = cache.make_key("id", "hello", ())
+        self.assertEqual(scheduler.get_stats()["collected"], 1)
+        self.assertEqual(cache.missing_variants(key), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
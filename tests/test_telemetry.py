@@ -0,0 +1,26 @@
+import unittest
+
+from telemetry.metrics import MetricsRegistry, merge_expositions
+
+
+class MergeExpositionsTest(unittest.TestCase):
+
+    def test_samples_are_labelled_and_grouped_under_one_header(self):
+        first, second = MetricsRegistry(), MetricsRegistry()
+        first.counter("turns_total", "Turns.", ("stage",)).inc(labels=("intent",))
+        second.counter("turns_total", "Turns.", ("stage",)).inc(2, labels=("intent",))
+        second.register_stats("cache", lambda: {"hits": 3})
+
+        lines = merge_expositions({"0": first.render(), "1": second.render()}).splitlines()
+
+        self.assertEqual(lines[:4], [
+            "# HELP crimson_turns_total Turns.",
+            "# TYPE crimson_turns_total counter",
+            'crimson_turns_total{worker="0",stage="intent"} 1',
+            'crimson_turns_total{worker="1",stage="intent"} 2',
+        ])
+        self.assertIn('crimson_cache_hits{worker="1"} 3', lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
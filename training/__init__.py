@@ -1 +1,20 @@
-from .retrain import train_classification_model
\ No newline at end of file
+# Exported lazily (PEP 562): the retraining module imports TensorFlow and transformers, which
+# only `train_classification_model` needs
+_EXPORTS = {
+    "train_classification_model": ".retrain",
+    "export_onnx": ".export",
+    "TokenizationCache": ".incremental",
+}
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value  # Later lookups don't come back here
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTS))
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Exports the intent classifier to ONNX, optionally int8-quantized, for fast CPU inference.
+
+Usage:
+    python -m training.export [--model shahiryar/crimson-agent] [--revision REV] [--output ./artefacts/intent-onnx] [--no-quantize]
+
+Requires `onnx` and `onnxruntime` (`pip install onnx onnxruntime`) besides torch and transformers.
+"""
+import argparse
+import json
+import os
+
+DEFAULT_EXPORT_DIR = "./artefacts/intent-onnx"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+
+
+def export_onnx(model, output_dir=DEFAULT_EXPORT_DIR, revision=None, quantize=True, opset=14):
+    """
+    Exports a sequence classification model to ONNX, and optionally quantizes its weights to int8.
+
+    The output directory holds the ONNX graph(s), the tokenizer and the model config (for the label
+    names), which is everything `nlp.onnx_classifier.OnnxTextClassifier` needs to load it.
+
+    Args:
+        model (str): A Hugging Face model id or a local directory, with PyTorch or TensorFlow weights.
+        output_dir (str): The directory to write to.
+        revision (str, optional): The model revision, for Hub models.
+        quantize (bool): Whether to also write the int8-quantized graph.
+        opset (int): The ONNX opset to export with.
+
+    Returns:
+        str: The path of the graph to serve: the quantized one if written, else the full-precision one.
+
+    Example usage:
+        >>> export_onnx("shahiryar/crimson-agent", "./artefacts/intent-onnx", revision="29c3aeb9544b8ba8132bd06347a28a5acb5ba43c")
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model, revision=revision)
+    try:
+        classifier = AutoModelForSequenceClassification.from_pretrained(model, revision=revision)
+    except OSError:  # Models trained by retrain.py only have TensorFlow weights
+        classifier = AutoModelForSequenceClassification.from_pretrained(model, revision=revision, from_tf=True)
+    classifier.eval()
+
+    sample = tokenizer(["I want to subscribe"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    fp32_path = os.path.join(output_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(classifier, tuple(sample[name] for name in input_names), fp32_path,
+                          input_names=input_names, output_names=["logits"], dynamic_axes=dynamic_axes, opset_version=opset)
+    tokenizer.save_pretrained(output_dir)
+    classifier.config.save_pretrained(output_dir)
+
+    served_path = fp32_path
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        served_path = os.path.join(output_dir, INT8_FILE)
+        quantize_dynamic(fp32_path, served_path, weight_type=QuantType.QInt8)
+
+    with open(os.path.join(output_dir, "export.json"), "w") as file:
+        json.dump({"model": model, "revision": revision, "opset": opset, "quantized": quantize,
+                   "graph": os.path.basename(served_path)}, file, indent=4)
+    return served_path
+
+
+if __name__ == "__main__":
+    from agent.resources import INTENT_MODEL, INTENT_MODEL_REVISION
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=INTENT_MODEL)
+    parser.add_argument("--revision", default=INTENT_MODEL_REVISION)
+    parser.add_argument("--output", default=DEFAULT_EXPORT_DIR)
+    parser.add_argument("--no-quantize", action="store_true")
+    args = parser.parse_args()
+    print(f"Exported to {export_onnx(args.model, args.output, args.revision, quantize=not args.no_quantize)}")
@@ -0,0 +1,184 @@
+"""
+Bookkeeping for incremental retraining: an on-disk cache of tokenized phrases, and a record of the
+intents the last fine-tuned model was trained on, to tell what changed since.
+
+Nothing here imports the training frameworks, so the cache and the change detection are cheap to
+use on their own.
+"""
+import hashlib
+import json
+import os
+import time
+
+# Resolved from the repository root, so running from the repository or from training/ uses the same files
+ARTEFACTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "artefacts")
+DEFAULT_CACHE_DIR = os.path.join(ARTEFACTS_DIR, "retrain-cache")
+STATE_FILE = "retrain-state.json"
+
+
+def _hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _write_json(path, data):
+    """Writes a JSON file atomically, so an interrupted run never leaves a truncated one behind."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(data, file)
+    os.replace(temporary, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        print(f"Ignoring the unreadable file {path}: {e}")
+        return None
+
+
+def tokenizer_fingerprint(tokenizer, truncation=True, max_length=None):
+    """
+    Identifies a tokenizer and its settings, so cached features are never reused with a different one.
+
+    Args:
+        tokenizer (PreTrainedTokenizerBase): The tokenizer.
+        truncation (bool): Whether phrases are truncated.
+        max_length (int, optional): The length they are truncated to.
+
+    Returns:
+        str: The fingerprint.
+    """
+    return _hash(json.dumps([tokenizer.name_or_path, type(tokenizer).__name__, len(tokenizer),
+                             truncation, max_length or tokenizer.model_max_length]))[:16]
+
+
+class TokenizationCache:
+    """
+    Tokenized training phrases stored on disk by phrase hash, one file per tokenizer fingerprint.
+
+    Only the phrases that aren't cached yet are sent to the tokenizer, in one batch.
+
+    Attributes:
+        cache_dir (str): The cache directory.
+        hits (int): The phrases served from the cache.
+        misses (int): The phrases tokenized.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        """
+        Initializes the cache.
+
+        Args:
+            cache_dir (str): The cache directory.
+        """
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, fingerprint):
+        return os.path.join(self.cache_dir, f"tokens-{fingerprint}.json")
+
+    def tokenize(self, tokenizer, phrases, truncation=True, max_length=None):
+        """
+        Returns the tokenizer's features for each phrase, tokenizing only the ones not cached.
+
+        Args:
+            tokenizer (PreTrainedTokenizerBase): The tokenizer.
+            phrases (list): The phrases.
+            truncation (bool): Whether to truncate the phrases.
+            max_length (int, optional): The length to truncate them to. Defaults to the model's.
+
+        Returns:
+            dict: Each feature name (e.g. "input_ids", "attention_mask") to a list with one value per phrase.
+
+        Example usage:
+            >>> cache = TokenizationCache()
+            >>> features = cache.tokenize(tokenizer, ["Hi there", "I want to subscribe"])
+        """
+        path = self.path_for(tokenizer_fingerprint(tokenizer, truncation, max_length))
+        cached = _read_json(path) or {}
+        keys = [_hash(phrase) for phrase in phrases]
+        missing = {key: phrase for key, phrase in zip(keys, phrases) if key not in cached}
+        if missing:
+            encoded = tokenizer(list(missing.values()), truncation=truncation, max_length=max_length)
+            for index, key in enumerate(missing):
+                cached[key] = {name: list(values[index]) for name, values in encoded.items()}
+            _write_json(path, cached)
+        self.misses += len(missing)
+        self.hits += len(phrases) - len(missing)
+
+        names = next(iter(cached.values())).keys() if cached else ()
+        return {name: [cached[key][name] for key in keys] for name in names}
+
+    def get_stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def intent_fingerprints(intents):
+    """
+    Fingerprints the training phrases of each trainable intent.
+
+    Args:
+        intents (dict): The intents, as in intents.json.
+
+    Returns:
+        dict: Each trainable intent's name to a hash of its phrases, which ignores their order.
+    """
+    return {intent: _hash(json.dumps(sorted(data["training_phrases"])))
+            for intent, data in intents.items() if data.get("trainable")}
+
+
+def changed_intents(previous, current):
+    """
+    Compares two sets of intent fingerprints.
+
+    Args:
+        previous (dict): The fingerprints the last model was trained on.
+        current (dict): The fingerprints now.
+
+    Returns:
+        dict: The sorted names of the "added", "changed" and "removed" intents.
+    """
+    return {
+        "added": sorted(set(current) - set(previous)),
+        "changed": sorted(intent for intent in current if intent in previous and current[intent] != previous[intent]),
+        "removed": sorted(set(previous) - set(current)),
+    }
+
+
+def load_state(cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Reads what the last model was trained on.
+
+    Args:
+        cache_dir (str): The cache directory.
+
+    Returns:
+        dict: The "tokenizer", the "labels" in id order, the "intents" fingerprints and the
+            "model_dir" of the last run, or None if there wasn't one.
+    """
+    return _read_json(os.path.join(cache_dir, STATE_FILE))
+
+
+def save_state(tokenizer_name, labels, fingerprints, model_dir, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Records what a model was trained on, for the next run to compare against.
+
+    Args:
+        tokenizer_name (str): The base checkpoint.
+        labels (list): The intent names in id order.
+        fingerprints (dict): The intent fingerprints.
+        model_dir (str): Where the fine-tuned weights were saved.
+        cache_dir (str): The cache directory.
+    """
+    _write_json(os.path.join(cache_dir, STATE_FILE), {
+        "tokenizer": tokenizer_name,
+        "labels": list(labels),
+        "intents": fingerprints,
+        "model_dir": model_dir,
+        "trained": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    })
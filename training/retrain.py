@@ -1,12 +1,12 @@
 # Modular function to train a classification model
 from transformers.keras_callbacks import KerasMetricCallback
+import functools
 import os
 from dotenv import load_dotenv
 import sys
 import json
 from huggingface_hub import login
 from datasets import Dataset
-import pandas as pd
 from transformers import DataCollatorWithPadding
 import evaluate
 from transformers import TFAutoModelForSequenceClassification
@@ -15,6 +15,8 @@ from transformers import create_optimizer
 import tensorflow as tf
 from transformers import AutoTokenizer
 from transformers.keras_callbacks import PushToHubCallback
+from training.incremental import (DEFAULT_CACHE_DIR, TokenizationCache, changed_intents, intent_fingerprints,
+                                  load_state, save_state, ARTEFACTS_DIR)
 
 # Function to load and prepare intent data
 def load_intent_data(intents_file_path, entities_file_path):
@@ -34,9 +36,8 @@ def load_intent_data(intents_file_path, entities_file_path):
     Steps:
         1. Loads intents and entities data from the specified JSON files.
         2. Filters intents based on the "trainable" flag.
-        3. Creates a Pandas DataFrame with "text" and "label" columns.
-        4. Converts labels to numerical IDs using label2id mapping.
-        5. Creates a Hugging Face Dataset from the DataFrame.
+        3. Numbers the intents in the order of the intents file.
+        4. Creates a Hugging Face Dataset with "text" and numerical "label" columns.
 
     Notes:
         - The intents file should be a valid JSON containing training phrases and labels.
@@ -59,21 +60,20 @@ def load_intent_data(intents_file_path, entities_file_path):
                 text_col.append(phrase)
                 label_col.append(intent)
 
-    df = pd.DataFrame({"text": text_col, "label": label_col})
     id2label = {i: intent for i, intent in enumerate(class_intents)}
     label2id = {intent: i for i, intent in enumerate(class_intents)}
-    df.replace(label2id, inplace=True)
 
-    return Dataset.from_pandas(df, preserve_index=False), id2label, label2id
+    return Dataset.from_dict({"text": text_col, "label": [label2id[label] for label in label_col]}), id2label, label2id
 
 # Function to preprocess the dataset
-def preprocess_dataset(dataset, tokenizer_name):
+def preprocess_dataset(dataset, tokenizer_name, cache=None):
     """
     Preprocesses the dataset using the specified tokenizer.
 
     Args:
         dataset (Dataset): The Hugging Face Dataset to preprocess.
         tokenizer_name (str): Name of the pre-trained tokenizer to use (e.g., 'distilbert-base-uncased').
+        cache (TokenizationCache, optional): Reuse the features of phrases tokenized by earlier runs.
 
     Returns:
         tuple: A tuple containing the preprocessed dataset and the tokenizer.
@@ -83,13 +83,31 @@ def preprocess_dataset(dataset, tokenizer_name):
 
     Steps:
         1. Loads the tokenizer from the specified name.
-        2. Applies tokenization and truncation to the dataset.
+        2. Applies tokenization and truncation to the dataset, only to the phrases not cached.
     """
     tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    if cache is not None:
+        features = cache.tokenize(tokenizer, dataset["text"])
+        for name, values in features.items():
+            dataset = dataset.add_column(name, values)
+        return dataset, tokenizer
     def preprocess_function(examples):
         return tokenizer(examples["text"], truncation=True)
     return dataset.map(preprocess_function), tokenizer
 
+@functools.lru_cache(maxsize=None)
+def load_metric(name):
+    """
+    Loads an evaluation metric once; later calls return the same object.
+
+    Args:
+        name (str): The metric name (e.g. "accuracy").
+
+    Returns:
+        EvaluationModule: The metric.
+    """
+    return evaluate.load(name)
+
 # Function to compute evaluation metrics
 def compute_metrics(eval_pred):
     """
@@ -107,14 +125,52 @@ def compute_metrics(eval_pred):
     """
     predictions, labels = eval_pred
     predictions = np.argmax(predictions, axis=1)
-    accuracy = evaluate.load("accuracy")
+    accuracy = load_metric("accuracy")
     return accuracy.compute(predictions=predictions, references=labels)
 
+def warm_start_head(model, previous_model_dir, previous_labels, labels):
+    """
+    Copies the classifier head rows of the intents a previous model was trained on into a model.
+
+    The rows are matched by intent name, so intents that were kept start from what the previous
+    model learnt about them, wherever they now are. The rows of new intents are initialized afresh.
+
+    Args:
+        model (TFPreTrainedModel): The model to train, with a head of one output per label.
+        previous_model_dir (str): The directory of the previous model.
+        previous_labels (list): The intent names the previous model was trained on, in id order.
+        labels (list): The intent names the model is trained on, in id order.
+    """
+    if not hasattr(model, "classifier"):
+        print(f"{type(model).__name__} has no classifier layer to warm-start; its head is trained from scratch")
+        return
+    previous = TFAutoModelForSequenceClassification.from_pretrained(previous_model_dir)
+    previous_kernel, previous_bias = previous.classifier.get_weights()
+    kernel, bias = model.classifier.get_weights()
+    initializer = tf.keras.initializers.TruncatedNormal(stddev=getattr(model.config, "initializer_range", 0.02))
+    previous_ids = {label: i for i, label in enumerate(previous_labels)}
+    for i, label in enumerate(labels):
+        j = previous_ids.get(label)
+        if j is None:
+            kernel[:, i] = initializer((kernel.shape[0],)).numpy()
+            bias[i] = 0.0
+        else:
+            kernel[:, i], bias[i] = previous_kernel[:, j], previous_bias[j]
+    model.classifier.set_weights([kernel, bias])
+
 # Main training function
-def train_classification_model(hf_token,intents_file_path, entities_file_path, tokenizer_name, hf_repo_name, model_output_dir=""):
+def train_classification_model(hf_token,intents_file_path, entities_file_path, tokenizer_name, hf_repo_name, model_output_dir="", onnx_export_dir="",
+                               num_epochs=15, incremental_epochs=3, cache_dir=DEFAULT_CACHE_DIR, incremental=True):
     """
     Trains a sequence classification model using the provided dataset and uploads the trained model to Hugging Face Hub.
 
+    Retraining is incremental: tokenized phrases are cached in `cache_dir`, along with the intents
+    the last model was trained on. If no trainable intent changed since, nothing is retrained. If
+    some did, training starts from the last fine-tuned weights instead of the base checkpoint, for
+    `incremental_epochs`: the encoder is kept whole, and so are the classifier head rows of the
+    intents that are still trained on (see `warm_start_head`). All phrases are still trained on, so
+    the unchanged intents aren't forgotten.
+
     Args:
         hf_token (str): The Hugging Face authentication token.
         intents_file_path (str): Path to the JSON file containing intents data.
@@ -122,6 +178,12 @@ def train_classification_model(hf_token,intents_file_path, entities_file_path, t
         tokenizer_name (str): Name of the pre-trained tokenizer to use (e.g., 'distilbert-base-uncased').
         hf_repo_name (str): Name of the Hugging Face repository to push the trained model to.
         model_output_dir (str, optional): Directory to save the trained model locally. Default is "" (do not save locally).
+        onnx_export_dir (str, optional): Directory to export the trained model to as int8-quantized ONNX, for the "onnx"
+            intent classifier backend. Default is "" (do not export).
+        num_epochs (int, optional): Epochs to train for from the base checkpoint. Default is 15.
+        incremental_epochs (int, optional): Epochs to train for when the last model is trained further. Default is 3.
+        cache_dir (str, optional): Directory of the tokenization cache and the record of the last run.
+        incremental (bool, optional): Whether to reuse the last run's model. Default is True; False trains from the base checkpoint.
 
     Returns:
         None
@@ -137,37 +199,59 @@ def train_classification_model(hf_token,intents_file_path, entities_file_path, t
                                       TOKENIZER_NAME, HF_REPO_NAME, MODEL_OUTPUT_DIR)
 
     Steps:
-        1. Authenticates with Hugging Face Hub using the provided token.
-        2. Loads and processes the intents and entities data from the provided file paths.
-        3. Preprocesses the dataset using the specified tokenizer.
-        4. Initializes the model and optimizer.
-        5. Converts the dataset into a TensorFlow dataset.
-        6. Compiles and trains the model, with evaluation and push-to-hub callbacks.
-        7. Optionally saves the trained model to a local directory if specified.
+        1. Compares the trainable intents with the last run's, and stops if none changed.
+        2. Authenticates with Hugging Face Hub using the provided token.
+        3. Loads and processes the intents and entities data from the provided file paths.
+        4. Preprocesses the dataset using the specified tokenizer, tokenizing only new phrases.
+        5. Initializes the model, from the last fine-tuned weights if possible, and the optimizer.
+        6. Converts the dataset into a TensorFlow dataset.
+        7. Compiles and trains the model, with evaluation and push-to-hub callbacks.
+        8. Optionally saves the trained model to a local directory if specified.
+        9. Optionally exports the trained model to ONNX if specified.
+        10. Records the intents trained on, for the next run.
 
     Notes:
         - Ensure the intents file is a valid JSON containing the training phrases and labels.
         - Entities file is currently not utilized but is loaded for potential future use.
         - The tokenizer and model name should correspond to a model available on Hugging Face Model Hub.
     """
-    
-    
+    with open(intents_file_path, 'r') as intents_file:
+        fingerprints = intent_fingerprints(json.load(intents_file))
+    state = load_state(cache_dir) if incremental else None
+    if state and (state.get("tokenizer") != tokenizer_name or not os.path.isdir(state.get("model_dir") or "")):
+        print("The last training run used another base model or its weights are gone; training from the base checkpoint")
+        state = None
+    if state:
+        changes = changed_intents(state["intents"], fingerprints)
+        if not any(changes.values()):
+            print(f"No intents changed since the model in {state['model_dir']} was trained; nothing to retrain")
+            return
+        print("Retraining for the intents " + ", ".join(f"{kind}: {', '.join(names)}" for kind, names in changes.items() if names))
+
     login(hf_token)
     dataset, id2label, label2id = load_intent_data(intents_file_path, entities_file_path)
-    tokenized_dataset, tokenizer = preprocess_dataset(dataset, tokenizer_name)
+    cache = TokenizationCache(cache_dir)
+    tokenized_dataset, tokenizer = preprocess_dataset(dataset, tokenizer_name, cache)
+    print(f"Tokenized {cache.misses} new phrases, {cache.hits} from the cache")
 
     data_collator = DataCollatorWithPadding(tokenizer=tokenizer, return_tensors="tf")
 
+    labels = [id2label[i] for i in range(len(id2label))]
+    checkpoint = tokenizer_name
+    if state:
+        checkpoint, num_epochs = state["model_dir"], incremental_epochs
+
     batch_size = 7
-    num_epochs = 15
     batches_per_epoch = len(tokenized_dataset) // batch_size
     total_train_steps = int(batches_per_epoch * num_epochs)
     optimizer, schedule = create_optimizer(init_lr=2e-5, num_warmup_steps=0, num_train_steps=total_train_steps)
 
     num_intents = len(id2label)
     model = TFAutoModelForSequenceClassification.from_pretrained(
-        tokenizer_name, num_labels=num_intents, id2label=id2label, label2id=label2id
+        checkpoint, num_labels=num_intents, id2label=id2label, label2id=label2id, ignore_mismatched_sizes=bool(state)
     )
+    if state and labels != state["labels"]:
+        warm_start_head(model, state["model_dir"], state["labels"], labels)
 
     tf_train_set = model.prepare_tf_dataset(
         tokenized_dataset,
@@ -191,8 +275,17 @@ def train_classification_model(hf_token,intents_file_path, entities_file_path, t
 
     if model_output_dir:
         model.save_pretrained(model_output_dir)
+
+    if onnx_export_dir:
+        from training.export import export_onnx
+        # The push-to-hub callback keeps a local copy of the model in hf_repo_name
+        export_source = model_output_dir or hf_repo_name
+        tokenizer.save_pretrained(export_source)  # The exporter loads the tokenizer from beside the weights
+        export_onnx(export_source, onnx_export_dir)
     
     save_agent_config(hf_repo_name, hf_repo_name, model_output_dir, intents_file_path, entities_file_path )
+    # The push-to-hub callback keeps a local copy of the model in hf_repo_name
+    save_state(tokenizer_name, labels, fingerprints, os.path.abspath(model_output_dir or hf_repo_name), cache_dir)
     
 
 import json
@@ -213,7 +306,8 @@ def save_agent_config(repo,model_name,intents_path, entities_path,local_model_pa
     Example usage:
         >>> save_agent_config("your-repo-name", "your-model-name", "./intents.json", "./entities.json", "./model_output")
     """
-    with open("../artefacts/agent-config.json", 'w') as config_file:
+    os.makedirs(ARTEFACTS_DIR, exist_ok=True)
+    with open(os.path.join(ARTEFACTS_DIR, "agent-config.json"), 'w') as config_file:
         data = {
             "hf_repo_name": repo,
             "model_name": model_name,
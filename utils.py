@@ -1,8 +1,24 @@
+import time
+from functools import lru_cache
+import telemetry
+from nlp.cancel import cancel_detector, CANCEL_WORDS, CANCEL_PATTERNS
+from nlp.entities import ValuesIndex
+
+@lru_cache(maxsize=128)
+def _values_index(values):
+  return ValuesIndex(values)
+
 def extract_entity_given_values(values, utterance):
-  for val in values:
-    if val in utterance:
-      return val
-  return None
+  """
+  Returns the longest of the given values occurring in the utterance on word boundaries.
+
+  The values are compiled into a `ValuesIndex` once and cached; agents use the index built at load time instead.
+  """
+  try:
+    index = _values_index(tuple(values))
+  except TypeError:  # Values with synonyms (dicts) can't be cache keys
+    index = ValuesIndex(values)
+  return index.match(utterance)
 
 def extract_entity_given_regex(regex, utterance):
   import re
@@ -15,8 +31,9 @@ def extract_entity_given_regex(regex, utterance):
   else:
       return None
 def extract_entity_given_nlp(label, utterance):
-  import spacy
-  nlp=spacy.load("en_core_web_sm")
+  from nlp.registry import registry
+  from nlp.entities import NER_ONLY
+  nlp = registry.get_pipeline(disable=NER_ONLY)
   doc = nlp(utterance)
   for ent in doc.ents:
     if ent.label_ == label:
@@ -29,6 +46,7 @@ def graceful_shutdown(context=None):
   if context: pass
   return message
 
+@telemetry.traced("entities")
 def extract_entity(given, label, utterance):
     if given=="values": entity = extract_entity_given_values(label, utterance.lower())
     if given=="regex": entity = extract_entity_given_regex(label, utterance)
@@ -51,86 +69,50 @@ def get_missing_context(active_context: dict, keys: list) -> list:
   """
   return [key for key in keys if key not in active_context]
 
-import streamlit as st
-
-
-@st.cache_resource
-def load_intent_classifier(model, revision):
-    from transformers import pipeline
-    return pipeline("text-classification", model=model, revision=revision)
-
-@st.cache_resource
-def load_sentiment_analyser():
-  from transformers import pipeline
-  return pipeline("sentiment-analysis")
+# The model loaders live in nlp.models, which only imports transformers when called; app.py caches them per Streamlit process
+from nlp.models import load_intent_classifier, load_sentiment_analyser
 
+@telemetry.traced("cancel")
 def is_cancel_intent(text):
     """Detects whether the given text indicates a desire to cancel the current process.
 
+    Most messages are decided by a compiled keyword pass; only ambiguous ones are parsed with spaCy.
+
     Args:
         text (str): The user's input text.
 
     Returns:
         bool: True if cancellation intent is detected, False otherwise.
     """
-    import spacy
-
-    nlp = spacy.load('en_core_web_sm')  # Load the language model
-    from spacy.matcher import Matcher
-    
-    doc = nlp(text)
-
-    # Explicit keyword matching
-    cancel_words = ["cancel", "stop","n't","not", "nevermind", "forget", "leave"]
-    if any(token.text.lower() in cancel_words for token in doc):
-        return True
-
-    print("Rule based")
-
-    # Rule-based patterns (customize these further)
-    patterns = [
-        [{"POS": "VERB"}, {"LOWER": "cancel"}],  
-        [{"DEP": "ROOT"}, {"LOWER": "forget"}, {"LOWER": "it"}],
-        [{"TEXT": "Ugh"}, {"LOWER": "nevermind"}], 
-        [{"DEP": "neg"}, {"POS": "VERB"}, {"OP": "?"}, {"LOWER": "continue"}],
-        [{"LOWER": "i"}, {"POS": "VERB"},{"DEP": "neg"}, {"LOWER": "want"}, {"LOWER": "to"}, 
-           {"LOWER": "do"}, {"LOWER": "this"}],
-        [{"LOWER": {"REGEX": "^(i|do)n't"}}, {"LOWER": "want"}, {"LOWER": "to"}, 
-           {"LOWER": "do"}, {"LOWER": "this"}] ,
-        [{"LOWER": "i"}, {"DEP": "neg"}, {"LOWER": "want"}, {"LOWER": "to"}, 
-           {"POS": "VERB"}, {"LOWER": "this"}],
-        [{"LOWER": "actually"}, {"OP": "?"}, {"LOWER": "i"}, {"LOWER": "want"}, 
-           {"LOWER": "to"}, {"ENT_TYPE": "intent_name"}],
-        [{"TEXT": {"REGEX": "^ugh|argh|grr"}}, {"OP": "?"},  
-           {"LOWER": "just"}, {"LOWER": "cancel"}],
-        [{"LOWER": "this"}, {"LOWER": "is"}, {"LOWER": "not"}, {"POS": "VERB"}, 
-           {"OP": "?"}, {"LOWER": "forget"}, {"LOWER": "it"}],
-        [{"LOWER": "actually"}, {"OP": "?"}, {"LOWER": "never"}, {"LOWER": "mind"}],
-        [{"LOWER": "never"}, {"LOWER": "mind"}, 
-           {"OP": "?"}, {"LOWER": "forget"}, {"LOWER": "it"}],
-        [{"LOWER": "i"}, {"POS": "VERB"}, {"DEP": "neg"}, {"LOWER": "want"}, {"LOWER": "to"}, 
-           {"POS": "VERB"}, {"LOWER": "this"}]   
-    ]
-
-    matcher = Matcher(nlp.vocab)
-    for pattern in patterns:
-        matcher.add(f"pattern_{pattern}", [pattern]) 
-
-    matches = matcher(doc)
-    return len(matches) > 0
-
-
-def determine_intent(active_context_label, utterance, no_match_threshold, classifier, intents):
+    return cancel_detector.is_cancel(text)
+
+
+@telemetry.traced("intent")
+def determine_intent(active_context_label, utterance, no_match_threshold, classifier, intents, fast_matcher=None, context_masks=None):
+  """
+  Classifies the utterance, among the intents allowed by the active context.
+
+  With a `FastIntentMatcher`, exact and near-exact training phrases are answered without the classifier.
+  With `ContextMasks`, the allowed intents are looked up instead of being checked against `intents` per class.
+  """
   print(f"Determining Intent with Active Context : {active_context_label}")
 
+  if context_masks is not None:
+    allowed = context_masks.allowed(active_context_label).__contains__
+  else:
+    allowed = lambda label: not (intents[label]["input_context"] and intents[label]["input_context"] != active_context_label)
+
+  if fast_matcher is not None:
+    fast = fast_matcher.match(utterance, allowed)
+    if fast is not None:
+      return {"label": fast["label"], "score": fast["score"]}
+    started = time.perf_counter()
+
   classes = classifier(utterance, top_k=None)
+  if fast_matcher is not None:
+    fast_matcher.record("classifier", time.perf_counter() - started)
   determined_intent = None
-  probable_classes = []
-
-  for el in classes:
-    input_context = intents[el["label"]]["input_context"]
-    if not(input_context and input_context != active_context_label):
-      probable_classes.append(el)
+  probable_classes = [el for el in classes if allowed(el["label"])]
 
   most_probable_intent = max(probable_classes, key=lambda item: item['score'])
   if most_probable_intent["score"] > no_match_threshold: